@@ -0,0 +1,56 @@
+from .lru_cache import *
+from .dataset_version import get_dataset_version, reset_dataset_version
+from Engine.catalogue import country_catalogue
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Full per-country series keyed by (category, variant, country), sliced per request
+series_cache = LRUCache(
+    max_entries=int(os.getenv("SERIES_CACHE_MAX_ENTRIES", "2048")),
+    max_bytes=int(os.getenv("SERIES_CACHE_MAX_BYTES", str(128 * 1024 * 1024))),
+    ttl=float(os.getenv("SERIES_CACHE_TTL", "3600"))
+)
+
+# Population of every location, estimated from the per-capita columns of these categories, and the per_million
+# series derived from it
+POPULATION_KEY = ('population', None, None)
+POPULATION_CATEGORIES = ['testing', 'hospitalizations', 'vaccinations']
+
+# Compressed response bodies keyed by (ETag, encoding). The ETag covers the dataset version and the query,
+# so a hit is exactly what the view would have produced and compressed.
+response_cache = LRUCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=float(os.getenv("SERIES_CACHE_TTL", "3600"))
+)
+
+"""
+    Invalidation hook for the series cache. Call after the underlying tables change. Cached responses
+    are always dropped, they can mix several categories and countries. The country catalogue is
+    reloaded on its next use when the locations, or the names hospitalizations and vaccinations give
+    them, may have changed. A change to a category the populations are estimated from drops the
+    populations and every per_million series.
+
+    :param category: Only drop series of this category (cases, deaths, ...), all categories when None.
+    :param country: Only drop series of this country, all countries when None.
+    :return: Number of cached series dropped.
+"""
+def invalidate_series_cache(category=None, country=None) -> int:
+    reset_dataset_version()
+    response_cache.invalidate()
+    if category in (None, 'location', 'hospitalizations', 'vaccinations'):
+        country_catalogue.invalidate()
+
+    if category is None and country is None:
+        return series_cache.invalidate()
+
+    # Entries under the country None (snapshots across every country) depend on each country of their category
+    def matches(key):
+        key_category, key_variant, key_country = key
+        if category in POPULATION_CATEGORIES and (key == POPULATION_KEY or isinstance(key_variant, tuple) and key_variant[1:] == ('per_million',)):
+            return True
+        return (category is None or key_category == category) and (country is None or key_country in (country, None))
+
+    return series_cache.invalidate(matches)
@@ -0,0 +1,48 @@
+import hashlib
+import os
+import threading
+import time
+from dotenv import load_dotenv
+from db.queries import execute_query
+
+load_dotenv()
+
+# Write counters and relation ids of the COVID tables. Any insert/update/delete, or a table swapped in
+# by a reload, or a refresh of the facts views changes the stamp. The statistics are per database, so every worker computes the same one.
+# Writers report their counters when they commit and go idle or disconnect, so a change shows up within seconds.
+DATASET_VERSION_QUERY = """SELECT string_agg(relid || ':' || n_tup_ins || ':' || n_tup_upd || ':' || n_tup_del, ',' ORDER BY relname)
+                           FROM pg_stat_user_tables WHERE relname IN ('location', 'cases', 'deaths', 'testing', 'hospitalizations', 'vaccinations', 'daily_facts', 'latest_facts');"""
+
+_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+"""
+    Gets a stamp identifying the current contents of the COVID tables. DATASET_VERSION pins it,
+    otherwise it is derived from the table statistics and re-checked every DATASET_VERSION_TTL seconds.
+"""
+def get_dataset_version() -> str:
+    global _version, _checked_at
+
+    pinned = os.getenv("DATASET_VERSION")
+    if pinned:
+        return pinned
+
+    with _lock:
+        if _version is None or time.monotonic() - _checked_at > float(os.getenv("DATASET_VERSION_TTL", "30")):
+            data = execute_query(DATASET_VERSION_QUERY, fetch_results=True)
+
+            # Keep the last known stamp if the database could not be reached
+            if data is not None or _version is None:
+                stamp = data[0][0] if data and data[0][0] else ''
+                _version = hashlib.sha256(stamp.encode()).hexdigest()[:16]
+            _checked_at = time.monotonic()
+
+        return _version
+
+def reset_dataset_version():
+    global _checked_at
+
+    # Forces a re-check on the next call
+    with _lock:
+        _checked_at = 0.0
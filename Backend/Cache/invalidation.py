@@ -0,0 +1,63 @@
+import json
+import os
+import threading
+import time
+import psycopg
+from dotenv import load_dotenv
+from db import get_conninfo
+from Engine.memory_store import memory_store
+from . import invalidate_series_cache
+
+load_dotenv()
+
+# Writers (db.ingest) send {"category": ..., "countries": [...]} on this channel once the data is visible, every
+# server process drops just those series from its cache (and a memory store loaded from the tables reads them again)
+INVALIDATION_CHANNEL = "series_invalidation"
+
+_listener = None
+_lock = threading.Lock()
+
+"""
+    Applies one invalidation message.
+
+    :param payload: JSON object with a category and optionally a list of countries (all countries when missing).
+    :return: Number of cached series dropped.
+"""
+def handle_invalidation(payload: str) -> int:
+    message = json.loads(payload)
+    countries = message.get('countries') or [None]
+    memory_store.invalidate(message.get('category'))
+    return sum(invalidate_series_cache(message.get('category'), country) for country in countries)
+
+def listen_for_invalidations():
+    backoff = 1
+
+    while True:
+        try:
+            with psycopg.connect(get_conninfo(), autocommit=True) as connection:
+                connection.execute(f"LISTEN {INVALIDATION_CHANNEL};")
+                backoff = 1
+                for notification in connection.notifies():
+                    try:
+                        handle_invalidation(notification.payload)
+                    except Exception as e:
+                        print(f"Ignoring invalid cache invalidation message: {e}")
+        except Exception as e:
+            print(f"Cache invalidation listener disconnected: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+"""
+    Starts the background thread applying invalidation messages, once per process. Call after forking.
+    Disabled with CACHE_INVALIDATION_LISTEN=false.
+"""
+def start_invalidation_listener():
+    global _listener
+
+    if os.getenv("CACHE_INVALIDATION_LISTEN", "true").lower() != "true":
+        return
+
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=listen_for_invalidations, name="cache-invalidation", daemon=True)
+            _listener.start()
@@ -0,0 +1,121 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+"""
+    Estimates the memory held by a cached value. Good enough for enforcing a memory cap,
+    not an exact accounting.
+
+    :param value: The value to measure (lists/tuples/dicts are walked one level deep per container).
+    :return: Approximate size in bytes.
+"""
+def estimate_size(value) -> int:
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+
+    return size
+
+
+class LRUCache:
+    """
+        Thread safe least-recently-used cache with a time to live and a memory cap.
+
+        Params:
+            - max_entries: maximum number of entries kept
+            - max_bytes: maximum estimated size of all entries combined
+            - ttl: seconds an entry stays valid (0 disables expiry)
+    """
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, size, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size=None):
+        if size is None:
+            size = estimate_size(value)
+
+        # Never let a single oversized entry flush the whole cache
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    """
+        Drops entries from the cache.
+
+        :param predicate: Callable taking a key, entries whose key matches are dropped.
+                          Drops everything when None.
+        :return: Number of entries dropped.
+    """
+    def invalidate(self, predicate=None) -> int:
+        with self._lock:
+            if predicate is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return dropped
+
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
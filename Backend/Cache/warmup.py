@@ -0,0 +1,56 @@
+import os
+import time
+import db.series
+from dotenv import load_dotenv
+from db.series import get_country_names, get_full_series, TESTING_METRICS, VACCINATIONS_METRICS, HOSPITALIZATIONS_INDICATORS
+from Engine.memory_store import memory_store
+
+load_dotenv()
+
+"""
+    Parses WARMUP_SERIES, a comma separated list of category or category:variant specs,
+    e.g. "cases,deaths,vaccinations:v_total_vaccinations,hospitalizations:Daily ICU occupancy".
+
+    :return: List of (category, variant) tuples, invalid specs are skipped.
+"""
+def parse_warmup_series(value: str) -> list:
+    accepted = {
+        'cases': [None],
+        'deaths': [None],
+        'testing': TESTING_METRICS,
+        'vaccinations': VACCINATIONS_METRICS,
+        'hospitalizations': HOSPITALIZATIONS_INDICATORS + [indicator + " per million" for indicator in HOSPITALIZATIONS_INDICATORS]
+    }
+    specs = []
+
+    for spec in value.split(','):
+        category, _, variant = spec.strip().partition(':')
+        variant = variant or None
+        if category in accepted and variant in accepted[category]:
+            specs.append((category, variant))
+        elif spec.strip():
+            print(f"Skipping invalid warm-up series: '{spec.strip()}'")
+
+    return specs
+
+"""
+    Fills the caches before the server accepts traffic: the country list and the series listed in
+    WARMUP_SERIES (default cases and deaths) for WARMUP_COUNTRIES (comma separated, default every location).
+    With QUERY_ENGINE=memory the in-memory store is loaded instead of the series.
+
+    :return: Number of seconds the warm-up took.
+"""
+def warm_caches() -> float:
+    started = time.perf_counter()
+    countries = get_country_names()
+
+    if db.series.QUERY_ENGINE == 'memory':
+        memory_store.load()
+    else:
+        selected = [country.strip() for country in os.getenv("WARMUP_COUNTRIES", "").split(',') if country.strip()] or countries
+        for category, variant in parse_warmup_series(os.getenv("WARMUP_SERIES", "cases,deaths")):
+            get_full_series(category, selected, variant)
+
+    elapsed = time.perf_counter() - started
+    print(f"Caches warmed in {elapsed:.2f}s ({len(countries)} countries)")
+    return elapsed
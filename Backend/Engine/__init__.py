@@ -0,0 +1,2 @@
+from .memory_store import *
+from .catalogue import *
@@ -0,0 +1,123 @@
+import heapq
+import threading
+from bisect import bisect_left
+from db.queries import execute_query
+from typing import List, Optional
+
+CATALOGUE_QUERY = 'SELECT l_nationname, l_nationkey FROM location;'
+# hospitalizations and vaccinations name the countries themselves, their endpoints and snapshots use those names
+TABLE_NAMES_QUERY = """SELECT h_nationname, h_nationkey FROM hospitalizations GROUP BY h_nationname, h_nationkey
+                       UNION SELECT v_nationname, v_nationkey FROM vaccinations GROUP BY v_nationname, v_nationkey;"""
+
+# Keys of aggregate regions (continents, income groups, World) start with this, countries have ISO codes
+AGGREGATE_KEY_PREFIX = 'OWID_'
+
+# Sorts after every character a prefix can continue with
+PREFIX_END = '\U0010ffff'
+
+class CountryCatalogue:
+    """
+        Every location (countries and aggregate regions) with its nationkey, loaded once from PostgreSQL.
+        Names and keys are kept in case-insensitively sorted indexes, so prefix searches are two binary
+        searches, and name and key lookups are dict lookups. The names the hospitalizations and vaccinations
+        tables give their countries are only used by resolve().
+    """
+    def __init__(self):
+        self.loaded = False
+        self._names = []
+        self._name_index = []
+        self._key_index = []
+        self._keys_by_name = {}
+        self._names_by_key = {}
+        self._keys_by_table_name = {}
+        self._lock = threading.Lock()
+
+    """
+        Loads the locations from PostgreSQL. Safe to call more than once, only the first call after
+        creation or invalidate() loads.
+    """
+    def load(self):
+        if self.loaded:
+            return
+
+        with self._lock:
+            if self.loaded:
+                return
+
+            data = execute_query(CATALOGUE_QUERY, None, True)
+            table_names = execute_query(TABLE_NAMES_QUERY, None, True)
+            if data is None or table_names is None:
+                raise RuntimeError("Could not load the country catalogue")
+
+            self._names = sorted((name for name, _ in data), key=lambda name: (name.casefold(), name))
+            self._name_index = [(name.casefold(), name) for name in self._names]
+            self._key_index = sorted((key.casefold(), name) for name, key in data)
+            self._keys_by_name = {name: key for name, key in data}
+            self._names_by_key = {key: name for name, key in data}
+            # Location names win over a table naming another location the same
+            self._keys_by_table_name = {**{name: key for name, key in table_names if name is not None}, **self._keys_by_name}
+            self.loaded = True
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded = False
+
+    def names(self) -> List[str]:
+        self.load()
+        return self._names
+
+    def nationkey(self, name: str) -> Optional[str]:
+        self.load()
+        return self._keys_by_name.get(name)
+
+    """
+        Maps country names to nationkeys, leaving out unknown names.
+    """
+    def nationkeys(self, names: List[str]) -> List[str]:
+        if not names:
+            return []
+        self.load()
+        return [self._keys_by_name[name] for name in names if name in self._keys_by_name]
+
+    """
+        Maps the name any table gives a country (l_nationname, h_nationname or v_nationname) to its nationkey.
+    """
+    def resolve(self, name: str) -> Optional[str]:
+        self.load()
+        return self._keys_by_table_name.get(name)
+
+    def name_of(self, nationkey: str) -> Optional[str]:
+        self.load()
+        return self._names_by_key.get(nationkey)
+
+    """
+        Finds the locations whose name or nationkey starts with a prefix (case-insensitive).
+
+        :param prefix: Start of a name (e.g. 'uni') or key (e.g. 'owid_'), every location when empty.
+        :param limit: Maximum number of locations returned.
+        :return: List of dicts with name, key and aggregate (whether it is a region rather than a country),
+                 sorted by name.
+    """
+    def search(self, prefix: str, limit: int) -> list:
+        self.load()
+        prefix = prefix.casefold()
+
+        # The name matches are sorted by name, only the first limit of them can be returned
+        start = bisect_left(self._name_index, (prefix,))
+        end = bisect_left(self._name_index, (prefix + PREFIX_END,))
+        matches = {name for _, name in self._name_index[start:min(end, start + limit)]}
+
+        # Keys do not sort like their names (DZA is Algeria), every key match is a candidate
+        start = bisect_left(self._key_index, (prefix,))
+        end = bisect_left(self._key_index, (prefix + PREFIX_END,))
+        matches.update(name for _, name in self._key_index[start:end])
+
+        names = heapq.nsmallest(limit, matches, key=lambda name: (name.casefold(), name))
+        return [{"name": name, "key": self._keys_by_name[name], "aggregate": self._keys_by_name[name].startswith(AGGREGATE_KEY_PREFIX)}
+                for name in names]
+
+    def stats(self) -> dict:
+        return {"loaded": self.loaded, "locations": len(self._names)}
+
+
+country_catalogue = CountryCatalogue()
@@ -0,0 +1,70 @@
+"""
+    Consistency check between the PostgreSQL query path and the in-memory engine.
+
+    Calls every /api/*-by-country and /api/compare-* route through the Flask test client once per
+    engine and reports any request whose status code or JSON body differs.
+
+    Usage (from the Backend directory):
+        python -m Engine.consistency [--countries N] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+import argparse
+import sys
+import db.series
+from app import app
+from db.queries import execute_query
+from db.series import TESTING_METRICS, VACCINATIONS_METRICS, HOSPITALIZATIONS_INDICATORS
+from Cache import invalidate_series_cache
+from Engine.memory_store import memory_store
+
+def build_requests(countries, start_date, end_date):
+    variants = {
+        'cases': [{}],
+        'deaths': [{}],
+        'testing': [{'metric': metric} for metric in TESTING_METRICS],
+        'hospitalizations': [{'indicator': indicator, 'per_million': per_million}
+                             for indicator in HOSPITALIZATIONS_INDICATORS for per_million in ('false', 'true')],
+        'vaccinations': [{'metric': metric} for metric in VACCINATIONS_METRICS]
+    }
+    requests = []
+
+    for category, options in variants.items():
+        for extra in options:
+            for country in countries:
+                requests.append((f'/api/{category}-by-country', {'country': country, 'start': start_date, 'end': end_date, **extra}))
+            requests.append((f'/api/compare-{category}-by-country', {'countries': countries, 'start': start_date, 'end': end_date, **extra}))
+
+    return requests
+
+def run(requests, engine):
+    db.series.QUERY_ENGINE = engine
+    invalidate_series_cache()
+    client = app.test_client()
+    return [(response.status_code, response.get_json()) for response in
+            (client.get(path, query_string=params) for path, params in requests)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the PostgreSQL and in-memory query engines")
+    parser.add_argument('--countries', type=int, default=10, help="number of locations to check")
+    parser.add_argument('--start', default='2020-01-01')
+    parser.add_argument('--end', default='2024-12-31')
+    args = parser.parse_args()
+
+    countries = [row[0] for row in execute_query('SELECT l_nationname FROM location ORDER BY l_nationname LIMIT %s;', (args.countries,), True)]
+    requests = build_requests(countries, args.start, args.end)
+
+    memory_store.load()
+    postgres_results = run(requests, 'postgres')
+    memory_results = run(requests, 'memory')
+
+    mismatches = 0
+    for (path, params), expected, actual in zip(requests, postgres_results, memory_results):
+        if expected != actual:
+            mismatches += 1
+            print(f"MISMATCH {path} {params}: postgres={str(expected)[:200]} memory={str(actual)[:200]}")
+
+    print(f"{len(requests) - mismatches}/{len(requests)} requests identical")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from dotenv import load_dotenv
+from db.queries import execute_query
+from typing import List, Optional
+
+load_dotenv()
+
+# Snapshot file of the store (built with python -m Engine.snapshot). When it exists the store maps it instead of
+# loading the tables, and every process maps the same pages. A replaced file is picked up within
+# MEMORY_SNAPSHOT_CHECK_INTERVAL seconds.
+MEMORY_SNAPSHOT = os.getenv("MEMORY_SNAPSHOT", "memory.snapshot")
+MEMORY_SNAPSHOT_CHECK_INTERVAL = float(os.getenv("MEMORY_SNAPSHOT_CHECK_INTERVAL", "5"))
+
+# Snapshot layout: header (magic, format version, index length), the JSON index, then the arrays (little-endian
+# int32 YYYYMMDD dates, float64 values with NaN for NULL, int32 label codes), every section 8-byte aligned.
+# The index maps each nationkey to its series, each with its row count and the offsets of its arrays in the data section.
+SNAPSHOT_MAGIC = b'COVIDSNP'
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_HEADER = struct.Struct('<8sIQ')
+SNAPSHOT_ALIGNMENT = 8
+
+# Every loader query returns the country name, the group (hospitalization indicator) or NULL, the date,
+# the per-row label (testing entity note) or NULL, then the value columns. Rows are ordered by group and date.
+TABLES = {
+    'cases': {
+        'query': """SELECT l_nationname, NULL, c_date, NULL, c_cases FROM cases JOIN location ON l_nationkey = c_nationkey
+                    ORDER BY l_nationname, c_date;""",
+        'columns': ['c_cases'],
+        'integral': ['c_cases']
+    },
+    'deaths': {
+        'query': """SELECT l_nationname, NULL, d_date, NULL, d_death FROM deaths JOIN location ON l_nationkey = d_nationkey
+                    ORDER BY l_nationname, d_date;""",
+        'columns': ['d_death'],
+        'integral': ['d_death']
+    },
+    'testing': {
+        'query': """SELECT l_nationname, NULL, t_date, split_part(t_entity, ' - ', 2), t_cumulative_total, t_daily_change_ct,
+                    t_ct_per_thousand, t_daily_change_ct_per_thousand, t_short_term_positive_rate, t_short_term_tests_per_case
+                    FROM testing JOIN location ON l_nationkey = t_nationkey ORDER BY l_nationname, t_date;""",
+        'columns': ['t_cumulative_total', 't_daily_change_ct', 't_ct_per_thousand', 't_daily_change_ct_per_thousand',
+                    't_short_term_positive_rate', 't_short_term_tests_per_case'],
+        'integral': []
+    },
+    'hospitalizations': {
+        'query': """SELECT h_nationname, h_indicator, h_date, NULL, h_value FROM hospitalizations
+                    ORDER BY h_nationname, h_indicator, h_date;""",
+        'columns': ['h_value'],
+        'integral': []
+    },
+    'vaccinations': {
+        'query': """SELECT v_nationname, NULL, v_date, NULL, v_total_vaccinations, v_people_fully_vaccinated, v_total_boosters,
+                    v_daily_vaccinations, v_people_fully_vaccinated_per_hundred, v_total_boosters_per_hundred
+                    FROM vaccinations ORDER BY v_nationname, v_date;""",
+        'columns': ['v_total_vaccinations', 'v_people_fully_vaccinated', 'v_total_boosters', 'v_daily_vaccinations',
+                    'v_people_fully_vaccinated_per_hundred', 'v_total_boosters_per_hundred'],
+        'integral': ['v_total_vaccinations', 'v_people_fully_vaccinated', 'v_total_boosters', 'v_daily_vaccinations']
+    }
+}
+
+"""
+    Encodes a 'YYYY-MM-DD' string as the integer YYYYMMDD. The integers sort exactly like the strings,
+    so range lookups behave the same as the SQL path even for out of range dates such as 2021-02-30.
+"""
+def encode_date(date_str: str) -> int:
+    return int(date_str[0:4]) * 10000 + int(date_str[5:7]) * 100 + int(date_str[8:10])
+
+def decode_date(value: int) -> str:
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+def _aligned(size: int) -> int:
+    return -(-size // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+"""
+    Identifies the file behind a path, a replaced snapshot has another inode (or modification time).
+"""
+def _file_identity(stat: os.stat_result) -> tuple:
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns
+
+def _to_json_values(values: np.ndarray, integral: bool) -> list:
+    if integral:
+        return [None if value != value else int(value) for value in values.tolist()]
+    return [None if value != value else value for value in values.tolist()]
+
+
+class SeriesFrame:
+    """
+        One country's date-sorted series of a table (or of one hospitalization indicator).
+
+        Params:
+            - dates: int32 array of YYYYMMDD dates, ascending
+            - columns: dict of column name to float64 array (NaN for NULL)
+            - label_codes: int32 array indexing label_values, one per row (testing notes), or None
+            - label_values: list of distinct label strings
+    """
+    __slots__ = ('dates', 'columns', 'label_codes', 'label_values')
+
+    def __init__(self, dates, columns, label_codes=None, label_values=None):
+        self.dates = dates
+        self.columns = columns
+        self.label_codes = label_codes
+        self.label_values = label_values or []
+
+    def window(self, start_date: str, end_date: str):
+        lo = int(np.searchsorted(self.dates, encode_date(start_date), side='left'))
+        hi = int(np.searchsorted(self.dates, encode_date(end_date), side='right'))
+        return lo, hi
+
+    @property
+    def nbytes(self) -> int:
+        size = self.dates.nbytes + sum(column.nbytes for column in self.columns.values())
+        if self.label_codes is not None:
+            size += self.label_codes.nbytes
+        return size
+
+
+class MemoryStore:
+    """
+        Columnar in-memory copy of the COVID tables. Every table is loaded once into per-country
+        SeriesFrames and date windows are answered with a binary search, no SQL round trip. The frames
+        come from a memory-mapped snapshot file when one exists, see MEMORY_SNAPSHOT.
+    """
+    def __init__(self):
+        self.frames = {}
+        self.loaded = False
+        self.snapshot = None
+        self._snapshot_checked_at = 0.0
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    """
+        Loads the store from the MEMORY_SNAPSHOT file, or from PostgreSQL when there is none. Safe to call
+        more than once, only the first call loads. Later calls map a replaced snapshot file, or read the
+        tables invalidated since again.
+    """
+    def load(self):
+        with self._lock:
+            if self.loaded:
+                if self._stale:
+                    self._reload_stale()
+                self._check_snapshot()
+                return
+
+            if MEMORY_SNAPSHOT and os.path.exists(MEMORY_SNAPSHOT):
+                self._map_snapshot(MEMORY_SNAPSHOT)
+                return
+
+            self.frames = self.load_tables()
+            self.loaded = True
+
+    """
+        Reads tables from PostgreSQL.
+
+        :param categories: Tables to read, every table when None.
+        :return: Dict of (category, group, country) to SeriesFrame.
+    """
+    def load_tables(self, categories: Optional[List[str]] = None) -> dict:
+        frames = {}
+        for category, table in TABLES.items():
+            if categories is not None and category not in categories:
+                continue
+            data = execute_query(table['query'], None, True)
+            if data is None:
+                raise RuntimeError(f"Could not load table '{category}' into the memory store")
+            frames.update(self._build_frames(category, table, data))
+        return frames
+
+    """
+        Marks tables loaded from PostgreSQL as changed, the next load() reads them again. A store mapped
+        from a snapshot file is left alone, it follows the file (rebuild it with python -m Engine.snapshot).
+
+        :param category: Changed table, every table when None or 'location' (country names may have changed).
+    """
+    def invalidate(self, category: Optional[str] = None):
+        with self._lock:
+            if not self.loaded or self.snapshot is not None:
+                return
+            self._stale.update(TABLES if category in (None, 'location') else [category] if category in TABLES else [])
+
+    """
+        Reads the stale tables again and swaps their frames in. On failure the current frames are kept
+        and the next load() retries. Called with the lock held.
+    """
+    def _reload_stale(self):
+        stale = set(self._stale)
+        try:
+            reloaded = self.load_tables(stale)
+        except Exception as e:
+            print(f"Keeping the current memory store, could not reload {', '.join(sorted(stale))}: {e}")
+            return
+
+        frames = {key: frame for key, frame in self.frames.items() if key[0] not in stale}
+        frames.update(reloaded)
+        self.frames = frames
+        self._stale -= stale
+
+    def _build_frames(self, category: str, table: dict, data: list) -> dict:
+        frames = {}
+        start = 0
+
+        while start < len(data):
+            country, group = data[start][0], data[start][1]
+            end = start
+            while end < len(data) and data[end][0] == country and data[end][1] == group:
+                end += 1
+
+            rows = data[start:end]
+            dates = np.array([row[2].year * 10000 + row[2].month * 100 + row[2].day for row in rows], dtype=np.int32)
+            columns = {}
+            for i, name in enumerate(table['columns']):
+                columns[name] = np.array([np.nan if row[4 + i] is None else float(row[4 + i]) for row in rows], dtype=np.float64)
+
+            label_codes, label_values = None, None
+            if category == 'testing':
+                label_values = sorted({row[3] for row in rows if row[3] is not None})
+                lookup = {label: code for code, label in enumerate(label_values)}
+                label_codes = np.array([lookup.get(row[3], -1) for row in rows], dtype=np.int32)
+
+            frames[(category, group, country)] = SeriesFrame(dates, columns, label_codes, label_values)
+            start = end
+
+        return frames
+
+    def get_frame(self, category: str, country: str, variant: Optional[str] = None) -> Optional[SeriesFrame]:
+        group = variant if category == 'hospitalizations' else None
+        return self.frames.get((category, group, country))
+
+    """
+        Builds the endpoint rows of one country within a window of time, in the same shape as the SQL path.
+
+        :return: List of rows, empty if the country has no data in the window.
+    """
+    def get_rows(self, category: str, country: str, start_date: str, end_date: str, variant: Optional[str] = None) -> list:
+        frame = self.get_frame(category, country, variant)
+        if frame is None:
+            return []
+
+        lo, hi = frame.window(start_date, end_date)
+        if lo >= hi:
+            return []
+
+        column = TABLES[category]['columns'][0] if category in ('cases', 'deaths', 'hospitalizations') else variant
+        dates = [decode_date(value) for value in frame.dates[lo:hi].tolist()]
+        values = _to_json_values(frame.columns[column][lo:hi], column in TABLES[category]['integral'])
+
+        if category == 'testing':
+            labels = [None if code < 0 else frame.label_values[code] for code in frame.label_codes[lo:hi].tolist()]
+            return [list(row) for row in zip(dates, labels, values)]
+        if category == 'hospitalizations':
+            return [[date, variant, value] for date, value in zip(dates, values)]
+        return [list(row) for row in zip(dates, values)]
+
+    def get_series_window(self, category: str, countries: List[str], start_date: str, end_date: str, variant: Optional[str] = None) -> dict:
+        result = {}
+
+        for country in dict.fromkeys(countries):
+            rows = self.get_rows(category, country, start_date, end_date, variant)
+            if rows:
+                result[country] = rows
+
+        return result
+
+    """
+        Builds the snapshot of every country, in the same shape as db.series.get_snapshot.
+
+        :param date: Date of the snapshot (YYYY-MM-DD), or None for the latest observation of each country.
+        :return: List of [country, date, value] rows, countries without a value left out.
+    """
+    def get_snapshot(self, category: str, date: Optional[str] = None, variant: Optional[str] = None) -> list:
+        group = variant if category == 'hospitalizations' else None
+        column = TABLES[category]['columns'][0] if category in ('cases', 'deaths', 'hospitalizations') else variant
+        integral = column in TABLES[category]['integral']
+        snapshot = []
+
+        for (frame_category, frame_group, country), frame in self.frames.items():
+            if frame_category != category or frame_group != group:
+                continue
+
+            values = frame.columns[column]
+            if date is None:
+                observed = np.flatnonzero(~np.isnan(values))
+                if not len(observed):
+                    continue
+                index = int(observed[-1])
+            else:
+                index = int(np.searchsorted(frame.dates, encode_date(date), side='left'))
+                if index == len(frame.dates) or frame.dates[index] != encode_date(date) or np.isnan(values[index]):
+                    continue
+
+            value = _to_json_values(values[index:index + 1], integral)[0]
+            snapshot.append([country, decode_date(int(frame.dates[index])), value])
+
+        return snapshot
+
+    """
+        Writes the frames to a snapshot file. The file is written next to the target and renamed over it,
+        so processes mapping the old file keep reading it until they map the new one.
+
+        :param path: Snapshot file to write.
+        :param frames: Dict of (category, group, country) to SeriesFrame, e.g. from load_tables.
+        :param nationkeys: Dict of country name to nationkey for the index, names without one are indexed by name.
+        :param dataset_version: Version of the data the frames were read at, kept in the index.
+        :return: Size of the file in bytes.
+    """
+    @staticmethod
+    def save_snapshot(path: str, frames: dict, nationkeys: dict, dataset_version: str = '') -> int:
+        arrays = []
+        size = 0
+
+        def add(array: np.ndarray) -> int:
+            nonlocal size
+            offset = size
+            arrays.append(array)
+            size += _aligned(array.nbytes)
+            return offset
+
+        locations = {}
+        for (category, group, country), frame in sorted(frames.items(), key=lambda item: tuple(str(part) for part in item[0])):
+            locations.setdefault(nationkeys.get(country) or country, []).append({
+                "country": country,
+                "category": category,
+                "group": group,
+                "rows": len(frame.dates),
+                "dates": add(frame.dates.astype('<i4')),
+                "columns": {name: add(column.astype('<f8')) for name, column in frame.columns.items()},
+                "labels": add(frame.label_codes.astype('<i4')) if frame.label_codes is not None else None,
+                "label_values": frame.label_values
+            })
+
+        index = json.dumps({"format": SNAPSHOT_FORMAT, "dataset_version": dataset_version, "created_at": time.time(),
+                            "locations": locations}, separators=(',', ':')).encode()
+        data_start = _aligned(SNAPSHOT_HEADER.size + len(index))
+        temporary = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            with open(temporary, 'wb') as file:
+                file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(index)))
+                file.write(index.ljust(data_start - SNAPSHOT_HEADER.size, b'\0'))
+                for array in arrays:
+                    file.write(array.tobytes().ljust(_aligned(array.nbytes), b'\0'))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+        return data_start + size
+
+    """
+        Reads the header and index of a snapshot file without mapping its data.
+
+        :return: The index dict (format, dataset_version, created_at, locations).
+    """
+    @staticmethod
+    def read_snapshot_index(path: str) -> dict:
+        with open(path, 'rb') as file:
+            magic, version, index_length = SNAPSHOT_HEADER.unpack(file.read(SNAPSHOT_HEADER.size))
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT:
+                raise RuntimeError(f"{path} is not a memory store snapshot of format {SNAPSHOT_FORMAT}")
+            return json.loads(file.read(index_length))
+
+    """
+        Maps a snapshot file and serves from it. The frames are read-only views of the mapping: no copy is
+        made, and every process mapping the file shares the same page cache pages. Called with the lock held.
+    """
+    def _map_snapshot(self, path: str):
+        started = time.perf_counter()
+        with open(path, 'rb') as file:
+            identity = _file_identity(os.fstat(file.fileno()))
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = SNAPSHOT_HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT:
+            raise RuntimeError(f"{path} is not a memory store snapshot of format {SNAPSHOT_FORMAT}")
+
+        index = json.loads(buffer[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + index_length])
+        data_start = _aligned(SNAPSHOT_HEADER.size + index_length)
+
+        def view(offset: int, dtype: str, rows: int) -> np.ndarray:
+            return np.frombuffer(buffer, dtype=dtype, count=rows, offset=data_start + offset)
+
+        frames = {}
+        for entries in index['locations'].values():
+            for entry in entries:
+                rows = entry['rows']
+                columns = {name: view(offset, '<f8', rows) for name, offset in entry['columns'].items()}
+                labels = view(entry['labels'], '<i4', rows) if entry['labels'] is not None else None
+                frames[(entry['category'], entry['group'], entry['country'])] = SeriesFrame(view(entry['dates'], '<i4', rows), columns,
+                                                                                            labels, entry['label_values'])
+
+        self.frames = frames
+        self.loaded = True
+        self.snapshot = {"path": path, "identity": identity, "dataset_version": index['dataset_version'],
+                         "created_at": index['created_at'], "bytes": len(buffer), "map_ms": (time.perf_counter() - started) * 1000}
+        self._snapshot_checked_at = time.monotonic()
+
+    """
+        Maps the snapshot file again when it was replaced (or appeared), at most every MEMORY_SNAPSHOT_CHECK_INTERVAL
+        seconds. Requests still reading the old frames finish on the old mapping, it is unmapped once unused.
+        Called with the lock held.
+    """
+    def _check_snapshot(self):
+        if not MEMORY_SNAPSHOT or time.monotonic() - self._snapshot_checked_at < MEMORY_SNAPSHOT_CHECK_INTERVAL:
+            return
+        self._snapshot_checked_at = time.monotonic()
+
+        try:
+            identity = _file_identity(os.stat(MEMORY_SNAPSHOT))
+        except OSError:
+            return
+
+        if self.snapshot is not None and identity == self.snapshot['identity']:
+            return
+
+        try:
+            self._map_snapshot(MEMORY_SNAPSHOT)
+        except Exception as e:
+            print(f"Keeping the current memory store, could not map {MEMORY_SNAPSHOT}: {e}")
+            return
+
+        # Imported here, Cache depends on this package
+        from Cache import invalidate_series_cache
+        invalidate_series_cache()
+
+    def stats(self) -> dict:
+        stats = {
+            "loaded": self.loaded,
+            "series": len(self.frames),
+            "bytes": sum(frame.nbytes for frame in self.frames.values())
+        }
+        if self.snapshot is not None:
+            stats["snapshot"] = {key: value for key, value in self.snapshot.items() if key != 'identity'}
+        return stats
+
+
+memory_store = MemoryStore()
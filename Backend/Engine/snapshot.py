@@ -0,0 +1,58 @@
+"""
+    Builds the snapshot file of the in-memory engine: every table in one versioned binary file of fixed-width
+    date and value arrays with a per-nationkey index. Servers with QUERY_ENGINE=memory map it at startup instead
+    of reading the tables, and map a rebuilt file within MEMORY_SNAPSHOT_CHECK_INTERVAL seconds. The file is
+    replaced atomically, rebuild it after loading new data.
+
+    Usage (from the Backend directory):
+        python -m Engine.snapshot                  build MEMORY_SNAPSHOT (default memory.snapshot) from PostgreSQL
+        python -m Engine.snapshot --output PATH    build another file
+        python -m Engine.snapshot --info           describe the current file and time mapping it
+"""
+import argparse
+import sys
+import time
+from Cache import get_dataset_version
+from Engine.catalogue import country_catalogue
+from Engine.memory_store import MemoryStore, MEMORY_SNAPSHOT
+
+def build(path: str) -> int:
+    started = time.perf_counter()
+    version = get_dataset_version()
+    frames = MemoryStore().load_tables()
+    loaded = time.perf_counter()
+
+    country_catalogue.load()
+    size = MemoryStore.save_snapshot(path, frames, {name: country_catalogue.nationkey(name) for name in country_catalogue.names()}, version)
+
+    print(f"Read {len(frames)} series in {loaded - started:.2f}s, wrote {path} ({size / 1024 / 1024:.1f} MiB, dataset version {version}) "
+          f"in {time.perf_counter() - loaded:.2f}s")
+    return 0
+
+def info(path: str) -> int:
+    index = MemoryStore.read_snapshot_index(path)
+    store = MemoryStore()
+    store._map_snapshot(path)
+    stats = store.stats()
+
+    print(f"{path}: format {index['format']}, dataset version {index['dataset_version']}, "
+          f"built {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(index['created_at']))}")
+    print(f"{len(index['locations'])} locations, {stats['series']} series, {stats['snapshot']['bytes'] / 1024 / 1024:.1f} MiB, "
+          f"mapped in {stats['snapshot']['map_ms']:.1f}ms")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped snapshot of the in-memory engine")
+    parser.add_argument('--output', default=MEMORY_SNAPSHOT, help="snapshot file to write or describe")
+    parser.add_argument('--info', action='store_true', help="describe the snapshot instead of building it")
+    args = parser.parse_args()
+
+    try:
+        return info(args.output) if args.info else build(args.output)
+    except Exception as e:
+        print(f"Snapshot failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+from flask import Response, g, request
+from Cache import response_cache
+from Util.http_cache import encoded_etag
+from Util.instrumentation import phase
+from dotenv import load_dotenv
+import gzip
+import os
+import zlib
+
+# Brotli is optional, without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+load_dotenv()
+
+# Responses smaller than this many bytes are sent as is
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-msgpack', 'application/vnd.apache.arrow.stream', 'text/csv', 'text/plain'}
+
+def supported_encodings() -> list:
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+"""
+    Picks the encoding for the current request from its Accept-Encoding header, preferring brotli.
+
+    :return: 'br', 'gzip' or None when the client accepts neither.
+"""
+def negotiate_encoding():
+    return request.accept_encodings.best_match(supported_encodings())
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+"""
+    Compresses a streamed response chunk by chunk, flushing after every chunk so the client
+    still receives each batch as it is produced.
+"""
+def compress_stream(chunks, encoding: str):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk.encode() if isinstance(chunk, str) else chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+def set_encoding_headers(response: Response, encoding: str):
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if 'etag' in g:
+        g.etag = encoded_etag(g.etag, encoding)
+
+"""
+    Serves a compressed response straight from the response cache, before the view runs.
+"""
+def serve_cached_response():
+    if 'etag' not in g:
+        return None
+
+    encoding = negotiate_encoding()
+    cached = response_cache.get((g.etag, encoding)) if encoding else None
+    if cached is None:
+        return None
+
+    body, mimetype = cached
+    response = Response(body, mimetype=mimetype)
+    set_encoding_headers(response, encoding)
+    return response
+
+def compress_response(response: Response) -> Response:
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES or request.method == 'HEAD'):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+        set_encoding_headers(response, encoding)
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    with phase('compress'):
+        body = compress(data, encoding)
+    if 'etag' in g:
+        response_cache.put((g.etag, encoding), (body, response.mimetype), size=len(body))
+
+    response.set_data(body)
+    set_encoding_headers(response, encoding)
+    return response
+
+"""
+    Registers response compression. Must come after register_http_caching, the cached responses
+    are looked up by the ETag it computes.
+"""
+def register_compression(app):
+    app.before_request(serve_cached_response)
+    app.after_request(compress_response)
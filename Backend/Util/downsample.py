@@ -0,0 +1,94 @@
+import numpy as np
+from Util.instrumentation import phase
+
+RESOLUTIONS = ['day', 'week', 'month']
+
+def _values(rows) -> np.ndarray:
+    return np.array([np.nan if row[-1] is None else row[-1] for row in rows], dtype=np.float64)
+
+def _to_value(value):
+    return None if value != value else float(value)
+
+"""
+    Aggregates daily rows into weekly (ISO weeks starting Monday) or monthly buckets, the same buckets
+    as date_trunc. Each bucket is labelled with its first day and holds the mean of its non-null values;
+    the middle columns (testing note, hospitalization indicator) are taken from the bucket's last row.
+
+    :param rows: Date-sorted rows whose first column is a 'YYYY-MM-DD' date and last column the value.
+    :param resolution: 'week' or 'month'.
+    :return: One row per bucket.
+"""
+def bucket_rows(rows: list, resolution: str) -> list:
+    days = np.array([row[0] for row in rows], dtype='datetime64[D]')
+
+    if resolution == 'week':
+        # Day 0 (1970-01-01) is a Thursday, shift by 3 so Mondays land on multiples of 7
+        buckets = days - ((days.astype(np.int64) + 3) % 7).astype('timedelta64[D]')
+    else:
+        buckets = days.astype('datetime64[M]').astype('datetime64[D]')
+
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(rows)] - 1
+
+    values = _values(rows)
+    present = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+    counts = np.add.reduceat(present.astype(np.int64), starts)
+    means = np.divide(sums, counts, out=np.full(len(starts), np.nan), where=counts > 0)
+
+    labels = np.datetime_as_string(buckets[starts]).tolist()
+    return [[label, *rows[end][1:-1], _to_value(mean)] for label, end, mean in zip(labels, ends.tolist(), means.tolist())]
+
+"""
+    Largest-Triangle-Three-Buckets downsampling. Keeps the first and last rows and, for every bucket in
+    between, the row forming the largest triangle with the previously kept row and the next bucket's average,
+    which preserves the visual shape of the series. Rows without a value are dropped.
+
+    :param rows: Date-sorted rows whose first column is a 'YYYY-MM-DD' date and last column the value.
+    :param max_points: Number of rows to keep (at least 3).
+    :return: At most max_points of the original rows.
+"""
+def lttb_rows(rows: list, max_points: int) -> list:
+    rows = [row for row in rows if row[-1] is not None]
+    if len(rows) <= max_points:
+        return rows
+
+    x = np.array([row[0] for row in rows], dtype='datetime64[D]').astype(np.float64)
+    y = _values(rows)
+    edges = np.linspace(1, len(rows) - 1, max_points - 1).astype(np.int64)
+
+    kept = [0]
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else len(rows)
+        average_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        average_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        previous = kept[-1]
+        areas = np.abs((x[previous] - average_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (average_y - y[previous]))
+        kept.append(int(start + np.argmax(areas)))
+
+    kept.append(len(rows) - 1)
+    return [rows[i] for i in kept]
+
+"""
+    Reduces a series to the requested resolution and/or number of points.
+
+    :param rows: Date-sorted endpoint rows.
+    :param resolution: 'day' (unchanged), 'week' or 'month', or None.
+    :param max_points: Upper bound on the number of rows, or None.
+    :return: The reduced rows.
+"""
+def downsample_rows(rows: list, resolution: str = None, max_points: int = None) -> list:
+    if not rows:
+        return rows
+
+    with phase('downsample'):
+        if resolution in ('week', 'month'):
+            rows = bucket_rows(rows, resolution)
+
+        if max_points is not None and len(rows) > max_points:
+            rows = lttb_rows(rows, max_points)
+
+    return rows
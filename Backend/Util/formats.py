@@ -0,0 +1,138 @@
+from datetime import date
+from flask import Response, jsonify
+from Util.instrumentation import phase
+import io
+import msgpack
+
+# Arrow is optional, without pyarrow only the JSON and MessagePack formats are offered
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+FORMATS = ['json', 'columnar', 'msgpack']
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# A series is sent as start + step + values when filling its gaps with nulls at most doubles its length,
+# otherwise (sparse or downsampled series) with an explicit dates array
+MAX_COLUMNAR_FILL = 2
+
+def response_formats() -> list:
+    return FORMATS + ['arrow'] if pyarrow is not None else FORMATS
+
+"""
+    Gets the position of a date on the grid of a resolution (days, Monday weeks or months), or None
+    when the date is not on the grid.
+"""
+def grid_position(value: str, resolution: str):
+    day = date.fromisoformat(value)
+
+    if resolution == 'week':
+        # Ordinal 1 (0001-01-01) is a Monday
+        return (day.toordinal() - 1) // 7 if (day.toordinal() - 1) % 7 == 0 else None
+    if resolution == 'month':
+        return day.year * 12 + day.month - 1 if day.day == 1 else None
+    return day.toordinal()
+
+"""
+    Converts the rows of one series to the columnar form:
+        {"start": first date, "step": resolution, "values": [...]} with null for dates without a row, or
+        {"dates": [...], "values": [...]} when the dates are not regular enough for a start and a step,
+        or when a row has a null value (a null in start and step form always stands for a missing row).
+    The middle column (testing note, hospitalization indicator) is hoisted into "label" when it is the
+    same on every row, and sent as a "labels" array otherwise.
+
+    :param rows: Date-sorted rows as the endpoints return them, [date, value] or [date, label, value].
+    :param resolution: 'day', 'week' or 'month', the resolution the rows were produced at.
+    :return: The columnar series.
+"""
+def columnar_series(rows: list, resolution: str = 'day') -> dict:
+    series = {}
+    dates = [row[0] for row in rows]
+    values = [row[-1] for row in rows]
+
+    labels = [row[1] for row in rows] if rows and len(rows[0]) == 3 else None
+    if labels is not None and len(set(labels)) == 1:
+        series['label'] = labels[0]
+        labels = None
+
+    positions = [grid_position(value, resolution) for value in dates]
+    if (rows and labels is None and None not in positions and None not in values
+            and positions[-1] - positions[0] < MAX_COLUMNAR_FILL * len(rows)):
+        filled = [None] * (positions[-1] - positions[0] + 1)
+        for position, value in zip(positions, values):
+            filled[position - positions[0]] = value
+
+        series.update(start=dates[0], step=resolution, values=filled)
+    else:
+        series.update(dates=dates, values=values)
+        if labels is not None:
+            series['labels'] = labels
+
+    return series
+
+def to_columnar(data, resolution: str, packed: bool = False):
+    if isinstance(data, dict):
+        return {key: to_columnar(value, resolution, packed) for key, value in data.items()}
+
+    series = columnar_series(data, resolution)
+    if packed:
+        # MessagePack spends 9 bytes on every float but 1-5 on small integers
+        series['values'] = [int(value) if isinstance(value, float) and value.is_integer() else value for value in series['values']]
+    return series
+
+"""
+    Converts rows to an Arrow table with one row per data point: the keys nesting the series ("country",
+    or "series" then "country" for /api/batch), then date, label (testing note, hospitalization indicator,
+    null for series without one) and value.
+
+    :param data: Rows of one series, or dicts (by country, by batch spec) nesting them.
+"""
+def to_arrow(data):
+    key_names = {0: [], 1: ['country'], 2: ['series', 'country']}
+    columns = {'date': [], 'label': [], 'value': []}
+    depth = 0
+
+    def flatten(value, keys):
+        nonlocal depth
+        if isinstance(value, dict):
+            for key, nested in value.items():
+                flatten(nested, keys + [key])
+            return
+
+        depth = len(keys)
+        for name, key in zip(key_names.get(len(keys), []), keys):
+            columns.setdefault(name, []).extend([key] * len(value))
+        for row in value:
+            columns['date'].append(date.fromisoformat(row[0]))
+            columns['label'].append(row[1] if len(row) == 3 else None)
+            columns['value'].append(row[-1])
+
+    flatten(data, [])
+    names = key_names.get(depth, []) + ['date', 'label', 'value']
+    return pyarrow.table({name: pyarrow.array(columns.get(name, []), type=pyarrow.float64() if name == 'value' else None)
+                          for name in names})
+
+"""
+    Builds the response of a data endpoint in the requested format.
+
+    :param data: Rows of one series, or dicts (by country, by batch spec) nesting them.
+    :param response_format: 'json' (rows as is), 'columnar' (JSON of columnar series), 'msgpack' (MessagePack of columnar
+                            series) or 'arrow' (Arrow IPC stream, see to_arrow).
+    :param resolution: Resolution the rows were produced at.
+    :return: A Flask Response.
+"""
+def format_response(data, response_format: str = 'json', resolution: str = 'day') -> Response:
+    with phase('serialize'):
+        if response_format == 'columnar':
+            return jsonify(to_columnar(data, resolution))
+        if response_format == 'msgpack':
+            return Response(msgpack.packb(to_columnar(data, resolution, packed=True)), mimetype='application/x-msgpack')
+        if response_format == 'arrow':
+            table = to_arrow(data)
+            sink = io.BytesIO()
+            with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return Response(sink.getvalue(), mimetype=ARROW_MIMETYPE)
+        return jsonify(data)
@@ -0,0 +1,108 @@
+from flask import Response, g, request
+from Cache import get_dataset_version
+import hashlib
+import os
+
+# Cache-Control of the cacheable routes, by endpoint name. Override one with CACHE_CONTROL_<ENDPOINT>
+# (e.g. CACHE_CONTROL_GET_COUNTRIES), or all of them with CACHE_CONTROL_DEFAULT.
+DEFAULT_CACHE_CONTROL = 'public, max-age=300, must-revalidate'
+ROUTE_CACHE_CONTROL = {
+    'get_countries': 'public, max-age=86400, must-revalidate',
+    'search_countries': 'public, max-age=86400, must-revalidate'
+}
+
+# GET routes under /api whose responses are not a function of the dataset
+UNCACHEABLE_ENDPOINTS = {'pool_stats'}
+
+# Sent with every data response, so clients keeping data across requests (Frontend/app.js) can tell when it changed
+DATASET_VERSION_HEADER = 'X-Dataset-Version'
+
+def cache_control_for(endpoint: str) -> str:
+    default = os.getenv("CACHE_CONTROL_DEFAULT", DEFAULT_CACHE_CONTROL)
+    return os.getenv(f"CACHE_CONTROL_{endpoint.upper()}", ROUTE_CACHE_CONTROL.get(endpoint, default))
+
+def is_cacheable_request() -> bool:
+    return (request.method in ('GET', 'HEAD') and request.path.startswith('/api/')
+            and request.endpoint is not None and request.endpoint not in UNCACHEABLE_ENDPOINTS)
+
+"""
+    Builds the strong ETag of the current request from the dataset version, the path and the query
+    string with its parameters (and repeated values) sorted, so equivalent URLs share an ETag.
+"""
+def request_etag(version: str) -> str:
+    normalized = '&'.join(f"{key}={value}" for key in sorted(request.args.keys())
+                          for value in sorted(request.args.getlist(key)))
+    digest = hashlib.sha256(f"{version}|{request.path}|{normalized}".encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+"""
+    Gets the ETag of an encoded representation (gzip, br) of the response with the given ETag.
+"""
+def encoded_etag(etag: str, encoding: str) -> str:
+    return f'{etag[:-1]}-{encoding}"'
+
+"""
+    Finds the If-None-Match candidate matching the ETag of the current request, in any of its encodings.
+
+    :return: The matching ETag as the client sent it, or None.
+"""
+def matching_etag(etag: str):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return None
+    if header.strip() == '*':
+        return etag
+
+    # Weak comparison, as If-None-Match calls for
+    for candidate in header.split(','):
+        candidate = candidate.strip().removeprefix('W/')
+        if candidate.split('-', 1)[0].rstrip('"') == etag.rstrip('"'):
+            return candidate
+
+    return None
+
+def set_validators(response: Response):
+    response.headers['ETag'] = g.etag
+    response.headers['Cache-Control'] = cache_control_for(request.endpoint)
+
+"""
+    Answers conditional requests with 304 before the view runs, so a revalidation never reaches the
+    series cache or the database. Only the ETag validates: the dataset version has no modification time
+    that every worker agrees on and that survives a restart, so no Last-Modified is sent.
+"""
+def check_not_modified():
+    if not is_cacheable_request():
+        return None
+
+    g.etag = request_etag(get_dataset_version())
+
+    matched = matching_etag(g.etag)
+    if matched:
+        response = Response(status=304)
+        set_validators(response)
+        response.headers['ETag'] = matched
+        return response
+
+    return None
+
+def add_cache_headers(response: Response) -> Response:
+    if 'etag' not in g or response.status_code == 304:
+        return response
+
+    if response.status_code == 200:
+        set_validators(response)
+    else:
+        response.headers['Cache-Control'] = 'no-store'
+
+    return response
+
+def add_dataset_version(response: Response) -> Response:
+    if (request.path.startswith('/api/') and request.endpoint is not None and request.endpoint not in UNCACHEABLE_ENDPOINTS
+            and response.status_code in (200, 304)):
+        response.headers[DATASET_VERSION_HEADER] = get_dataset_version()
+    return response
+
+def register_http_caching(app):
+    app.before_request(check_not_modified)
+    app.after_request(add_cache_headers)
+    app.after_request(add_dataset_version)
@@ -0,0 +1,234 @@
+from collections import Counter
+from contextlib import contextmanager
+from flask import Response, g, has_request_context, request
+from dotenv import load_dotenv
+import bisect
+import os
+import re
+import sys
+import threading
+import time
+
+load_dotenv()
+
+# Phases timed within a request, in Server-Timing order
+PHASES = ['db_connect', 'db_execute', 'db_fetch', 'regroup', 'transform', 'downsample', 'serialize', 'compress']
+
+HISTOGRAM_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# Requests slower than this are dumped as folded stacks (flamegraph.pl / speedscope input), 0 disables the profiler
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+class Histogram:
+    """
+        Prometheus style cumulative histogram, one series per label set.
+
+        Params:
+            - name: metric name
+            - description: HELP text
+            - label_names: names of the labels, in the order observe() receives their values
+            - buckets: upper bounds of the buckets (seconds)
+    """
+    def __init__(self, name, description, label_names, buckets=HISTOGRAM_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+                cumulative = 0
+                for bound, count in zip(self.buckets + ['+Inf'], counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+                lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+
+        return lines
+
+
+class CounterMetric:
+    """
+        Prometheus style counter, one series per label set.
+
+        Params:
+            - name: metric name (ending in _total)
+            - description: HELP text
+            - label_names: names of the labels, in the order inc() receives their values
+    """
+    def __init__(self, name, description, label_names):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+        counters.append(self)
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def value(self, labels) -> float:
+        with self._lock:
+            return self._series.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+
+        with self._lock:
+            for labels, value in sorted(self._series.items()):
+                label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+                lines.append(f"{self.name}{{{label_text}}} {value}")
+
+        return lines
+
+# Every CounterMetric, rendered after the histograms
+counters = []
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+request_duration = Histogram('covid_api_request_duration_seconds', 'Time spent handling a request', ['route', 'status'])
+phase_duration = Histogram('covid_api_request_phase_seconds', 'Time spent in each phase of a request', ['route', 'phase'])
+
+"""
+    Adds time to a phase of the current request. Outside of a request it does nothing.
+"""
+def record_phase(name: str, seconds: float):
+    if has_request_context() and 'phase_timings' in g:
+        g.phase_timings[name] = g.phase_timings.get(name, 0.0) + seconds
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started)
+
+
+class SamplingProfiler:
+    """
+        Samples the stacks of the threads serving a request every interval and keeps them, folded and
+        counted, until the request ends. Only requests slower than the threshold are written out.
+
+        Params:
+            - threshold_ms: requests at least this slow are dumped
+            - interval_ms: time between two samples
+            - directory: where the .folded files are written
+    """
+    def __init__(self, threshold_ms, interval_ms, directory):
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+
+            with self._lock:
+                for thread_id, stacks in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[fold_stack(frame)] += 1
+
+    def begin(self):
+        self.start()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self, label: str, elapsed_ms: float):
+        with self._lock:
+            stacks = self._active.pop(threading.get_ident(), None)
+
+        if stacks and elapsed_ms >= self.threshold_ms:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}_{re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')}_{elapsed_ms:.0f}ms.folded")
+            with open(path, 'w') as profile_file:
+                for stack, count in stacks.most_common():
+                    profile_file.write(f"{stack} {count}\n")
+
+
+"""
+    Formats a stack as the semicolon separated frames (outermost first) of the folded stack format.
+"""
+def fold_stack(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+profiler = SamplingProfiler(PROFILE_SLOW_REQUEST_MS, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_DIR) if PROFILE_SLOW_REQUEST_MS > 0 else None
+
+def route_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def start_timing():
+    g.request_started = time.perf_counter()
+    g.phase_timings = {}
+    if profiler is not None:
+        profiler.begin()
+
+def finish_timing(response: Response) -> Response:
+    if 'request_started' not in g:
+        return response
+
+    elapsed = time.perf_counter() - g.request_started
+    route = route_label()
+    timings = sorted(g.phase_timings.items(), key=lambda item: PHASES.index(item[0]) if item[0] in PHASES else len(PHASES))
+
+    request_duration.observe((route, str(response.status_code)), elapsed)
+    for name, seconds in timings:
+        phase_duration.observe((route, name), seconds)
+
+    response.headers['Server-Timing'] = ', '.join([f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings] + [f"total;dur={elapsed * 1000:.2f}"])
+    return response
+
+def end_profiling(exception=None):
+    if profiler is not None and 'request_started' in g:
+        profiler.end(f"{request.method} {route_label()}", (time.perf_counter() - g.request_started) * 1000)
+
+"""
+    Renders every histogram and counter in the Prometheus text exposition format.
+"""
+def render_metrics() -> str:
+    lines = request_duration.render() + phase_duration.render()
+    for counter in counters:
+        lines += counter.render()
+    return '\n'.join(lines) + '\n'
+
+"""
+    Registers request timing. Call before the other before_request hooks are registered, so the
+    timings cover them (and their after_request hooks, like compression).
+"""
+def register_instrumentation(app):
+    app.before_request(start_timing)
+    app.after_request(finish_timing)
+    app.teardown_request(end_profiling)
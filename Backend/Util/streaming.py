@@ -0,0 +1,66 @@
+from flask import Response, current_app, stream_with_context
+from itertools import chain
+from Errors.custom_exceptions import EmptyQueryOutputError
+
+"""
+    Writes batches of (country, row) tuples, ordered by country, as the JSON object the compare
+    endpoints return ({country: [row, ...], ...}). One chunk is produced per batch.
+"""
+def grouped_json_chunks(batches):
+    provider = current_app.json
+    dumps = lambda value: provider.dumps(value, separators=(',', ':'))
+    current_country = None
+
+    yield '{'
+    for batch in batches:
+        parts = []
+
+        for country, row in batch:
+            if country != current_country:
+                if current_country is not None:
+                    parts.append('],')
+                parts.append(f"{dumps(country)}:[")
+                current_country = country
+            else:
+                parts.append(',')
+            parts.append(dumps(row))
+
+        yield ''.join(parts)
+
+    yield ']}' if current_country is not None else '}'
+
+"""
+    Builds a streaming JSON response from batches of (country, row) tuples.
+
+    :param batches: Iterator of batches, e.g. from stream_series_window.
+    :param empty_message: Message of the EmptyQueryOutputError raised when there are no rows at all.
+    :return: A Flask Response that writes the JSON object incrementally.
+"""
+def grouped_json_response(batches, empty_message: str) -> Response:
+    batches = iter(batches)
+    first_batch = next(batches, None)
+
+    if not first_batch:
+        if hasattr(batches, 'close'):
+            batches.close()
+        raise EmptyQueryOutputError(empty_message)
+
+    return Response(stream_with_context(grouped_json_chunks(chain([first_batch], batches))), mimetype='application/json')
+
+"""
+    Builds a streaming file download from chunks of bytes. The first chunk is produced before the
+    response starts, so errors raised while setting up the stream (e.g. by the query) still become
+    an error response rather than a truncated file.
+
+    :param chunks: Iterator of bytes, e.g. from db.export.
+    :param mimetype: Mimetype of the file.
+    :param filename: Name the client saves the file under.
+    :return: A Flask Response sent with chunked transfer encoding.
+"""
+def download_response(chunks, mimetype: str, filename: str) -> Response:
+    chunks = iter(chunks)
+    first_chunk = next(chunks, b'')
+
+    response = Response(chain([first_chunk], chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,73 @@
+import numpy as np
+from Util.instrumentation import phase
+
+TRANSFORMS = ['daily', 'rolling7', 'per_million', 'growth_rate']
+
+# Metrics holding a value per day rather than a running total, their daily series is the value itself
+DAILY_METRICS = ['v_daily_vaccinations']
+
+# Metrics already relative to the population
+PER_CAPITA_METRICS = ['v_people_fully_vaccinated_per_hundred', 'v_total_boosters_per_hundred']
+
+DECIMALS = 3
+
+def _to_values(values: np.ndarray, integral: bool) -> list:
+    if integral:
+        return [None if value != value else int(value) for value in values.tolist()]
+    return [None if value != value else value for value in np.round(values, DECIMALS).tolist()]
+
+"""
+    Derives a series from a full, date-sorted series. Observations are the non-null values; days
+    between two observations are not filled in.
+        - daily: change since the previous observation (for running totals), the value itself otherwise
+        - rolling7: mean daily value over the 7 days ending on each date (since the last observation
+                    before them after a gap)
+        - per_million: value per million inhabitants
+        - growth_rate: change since the previous observation, in percent of it
+
+    :param dates: 'YYYY-MM-DD' dates of the rows.
+    :param rows: Endpoint rows whose last column is the value.
+    :param transform: One of TRANSFORMS.
+    :param variant: Metric column, decides whether the value is a running total.
+    :param population: Population of the country, required by per_million.
+    :return: Tuple of (dates, rows) with the derived value as last column, starting at the first
+             date where it is defined.
+"""
+def transform_series(dates: list, rows: list, transform: str, variant: str = None, population: float = None):
+    with phase('transform'):
+        kept = [i for i, row in enumerate(rows) if row[-1] is not None]
+        if not kept:
+            return [], []
+
+        days = np.array([dates[i] for i in kept], dtype='datetime64[D]')
+        values = np.array([rows[i][-1] for i in kept], dtype=np.float64)
+        integral = all(isinstance(rows[i][-1], int) for i in kept)
+        cumulative = variant not in DAILY_METRICS
+
+        if transform == 'per_million':
+            derived = values / population * 1e6
+            integral = False
+        elif transform == 'daily':
+            derived = np.r_[np.nan, np.diff(values)] if cumulative else values
+        elif transform == 'growth_rate':
+            previous = np.r_[np.nan, values[:-1]]
+            derived = np.divide(values - previous, previous, out=np.full(len(values), np.nan), where=previous > 0) * 100
+            integral = False
+        else:
+            # Index of the last observation at least 7 days before each date, -1 when there is none
+            window_start = np.searchsorted(days, days - np.timedelta64(7, 'D'), side='right') - 1
+            defined = window_start >= 0
+            if cumulative:
+                # Spread over the days actually elapsed, which are more than 7 after a gap in the observations
+                elapsed = (days - days[np.maximum(window_start, 0)]).astype(np.float64)
+                derived = np.divide(values - values[np.maximum(window_start, 0)], elapsed, out=np.full(len(values), np.nan), where=defined)
+            else:
+                sums = np.r_[0.0, np.cumsum(values)]
+                counts = np.arange(1, len(values) + 1) - (window_start + 1)
+                derived = np.where(defined, (sums[1:] - sums[window_start + 1]) / counts, np.nan)
+            integral = False
+
+        first = int(np.argmax(~np.isnan(derived))) if not np.isnan(derived).all() else len(derived)
+        values = _to_values(derived[first:], integral)
+        return ([dates[i] for i in kept[first:]],
+                [[*rows[i][:-1], value] for i, value in zip(kept[first:], values)])
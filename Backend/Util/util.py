@@ -1,4 +1,10 @@
 import re
+from Errors.custom_exceptions import MissingParameterError, UnknownParameterError, IncorrectParameterFormError
+from Util.formats import response_formats
+from Util.transforms import TRANSFORMS, PER_CAPITA_METRICS
+from db.series import TESTING_METRICS, VACCINATIONS_METRICS, HOSPITALIZATIONS_INDICATORS
+
+CATEGORIES = ['cases', 'deaths', 'testing', 'hospitalizations', 'vaccinations']
 
 def find_missing_variables(**kwargs):
     return [name for name, value in kwargs.items() if value is None]
@@ -8,4 +14,141 @@ def is_valid_date(date):
 
     if re.match(pattern, date):
         return True
-    return False
\ No newline at end of file
+    return False
+
+def is_valid_resolution(resolution):
+    return resolution in ['day', 'week', 'month']
+
+def is_valid_max_points(max_points):
+    return max_points.isdigit() and int(max_points) >= 3
+
+def is_valid_limit(limit):
+    return limit.isdigit() and 1 <= int(limit) <= 1000
+
+def is_valid_format(response_format):
+    return response_format in response_formats()
+
+def is_valid_transform(transform):
+    return transform in TRANSFORMS
+
+def is_valid_order(order):
+    return order in ['asc', 'desc']
+
+def is_valid_date_ranges(date_ranges, max_ranges):
+    return (isinstance(date_ranges, list) and len(date_ranges) <= max_ranges
+            and all(isinstance(date_range, list) and len(date_range) == 2 and all(isinstance(date, str) and is_valid_date(date) for date in date_range)
+                    and date_range[0] <= date_range[1] for date_range in date_ranges))
+
+"""
+    Rejects the parameters an endpoint does not accept.
+
+    :param params: Query string (request.args) or JSON body of the request.
+    :param accepted_params: Names of the parameters the endpoint accepts.
+"""
+def check_unknown_parameters(params, accepted_params):
+    unknown_params = [key for key in params.keys() if key not in accepted_params]
+
+    if unknown_params:
+        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+
+"""
+    Rejects a request without one of its required parameters.
+
+    :param kwargs: Required parameters by name, None when left out.
+"""
+def check_missing_parameters(**kwargs):
+    missing_vars = find_missing_variables(**kwargs)
+
+    if missing_vars:
+        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
+
+def check_date_window(start_date, end_date):
+    if not isinstance(start_date, str) or not isinstance(end_date, str) or not is_valid_date(start_date) or not is_valid_date(end_date):
+        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
+
+def check_countries(countries, minimum):
+    if not isinstance(countries, list) or len(countries) < minimum or not all(isinstance(country, str) for country in countries):
+        raise IncorrectParameterFormError(f"At least {minimum} {'country' if minimum == 1 else 'countries'} must be provided for parameter: countries")
+
+"""
+    Parses a true/false parameter, case-insensitive.
+
+    :param value: Parameter value, a string from the query string or a boolean from a JSON body.
+    :param name: Parameter name, for the error message.
+    :return: The boolean value.
+"""
+def parse_boolean(value, name):
+    value = str(value).lower()
+
+    if value not in ['true', 'false']:
+        raise IncorrectParameterFormError(f"{name} must be a boolean value")
+    return value == 'true'
+
+"""
+    Parses a limit on the number of locations returned.
+
+    :param limit: Parameter value, or None when left out.
+    :return: The limit, None when left out.
+"""
+def parse_limit(limit):
+    if limit is not None and not is_valid_limit(limit):
+        raise IncorrectParameterFormError("limit must be an integer between 1 and 1000")
+    return int(limit) if limit is not None else None
+
+"""
+    Parses the options the series endpoints share. Endpoints without a transform leave it out of their accepted
+    parameters, so it is None for them.
+
+    :param params: Query string (request.args) or JSON body of the request.
+    :return: Tuple of resolution, max_points (int or None), response format and transform (or None).
+"""
+def parse_series_options(params):
+    resolution = params.get('resolution', 'day')
+    max_points = params.get('max_points')
+    response_format = params.get('format', 'json')
+    transform = params.get('transform')
+
+    if not is_valid_resolution(resolution):
+        raise IncorrectParameterFormError("resolution must be one of: day, week, month")
+
+    if max_points is not None and not is_valid_max_points(str(max_points)):
+        raise IncorrectParameterFormError("max_points must be an integer of at least 3")
+
+    if not is_valid_format(response_format):
+        raise IncorrectParameterFormError(f"format must be one of: {', '.join(response_formats())}")
+
+    if transform is not None and not is_valid_transform(transform):
+        raise IncorrectParameterFormError(f"transform must be one of: {', '.join(TRANSFORMS)}")
+
+    return resolution, int(max_points) if max_points is not None else None, response_format, transform
+
+"""
+    Parses the series of a category.
+
+    :param category: One of cases, deaths, testing, hospitalizations, vaccinations.
+    :param metric: Metric column (testing, vaccinations).
+    :param indicator: Indicator name (hospitalizations).
+    :param per_million: Whether to use the per million indicator (hospitalizations).
+    :return: Metric column (testing, vaccinations), full indicator name (hospitalizations) or None.
+"""
+def parse_series_variant(category, metric=None, indicator=None, per_million='false'):
+    if category not in CATEGORIES:
+        raise ValueError(f"Invalid category name: {category}")
+
+    if category in ('testing', 'vaccinations'):
+        accepted_metrics = TESTING_METRICS if category == 'testing' else VACCINATIONS_METRICS
+
+        if metric not in accepted_metrics:
+            raise ValueError(f"Invalid metric name: {metric}")
+        return metric
+
+    if category == 'hospitalizations':
+        if indicator not in HOSPITALIZATIONS_INDICATORS:
+            raise ValueError(f"Invalid indicator name: {indicator}")
+        return indicator + (" per million" if parse_boolean(per_million, 'per_million') else "")
+
+    return None
+
+def check_per_million(variant):
+    if variant in PER_CAPITA_METRICS:
+        raise IncorrectParameterFormError(f"per_million does not apply to metric: {variant}")
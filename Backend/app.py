@@ -1,13 +1,30 @@
+from db import init_db_pool, get_pool_stats
+from db.async_queries import get_async_pool_stats
+from db.statements import get_statement_stats
+from db.singleflight import get_coalescing_stats
 from db.queries import *
-from flask import Flask, jsonify, request
+from db.export import EXPORT_TABLES, export_formats, export_csv, export_parquet
+from db.series import *
+from Cache.invalidation import start_invalidation_listener
+from Engine import memory_store, country_catalogue
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 from Errors import *
 from Errors.custom_exceptions import *
 from Util.util import *
+from Util.streaming import *
+from Util.downsample import *
+from Util.formats import format_response
+from Util.instrumentation import register_instrumentation, render_metrics
+from Util.http_cache import register_http_caching, DATASET_VERSION_HEADER
+from Util.compression import register_compression
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[DATASET_VERSION_HEADER])
 register_error_handlers(app)
+register_instrumentation(app)
+register_http_caching(app)
+register_compression(app)
 
 
 # Retrieve all country names for populating dropdown menu
@@ -17,21 +34,83 @@ register_error_handlers(app)
     Params: None
 
     Returns:
-        - List of country names
+        - List of country names, sorted
 """
 @app.route('/api/get-countries', methods=['GET'])
 def get_countries():
     try:
-        query = 'SELECT l_nationname FROM location;'
-        data = execute_query(query, fetch_results=True)
+        query = COUNTRIES_QUERY
+        data = get_country_names()
 
         if data:
-            flattened_data = [item for sublist in data for item in sublist]
-            return jsonify(flattened_data)
+            return jsonify(data)
         else:
             raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}'")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
+
+
+# Search the country catalogue, for autocompletion
+"""
+    Get the countries and regions whose name or key starts with a prefix
+
+    Params:
+        - prefix: (optional) start of the name (e.g. Uni) or ISO key (e.g. USA, OWID_ for aggregate regions), case-insensitive, every location when empty
+        - limit: (optional) maximum number of locations returned, 20 by default, at most 1000
+
+    Returns:
+        - list of locations sorted by name, each with its name, key and whether it is an aggregate region
+"""
+@app.route('/api/countries', methods=['GET'])
+def search_countries():
+    check_unknown_parameters(request.args, ['prefix', 'limit'])
+
+    prefix = request.args.get('prefix', '')
+    limit = parse_limit(request.args.get('limit', '20'))
+
+    try:
+        data = country_catalogue.search(prefix, limit)
+
+        if data:
+            return jsonify(data)
+        else:
+            raise EmptyQueryOutputError(f"No location matches the prefix: '{prefix}'")
+    except Exception as e:
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
+
+
+# Connection pool metrics for monitoring
+"""
+    Get connection pool usage
+
+    Params: None
+
+    Returns:
+        - Pool size, connections in use/idle, waiting requests and wait time (ms), plus the same
+          for the async pool under async_pool, the executions of registered statements under statements and the
+          database executions saved by coalescing identical queries under coalescing
+"""
+@app.route('/api/pool-stats', methods=['GET'])
+def pool_stats():
+    return jsonify({**get_pool_stats(), "async_pool": get_async_pool_stats(), "statements": get_statement_stats(),
+                    "coalescing": get_coalescing_stats()})
+
+
+# Request timing histograms for Prometheus
+"""
+    Get request and per-phase timing histograms
+
+    Params: None
+
+    Returns:
+        - Prometheus text exposition format, covid_api_request_duration_seconds by route and status and
+          covid_api_request_phase_seconds by route and phase (db_connect, db_execute, db_fetch, regroup,
+          downsample, serialize, compress), covid_api_registered_statement_executions_total by connection (after_warmup, first)
+          and covid_api_coalesced_queries_total by result (executed, shared)
+"""
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 
 # Single country queries
@@ -42,41 +121,37 @@ def get_countries():
         - country: name of country (or location in general)
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - transform: (optional) daily (new per day), rolling7 (7-day average of daily values), per_million or growth_rate (percent change per day)
 
     Returns:
         - list of tuples (date and total cases value)
 """
 @app.route('/api/cases-by-country', methods=['GET'])
 def cases_by_country():
-    accepted_params = ['country', 'end', 'start']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['country', 'end', 'start', 'resolution', 'max_points', 'format', 'transform'])
 
     country = request.args.get('country')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
-    missing_vars = find_missing_variables(country=country, start_date=start_date, end_date=end_date)
-
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
+    check_missing_parameters(country=country, start_date=start_date, end_date=end_date)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, transform = parse_series_options(request.args)
 
     try:
-        params = (country, start_date, end_date)
-        query = """SELECT TO_CHAR(c_date, 'YYYY-MM-DD') AS formatted_date, c_cases FROM cases JOIN location ON 
-                    l_nationkey = c_nationkey WHERE l_nationname = %s AND c_date BETWEEN %s AND %s;"""
-        data = execute_query(query, params, True)
+        params = (country, start_date, end_date, transform)
+        data = get_series_window('cases', [country], start_date, end_date, None, transform).get(country)
+        data = downsample_rows(data, resolution, max_points)
         
         if data:
-            return jsonify(data)
+            return format_response(data, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'cases' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
    
 """
@@ -86,41 +161,37 @@ def cases_by_country():
         - country: name of country (or location in general)
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - transform: (optional) daily (new per day), rolling7 (7-day average of daily values), per_million or growth_rate (percent change per day)
 
     Returns:
         - list of tuples (date and total deaths value)
 """
 @app.route('/api/deaths-by-country', methods=['GET'])
 def deaths_by_country():
-    accepted_params = ['country', 'end', 'start']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['country', 'end', 'start', 'resolution', 'max_points', 'format', 'transform'])
 
     country = request.args.get('country')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
-    missing_vars = find_missing_variables(country=country, start_date=start_date, end_date=end_date)
-
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
+    check_missing_parameters(country=country, start_date=start_date, end_date=end_date)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, transform = parse_series_options(request.args)
 
     try:
-        params = (country, start_date, end_date)
-        query = """SELECT TO_CHAR(d_date, 'YYYY-MM-DD') AS formatted_date, d_death FROM deaths JOIN location ON 
-                    l_nationkey = d_nationkey WHERE l_nationname = %s AND d_date BETWEEN %s AND %s;"""
-        data = execute_query(query, params, True)
+        params = (country, start_date, end_date, transform)
+        data = get_series_window('deaths', [country], start_date, end_date, None, transform).get(country)
+        data = downsample_rows(data, resolution, max_points)
         
         if data:
-            return jsonify(data)
+            return format_response(data, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'deaths' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
     
 
 """
@@ -130,6 +201,10 @@ def deaths_by_country():
         - country: name of country (or location in general)
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
         - metric: testing metric of choice
 
     Returns:
@@ -137,41 +212,28 @@ def deaths_by_country():
 """
 @app.route('/api/testing-by-country', methods=['GET'])
 def testing_by_country():
-    accepted_params = ['country', 'end', 'start', 'metric']
-    accepted_metrics = ['t_cumulative_total', 't_daily_change_ct', 't_ct_per_thousand', 't_daily_change_ct_per_thousand', 
-                        't_short_term_positive_rate', 't_short_term_tests_per_case']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['country', 'end', 'start', 'metric', 'resolution', 'max_points', 'format'])
 
     country = request.args.get('country')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
     metric = request.args.get('metric')
-    missing_vars = find_missing_variables(country=country, start_date=start_date, end_date=end_date, metric=metric)
-
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
-
-    if metric not in accepted_metrics:
-        raise ValueError(f"Invalid metric name: {metric}")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
+    check_missing_parameters(country=country, start_date=start_date, end_date=end_date, metric=metric)
+    parse_series_variant('testing', metric=metric)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, _ = parse_series_options(request.args)
 
     try:
-        params = (country, start_date, end_date)
-        query = f"""SELECT TO_CHAR(t_date, 'YYYY-MM-DD') AS formatted_date, split_part(t_entity, ' - ', 2) AS metric_value, 
-                    {metric} FROM testing JOIN location ON l_nationkey = t_nationkey WHERE l_nationname = %s AND t_date BETWEEN %s AND %s;"""
-        data = execute_query(query, params, True)
+        params = (country, start_date, end_date, metric)
+        data = get_series_window('testing', [country], start_date, end_date, metric).get(country)
+        data = downsample_rows(data, resolution, max_points)
         
         if data:
-            return jsonify(data)
+            return format_response(data, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'testing' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
 
 """
@@ -181,6 +243,10 @@ def testing_by_country():
         - country: name of country (or location in general)
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
         - indicator: hospitalization metric
         - per_million: boolean
 
@@ -189,49 +255,29 @@ def testing_by_country():
 """
 @app.route('/api/hospitalizations-by-country', methods=['GET'])
 def hospitalizations_by_country():
-    accepted_params = ['country', 'end', 'start', 'indicator', 'per_million']
-    accepted_indicators = ['Daily hospital occupancy', 'Daily ICU occupancy', 'Weekly new hospital admissions', 
-                           'Weekly new ICU admissions']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['country', 'end', 'start', 'indicator', 'per_million', 'resolution', 'max_points', 'format'])
 
     country = request.args.get('country')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
     indicator = request.args.get('indicator')
     per_million = request.args.get('per_million')
-    missing_vars = find_missing_variables(country=country, start_date=start_date, end_date=end_date, indicator=indicator, per_million=per_million)
-
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
-    
-    if indicator not in accepted_indicators:
-        raise ValueError(f"Invalid indicator name: {indicator}")
-    
-    if per_million.lower() not in ['true', 'false']:
-        raise ValueError("per_million must be a boolean value")
+    check_missing_parameters(country=country, start_date=start_date, end_date=end_date, indicator=indicator, per_million=per_million)
+    full_indicator = parse_series_variant('hospitalizations', indicator=indicator, per_million=per_million)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, _ = parse_series_options(request.args)
 
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
-
-    full_indicator = indicator
-    if per_million.lower() == 'true':
-        full_indicator += " per million"
-    
     try:
         params = (country, full_indicator, start_date, end_date)
-        query = """SELECT TO_CHAR(h_date, 'YYYY-MM-DD') AS formatted_date, h_indicator, h_value FROM hospitalizations 
-                    WHERE h_nationname = %s AND h_indicator = %s AND h_date BETWEEN %s AND %s;"""
-        data = execute_query(query, params, True)
+        data = get_series_window('hospitalizations', [country], start_date, end_date, full_indicator).get(country)
+        data = downsample_rows(data, resolution, max_points)
         
         if data:
-            return jsonify(data)
+            return format_response(data, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'hospitalizations' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
     
 
 """
@@ -241,6 +287,11 @@ def hospitalizations_by_country():
         - country: name of country (or location in general)
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - transform: (optional) daily (new per day), rolling7 (7-day average of daily values), per_million or growth_rate (percent change per day)
         - metric: vaccinations metric of choice
 
     Returns:
@@ -248,41 +299,31 @@ def hospitalizations_by_country():
 """
 @app.route('/api/vaccinations-by-country', methods=['GET'])
 def vaccinations_by_country():
-    accepted_params = ['country', 'end', 'start', 'metric']
-    accepted_metrics = ['v_total_vaccinations', 'v_people_fully_vaccinated', 'v_total_boosters', 
-                        'v_daily_vaccinations', 'v_people_fully_vaccinated_per_hundred', 'v_total_boosters_per_hundred']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['country', 'end', 'start', 'metric', 'resolution', 'max_points', 'format', 'transform'])
 
     country = request.args.get('country')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
     metric = request.args.get('metric')
-    missing_vars = find_missing_variables(country=country, start_date=start_date, end_date=end_date, metric=metric)
+    check_missing_parameters(country=country, start_date=start_date, end_date=end_date, metric=metric)
+    parse_series_variant('vaccinations', metric=metric)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, transform = parse_series_options(request.args)
 
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
-
-    if metric not in accepted_metrics:
-        raise ValueError(f"Invalid metric name: {metric}")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
+    if transform == 'per_million':
+        check_per_million(metric)
 
     try:
-        params = (country, start_date, end_date)
-        query = f"""SELECT TO_CHAR(v_date, 'YYYY-MM-DD') AS formatted_date, {metric} FROM vaccinations 
-                    WHERE v_nationname = %s AND v_date BETWEEN %s AND %s;"""
-        data = execute_query(query, params, True)
+        params = (country, start_date, end_date, metric, transform)
+        data = get_series_window('vaccinations', [country], start_date, end_date, metric, transform).get(country)
+        data = downsample_rows(data, resolution, max_points)
         
         if data:
-            return jsonify(data)
+            return format_response(data, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'vaccinations' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
 
 # Multi-country queries (for comparison)
@@ -293,58 +334,44 @@ def vaccinations_by_country():
         - countries: name of countries (or location in general) REQUIRES: 2+
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - transform: (optional) daily (new per day), rolling7 (7-day average of daily values), per_million or growth_rate (percent change per day)
+        - stream: (optional) boolean, stream the response from a server-side cursor (ignored when downsampling, with a transform or with a format other than json)
 
     Returns:
         - list of tuples (date, country, and total cases value)
 """
 @app.route('/api/compare-cases-by-country', methods=['GET'])
 def compare_cases_by_country():
-    accepted_params = ['countries', 'end', 'start']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
+    check_unknown_parameters(request.args, ['countries', 'end', 'start', 'stream', 'resolution', 'max_points', 'format', 'transform'])
 
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
-    
     countries = request.args.getlist('countries')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
-    missing_vars = find_missing_variables(countries=countries, start_date=start_date, end_date=end_date)
+    stream = parse_boolean(request.args.get('stream', 'false'), 'stream')
+    check_missing_parameters(countries=countries, start_date=start_date, end_date=end_date)
+    check_countries(countries, 2)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, transform = parse_series_options(request.args)
 
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
-
-    if len(countries) < 2:
-        raise IncorrectParameterFormError("At least 2 countries must be provided for parameter: countries")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
-    
     try:
-        # Dynamically create placeholders for the IN clause
-        placeholders = ', '.join(['%s'] * len(countries))
-        params = countries + [start_date, end_date]
-        query = f"""SELECT TO_CHAR(c_date, 'YYYY-MM-DD') AS formatted_date, l_nationname, c_cases FROM cases
-                    JOIN location ON l_nationkey = c_nationkey WHERE l_nationname IN ({placeholders}) AND 
-                    c_date BETWEEN %s AND %s ORDER BY l_nationname, formatted_date;"""
-        data = execute_query(query, params, True)
+        params = countries + [start_date, end_date, transform]
+        if stream and resolution == 'day' and max_points is None and transform is None and response_format == 'json':
+            return grouped_json_response(stream_series_window('cases', countries, start_date, end_date),
+                                         f"Query returned no rows. Category: 'cases' with parameters: {params}")
 
-        if data:
-            json_result = {}
-
-            for row in data:
-                country = row[1]
-                row_cleaned = [row[0], row[2]]
-
-                if country not in json_result:
-                    json_result[country] = []
-                
-                json_result[country].append(row_cleaned)
-            
-            return jsonify(json_result)
+        json_result = get_series_window('cases', countries, start_date, end_date, None, transform)
+        json_result = {country: downsample_rows(rows, resolution, max_points) for country, rows in json_result.items()}
+
+        if json_result:
+            return format_response(json_result, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'cases' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
 
 """
@@ -354,58 +381,44 @@ def compare_cases_by_country():
         - countries: name of countries (or location in general) REQUIRES: 2+
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - transform: (optional) daily (new per day), rolling7 (7-day average of daily values), per_million or growth_rate (percent change per day)
+        - stream: (optional) boolean, stream the response from a server-side cursor (ignored when downsampling, with a transform or with a format other than json)
 
     Returns:
         - list of tuples (date, country, and total deaths value)
 """
 @app.route('/api/compare-deaths-by-country', methods=['GET'])
 def compare_deaths_by_country():
-    accepted_params = ['countries', 'end', 'start']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
+    check_unknown_parameters(request.args, ['countries', 'end', 'start', 'stream', 'resolution', 'max_points', 'format', 'transform'])
 
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
-    
     countries = request.args.getlist('countries')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
-    missing_vars = find_missing_variables(countries=countries, start_date=start_date, end_date=end_date)
-
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
+    stream = parse_boolean(request.args.get('stream', 'false'), 'stream')
+    check_missing_parameters(countries=countries, start_date=start_date, end_date=end_date)
+    check_countries(countries, 2)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, transform = parse_series_options(request.args)
 
-    if len(countries) < 2:
-        raise IncorrectParameterFormError("At least 2 countries must be provided for parameter: countries")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
-    
     try:
-        # Dynamically create placeholders for the IN clause
-        placeholders = ', '.join(['%s'] * len(countries))
-        params = countries + [start_date, end_date]
-        query = f"""SELECT TO_CHAR(d_date, 'YYYY-MM-DD') AS formatted_date, l_nationname, d_death FROM deaths
-                    JOIN location ON l_nationkey = d_nationkey WHERE l_nationname IN ({placeholders}) AND 
-                    d_date BETWEEN %s AND %s ORDER BY l_nationname, formatted_date;"""
-        data = execute_query(query, params, True)
+        params = countries + [start_date, end_date, transform]
+        if stream and resolution == 'day' and max_points is None and transform is None and response_format == 'json':
+            return grouped_json_response(stream_series_window('deaths', countries, start_date, end_date),
+                                         f"Query returned no rows. Category: 'deaths' with parameters: {params}")
 
-        if data:
-            json_result = {}
-
-            for row in data:
-                country = row[1]
-                row_cleaned = [row[0], row[2]]
-
-                if country not in json_result:
-                    json_result[country] = []
-                
-                json_result[country].append(row_cleaned)
-            
-            return jsonify(json_result)
+        json_result = get_series_window('deaths', countries, start_date, end_date, None, transform)
+        json_result = {country: downsample_rows(rows, resolution, max_points) for country, rows in json_result.items()}
+
+        if json_result:
+            return format_response(json_result, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'deaths' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
 
 """
@@ -415,6 +428,11 @@ def compare_deaths_by_country():
         - countries: name of countries (or location in general) REQUIRES: 2+
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - stream: (optional) boolean, stream the response from a server-side cursor (ignored when downsampling or with a format other than json)
         - metric: testing metric of choice
 
     Returns:
@@ -422,58 +440,34 @@ def compare_deaths_by_country():
 """
 @app.route('/api/compare-testing-by-country', methods=['GET'])
 def compare_testing_by_country():
-    accepted_params = ['countries', 'end', 'start', 'metric']
-    accepted_metrics = ['t_cumulative_total', 't_daily_change_ct', 't_ct_per_thousand', 't_daily_change_ct_per_thousand', 
-                        't_short_term_positive_rate', 't_short_term_tests_per_case']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['countries', 'end', 'start', 'stream', 'metric', 'resolution', 'max_points', 'format'])
 
     countries = request.args.getlist('countries')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
+    stream = parse_boolean(request.args.get('stream', 'false'), 'stream')
     metric = request.args.get('metric')
-    missing_vars = find_missing_variables(countries=countries, start_date=start_date, end_date=end_date, metric=metric)
-
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
+    check_missing_parameters(countries=countries, start_date=start_date, end_date=end_date, metric=metric)
+    check_countries(countries, 2)
+    parse_series_variant('testing', metric=metric)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, _ = parse_series_options(request.args)
 
-    if len(countries) < 2:
-        raise IncorrectParameterFormError("At least 2 countries must be provided for parameter: countries")
+    try:
+        params = countries + [start_date, end_date, metric]
+        if stream and resolution == 'day' and max_points is None and response_format == 'json':
+            return grouped_json_response(stream_series_window('testing', countries, start_date, end_date, metric),
+                                         f"Query returned no rows. Category: 'testing' with parameters: {params}")
 
-    if metric not in accepted_metrics:
-        raise ValueError(f"Invalid metric name: {metric}")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
+        json_result = get_series_window('testing', countries, start_date, end_date, metric)
+        json_result = {country: downsample_rows(rows, resolution, max_points) for country, rows in json_result.items()}
 
-    try:
-        # Dynamically create placeholders for the IN clause
-        placeholders = ', '.join(['%s'] * len(countries))
-        params = countries + [start_date, end_date]
-        query = f"""SELECT TO_CHAR(t_date, 'YYYY-MM-DD') AS formatted_date, l_nationname, split_part(t_entity, ' - ', 2) AS metric_value, 
-                    {metric} FROM testing JOIN location ON l_nationkey = t_nationkey WHERE l_nationname IN ({placeholders}) AND t_date BETWEEN %s AND %s
-                    ORDER BY l_nationname, formatted_date;"""
-        data = execute_query(query, params, True)
-        
-        if data:
-            json_result = {}
-
-            for row in data:
-                country = row[1]
-                row_cleaned = [row[0], row[2], row[3]]
-
-                if country not in json_result:
-                    json_result[country] = []
-                
-                json_result[country].append(row_cleaned)
-            
-            return jsonify(json_result)
+        if json_result:
+            return format_response(json_result, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'testing' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
 
 """
@@ -483,6 +477,11 @@ def compare_testing_by_country():
         - countries: name of countries (or location in general) REQUIRES: 2+
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - stream: (optional) boolean, stream the response from a server-side cursor (ignored when downsampling or with a format other than json)
         - indicator: hospitalization metric
         - per_million: boolean
 
@@ -491,65 +490,35 @@ def compare_testing_by_country():
 """     
 @app.route('/api/compare-hospitalizations-by-country', methods=['GET'])
 def compare_hospitalizations_by_country():
-    accepted_params = ['countries', 'end', 'start', 'indicator', 'per_million']
-    accepted_indicators = ['Daily hospital occupancy', 'Daily ICU occupancy', 'Weekly new hospital admissions', 
-                           'Weekly new ICU admissions']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['countries', 'end', 'start', 'stream', 'indicator', 'per_million', 'resolution', 'max_points', 'format'])
 
     countries = request.args.getlist('countries')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
+    stream = parse_boolean(request.args.get('stream', 'false'), 'stream')
     indicator = request.args.get('indicator')
     per_million = request.args.get('per_million')
-    missing_vars = find_missing_variables(countries=countries, start_date=start_date, end_date=end_date, indicator=indicator, per_million=per_million)
-
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
-
-    if len(countries) < 2:
-        raise IncorrectParameterFormError("At least 2 countries must be provided for parameter: countries")
-    
-    if indicator not in accepted_indicators:
-        raise ValueError(f"Invalid indicator name: {indicator}")
-    
-    if per_million.lower() not in ['true', 'false']:
-        raise ValueError("per_million must be a boolean value")
+    check_missing_parameters(countries=countries, start_date=start_date, end_date=end_date, indicator=indicator, per_million=per_million)
+    check_countries(countries, 2)
+    full_indicator = parse_series_variant('hospitalizations', indicator=indicator, per_million=per_million)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, _ = parse_series_options(request.args)
 
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
-        raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
-
-    full_indicator = indicator
-    if per_million.lower() == 'true':
-        full_indicator += " per million"
-    
     try:
-        # Dynamically create placeholders for the IN clause
-        placeholders = ', '.join(['%s'] * len(countries))
         params = countries + [full_indicator, start_date, end_date]
-        query = f"""SELECT TO_CHAR(h_date, 'YYYY-MM-DD') AS formatted_date, h_nationname, h_indicator, h_value FROM hospitalizations 
-                    WHERE h_nationname IN ({placeholders})  AND h_indicator = %s AND h_date BETWEEN %s AND %s ORDER BY h_nationname, formatted_date;"""
-        data = execute_query(query, params, True)
-        
-        if data:
-            json_result = {}
-
-            for row in data:
-                country = row[1]
-                row_cleaned = [row[0], row[2], row[3]]
-
-                if country not in json_result:
-                    json_result[country] = []
-                
-                json_result[country].append(row_cleaned)
-            
-            return jsonify(json_result)
+        if stream and resolution == 'day' and max_points is None and response_format == 'json':
+            return grouped_json_response(stream_series_window('hospitalizations', countries, start_date, end_date, full_indicator),
+                                         f"Query returned no rows. Category: 'hospitalizations' with parameters: {params}")
+
+        json_result = get_series_window('hospitalizations', countries, start_date, end_date, full_indicator)
+        json_result = {country: downsample_rows(rows, resolution, max_points) for country, rows in json_result.items()}
+
+        if json_result:
+            return format_response(json_result, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'hospitalizations' with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
 
 """
@@ -559,6 +528,12 @@ def compare_hospitalizations_by_country():
         - country: name of country (or location in general)
         - start: start date for window of time
         - end: end date for window of time
+        - resolution: (optional) day (default), week or month, weekly/monthly values are bucket averages
+        - max_points: (optional) upper bound on points per country, reduced with LTTB downsampling
+        - format: (optional) json (default) rows, columnar (start date, step and value array per series), msgpack (columnar
+                  as MessagePack) or arrow (Arrow IPC stream of date, label and value columns, when pyarrow is installed)
+        - transform: (optional) daily (new per day), rolling7 (7-day average of daily values), per_million or growth_rate (percent change per day)
+        - stream: (optional) boolean, stream the response from a server-side cursor (ignored when downsampling, with a transform or with a format other than json)
         - metric: vaccinations metric of choice
 
     Returns:
@@ -566,58 +541,234 @@ def compare_hospitalizations_by_country():
 """
 @app.route('/api/compare-vaccinations-by-country', methods=['GET'])
 def compare_vaccinations_by_country():
-    accepted_params = ['countries', 'end', 'start', 'metric']
-    accepted_metrics = ['v_total_vaccinations', 'v_people_fully_vaccinated', 'v_total_boosters', 
-                        'v_daily_vaccinations', 'v_people_fully_vaccinated_per_hundred', 'v_total_boosters_per_hundred']
-    unknown_params = [key for key in request.args.keys() if key not in accepted_params]
-
-    if unknown_params:
-        raise UnknownParameterError(f"Unknown parameters: {', '.join(unknown_params)}")
+    check_unknown_parameters(request.args, ['countries', 'end', 'start', 'stream', 'metric', 'resolution', 'max_points', 'format', 'transform'])
 
     countries = request.args.getlist('countries')
     start_date = request.args.get('start')
     end_date = request.args.get('end')
+    stream = parse_boolean(request.args.get('stream', 'false'), 'stream')
     metric = request.args.get('metric')
-    missing_vars = find_missing_variables(countries=countries, start_date=start_date, end_date=end_date, metric=metric)
+    check_missing_parameters(countries=countries, start_date=start_date, end_date=end_date, metric=metric)
+    check_countries(countries, 2)
+    parse_series_variant('vaccinations', metric=metric)
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, transform = parse_series_options(request.args)
 
-    if missing_vars:
-        raise MissingParameterError(f"Missing required parameters: {', '.join(missing_vars)}")
+    if transform == 'per_million':
+        check_per_million(metric)
 
-    if len(countries) < 2:
-        raise IncorrectParameterFormError("At least 2 countries must be provided for parameter: countries")
+    try:
+        params = countries + [start_date, end_date, metric, transform]
+        if stream and resolution == 'day' and max_points is None and transform is None and response_format == 'json':
+            return grouped_json_response(stream_series_window('vaccinations', countries, start_date, end_date, metric),
+                                         f"Query returned no rows. Category: 'vaccinations' with parameters: {params}")
 
-    if metric not in accepted_metrics:
-        raise ValueError(f"Invalid metric name: {metric}")
-    
-    if not is_valid_date(start_date) or not is_valid_date(end_date):
+        json_result = get_series_window('vaccinations', countries, start_date, end_date, metric, transform)
+        json_result = {country: downsample_rows(rows, resolution, max_points) for country, rows in json_result.items()}
+
+        if json_result:
+            return format_response(json_result, response_format, resolution)
+        else:
+            raise EmptyQueryOutputError(f"Query returned no rows. Category: 'vaccinations' with parameters: {params}")
+    except Exception as e:
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
+
+
+# Cross-country snapshot
+"""
+    Rank every location by a metric on a date, or by its latest observation
+
+    Params:
+        - category: cases, deaths, testing, hospitalizations or vaccinations
+        - metric: testing or vaccinations metric of choice (testing, vaccinations only)
+        - indicator: hospitalizations indicator of choice (hospitalizations only)
+        - per_million: (optional) true or false (default), the per million indicator for hospitalizations,
+                       the value divided by the population for cases, deaths and vaccinations
+        - date: (optional) date of the snapshot (YYYY-MM-DD), the latest observation of each location when left out
+        - order: (optional) desc (default, highest first) or asc
+        - limit: (optional) number of locations returned, every location by default, at most 1000
+        - aggregates: (optional) true or false (default), include aggregate regions (continents, income groups, World)
+
+    Returns:
+        - list of tuples (country, date and value), ranked
+"""
+@app.route('/api/ranking', methods=['GET'])
+def ranking():
+    check_unknown_parameters(request.args, ['category', 'metric', 'indicator', 'per_million', 'date', 'order', 'limit', 'aggregates'])
+
+    category = request.args.get('category')
+    date = request.args.get('date')
+    order = request.args.get('order', 'desc')
+    check_missing_parameters(category=category)
+    per_million = parse_boolean(request.args.get('per_million', 'false'), 'per_million')
+    aggregates = parse_boolean(request.args.get('aggregates', 'false'), 'aggregates')
+    variant = parse_series_variant(category, request.args.get('metric'), request.args.get('indicator'), per_million)
+
+    if per_million and category == 'testing':
+        raise IncorrectParameterFormError("per_million does not apply to testing, use a per thousand metric")
+
+    if per_million:
+        check_per_million(variant)
+
+    if date is not None and not is_valid_date(date):
         raise IncorrectParameterFormError("Dates must be of the form YYYY-MM-DD")
 
+    if not is_valid_order(order):
+        raise IncorrectParameterFormError("order must be one of: asc, desc")
+
+    limit = parse_limit(request.args.get('limit'))
+
     try:
-        # Dynamically create placeholders for the IN clause
-        placeholders = ', '.join(['%s'] * len(countries))
-        params = countries + [start_date, end_date]
-        query = f"""SELECT TO_CHAR(v_date, 'YYYY-MM-DD') AS formatted_date, v_nationname, {metric} FROM vaccinations 
-                    WHERE v_nationname IN ({placeholders}) AND v_date BETWEEN %s AND %s ORDER BY v_nationname, formatted_date;"""
-        data = execute_query(query, params, True)
-        
+        params = (category, variant, per_million, date)
+        data = get_ranking(category, variant, date, per_million and category != 'hospitalizations', order == 'desc', limit, aggregates)
+
         if data:
-            json_result = {}
-
-            for row in data:
-                country = row[1]
-                row_cleaned = [row[0], row[2]]
-
-                if country not in json_result:
-                    json_result[country] = []
-                
-                json_result[country].append(row_cleaned)
-            
-            return jsonify(json_result)
+            return jsonify(data)
+        else:
+            raise EmptyQueryOutputError(f"Query returned no rows. Ranking with parameters: {params}")
+    except Exception as e:
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
+
+
+# Bulk export
+"""
+    Download a whole table, or its rows for some countries and a window of time, as one file
+
+    Params:
+        - table: location, cases, deaths, testing, hospitalizations or vaccinations
+        - countries: (optional) name of countries (or location in general), every country when left out
+        - start: (optional) start date for window of time, requires end (ignored for location)
+        - end: (optional) end date for window of time, requires start
+        - format: (optional) csv (default, streamed from COPY TO STDOUT) or parquet (one row group per
+                  EXPORT_ROW_GROUP_SIZE rows, needs the pyarrow package)
+
+    Returns:
+        - the table's columns, preceded by the country name for the tables that only hold the nationkey,
+          in primary key order, as a file attachment
+"""
+@app.route('/api/export', methods=['GET'])
+def export():
+    check_unknown_parameters(request.args, ['table', 'countries', 'start', 'end', 'format'])
+
+    table = request.args.get('table')
+    countries = request.args.getlist('countries')
+    start_date = request.args.get('start')
+    end_date = request.args.get('end')
+    export_format = request.args.get('format', 'csv')
+    check_missing_parameters(table=table)
+
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Invalid table name: {table}")
+
+    if (start_date is None) != (end_date is None):
+        raise MissingParameterError("start and end must be provided together")
+
+    if start_date is not None:
+        check_date_window(start_date, end_date)
+
+    if export_format not in export_formats():
+        raise IncorrectParameterFormError(f"format must be one of: {', '.join(export_formats())}")
+
+    try:
+        params = (table, countries, start_date, end_date)
+
+        if countries and not country_catalogue.nationkeys(countries):
+            raise EmptyQueryOutputError(f"Query returned no rows. Export with parameters: {params}")
+
+        if export_format == 'parquet':
+            return download_response(export_parquet(table, countries, start_date, end_date), 'application/vnd.apache.parquet', f"{table}.parquet")
+        return download_response(export_csv(table, countries, start_date, end_date), 'text/csv', f"{table}.csv")
+    except Exception as e:
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
+
+
+# Batch queries
+"""
+    Get several categories for the same countries and window of time in one request
+
+    Body (JSON):
+        - series: list of specs, each with a category (cases, deaths, testing, hospitalizations, vaccinations)
+                  plus metric (testing, vaccinations) or indicator and per_million (hospitalizations)
+        - countries: name of countries (or location in general) REQUIRES: 1+
+        - start: start date for window of time
+        - end: end date for window of time
+        - resolution: (optional) day (default), week or month
+        - max_points: (optional) upper bound on points per series and country
+        - format: (optional) json (default), columnar, msgpack or arrow, as for the single category endpoints
+        - known: (optional) dict keyed by country of the [start, end] date ranges the client already holds for
+                 every spec, their rows are left out (delta fetch, day resolution without max_points only)
+
+    Returns:
+        - dict keyed by spec ('cases', 'testing:<metric>', 'hospitalizations:<full indicator>', ...) of
+          dicts keyed by country of the rows the matching single category endpoint returns (with known, only
+          the countries with rows outside the known ranges, an empty dict when there are none)
+"""
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    max_series = 20
+    max_known_ranges = 100
+    body = request.get_json(silent=True)
+
+    if not isinstance(body, dict):
+        raise IncorrectParameterFormError("Request body must be a JSON object")
+
+    check_unknown_parameters(body, ['series', 'countries', 'end', 'start', 'resolution', 'max_points', 'format', 'known'])
+
+    series = body.get('series')
+    countries = body.get('countries')
+    start_date = body.get('start')
+    end_date = body.get('end')
+    known = body.get('known')
+    check_missing_parameters(series=series, countries=countries, start_date=start_date, end_date=end_date)
+    check_countries(countries, 1)
+
+    if not isinstance(series, list) or not series or len(series) > max_series:
+        raise IncorrectParameterFormError(f"Between 1 and {max_series} specs must be provided for parameter: series")
+
+    check_date_window(start_date, end_date)
+    resolution, max_points, response_format, _ = parse_series_options(body)
+
+    if known is not None:
+        if not isinstance(known, dict) or not all(is_valid_date_ranges(ranges, max_known_ranges) for ranges in known.values()):
+            raise IncorrectParameterFormError(f"known must map countries to at most {max_known_ranges} [start, end] date ranges")
+
+        if resolution != 'day' or max_points is not None:
+            raise IncorrectParameterFormError("known requires resolution day without max_points")
+
+    specs = {}
+    for spec in series:
+        if not isinstance(spec, dict):
+            raise IncorrectParameterFormError("Each series spec must be a JSON object")
+
+        category = spec.get('category')
+        variant = parse_series_variant(category, spec.get('metric'), spec.get('indicator'), spec.get('per_million', 'false'))
+        specs[category if variant is None else f"{category}:{variant}"] = (category, variant)
+
+    try:
+        params = (list(specs.keys()), countries, start_date, end_date)
+        data = get_series_windows(list(specs.values()), countries, start_date, end_date)
+
+        if known is not None:
+            for series_rows in data.values():
+                for country in list(series_rows):
+                    series_rows[country] = exclude_ranges(series_rows[country], known.get(country, []))
+                    if not series_rows[country]:
+                        del series_rows[country]
+
+        json_result = {key: {country: downsample_rows(rows, resolution, max_points) for country, rows in data[spec].items()}
+                       for key, spec in specs.items()}
+
+        if any(json_result.values()) or known is not None:
+            return format_response(json_result, response_format, resolution)
         else:
-            raise EmptyQueryOutputError(f"Query returned no rows. Query: '{query}' with parameters: {params}")
+            raise EmptyQueryOutputError(f"Query returned no rows. Batch with parameters: {params}")
     except Exception as e:
-        return jsonify({"error": str(e)}), e.status_code
+        return jsonify({"error": str(e)}), getattr(e, "status_code", 500)
 
 
 if __name__ == "__main__":
+    init_db_pool()
+    start_invalidation_listener()
+    if QUERY_ENGINE == 'memory':
+        memory_store.load()
     app.run()
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+    ASGI entry point, an optional alternative to the WSGI servers (python app.py, gunicorn).
+
+    The Flask routes are served by an ASGI server (uvicorn) through a thread-pooled WSGI adapter, the views
+    themselves stay synchronous. With SERVING_MODE=async, series cache misses are fetched over the psycopg
+    AsyncConnection pool, one query per spec run concurrently. Both are opt-in: against a local database the
+    synchronous path was faster (122 vs 107 req/s at 16 clients, python -m bench.async_benchmark), concurrency
+    only pays off when query latency dominates the Python side.
+
+    Usage (from the Backend directory, after pip install -r requirements-async.txt):
+        uvicorn asgi:asgi_app --host 127.0.0.1 --port 5000
+        SERVING_MODE=async uvicorn asgi:asgi_app --host 127.0.0.1 --port 5000
+"""
+import os
+from a2wsgi import WSGIMiddleware
+from app import app
+from Cache.invalidation import start_invalidation_listener
+from db.async_queries import init_async_db_pool
+from db.series import SERVING_MODE
+
+if SERVING_MODE == 'async':
+    init_async_db_pool()
+start_invalidation_listener()
+
+asgi_app = WSGIMiddleware(app, workers=int(os.getenv("ASGI_WORKER_THREADS", "32")))
@@ -0,0 +1,90 @@
+"""
+    Benchmark of the synchronous serving path (Flask dev server, pipelined queries on the sync pool)
+    against the opt-in asyncio serving path (uvicorn + asgi.py with SERVING_MODE=async, one query per spec
+    run concurrently over the async pool). Needs the packages of requirements-async.txt.
+
+    Both servers are started with the series cache disabled so every request reaches PostgreSQL, then
+    driven with the same compare-* requests at increasing concurrency.
+
+    Usage (from the Backend directory, with the database configured in .env):
+        python -m bench.async_benchmark [--concurrency 1 8 32] [--duration 10] [--countries 6] [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import urllib.parse
+from db.queries import execute_query
+from bench.load import run_load, wait_for_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def build_paths(countries: list, per_request: int, count: int = 50) -> list:
+    rng = random.Random(412)
+    categories = [('cases', {}), ('deaths', {}), ('vaccinations', {'metric': 'v_total_vaccinations'}),
+                  ('hospitalizations', {'indicator': 'Daily hospital occupancy', 'per_million': 'false'})]
+    paths = []
+
+    for _ in range(count):
+        category, extra = rng.choice(categories)
+        params = [('countries', country) for country in rng.sample(countries, min(per_request, len(countries)))]
+        params += [('start', '2020-01-01'), ('end', '2023-12-31')] + list(extra.items())
+        paths.append(f"/api/compare-{category}-by-country?{urllib.parse.urlencode(params)}")
+
+    return paths
+
+def start_server(command: list, extra_env: dict) -> subprocess.Popen:
+    env = {**os.environ, "SERIES_CACHE_MAX_ENTRIES": "0", **extra_env}
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sync and async serving paths")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument('--countries', type=int, default=6, help="countries per compare request")
+    parser.add_argument('--sync-port', type=int, default=5101)
+    parser.add_argument('--async-port', type=int, default=5102)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    countries = [row[0] for row in execute_query('SELECT l_nationname FROM location;', None, True)]
+    paths = build_paths(countries, args.countries)
+
+    servers = {
+        'sync': (start_server([sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(args.sync_port)], {"SERVING_MODE": "sync"}),
+                 f"http://127.0.0.1:{args.sync_port}"),
+        'async': (start_server([sys.executable, '-m', 'uvicorn', 'asgi:asgi_app', '--port', str(args.async_port), '--log-level', 'warning'],
+                               {"SERVING_MODE": "async"}),
+                  f"http://127.0.0.1:{args.async_port}")
+    }
+    results = {}
+
+    try:
+        for mode, (process, base_url) in servers.items():
+            if not wait_for_server(base_url):
+                print(f"{mode} server did not start")
+                return 1
+
+        print(f"{'concurrency':>11} {'mode':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for concurrency in args.concurrency:
+            for mode, (_, base_url) in servers.items():
+                stats = run_load(base_url, paths, concurrency, args.duration)
+                results.setdefault(str(concurrency), {})[mode] = stats
+                print(f"{concurrency:>11} {mode:>6} {stats['throughput']:>9.1f} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                      f"{stats['p99_ms']:>9.1f} {stats['errors']:>7}")
+    finally:
+        for process, _ in servers.values():
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+"""
+    Percentile of an ascending list of numbers (nearest rank).
+"""
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+"""
+    Drives a server with a fixed number of concurrent clients for a fixed time. Each client requests
+    the given paths round robin, starting at a different offset.
+
+    :param base_url: Server address, e.g. http://127.0.0.1:5000
+    :param paths: Request paths including the query string, or (path, JSON body) tuples for POST requests.
+    :param concurrency: Number of concurrent clients.
+    :param duration: Seconds to run.
+    :param timeout: Seconds before a single request is counted as an error.
+    :return: Dict with request/error counts, throughput (req/s), bytes received and p50/p95/p99/max latency (ms).
+"""
+def run_load(base_url: str, paths: list, concurrency: int, duration: float, timeout: float = 30.0) -> dict:
+    latencies = []
+    errors = [0]
+    received = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        i = offset
+        local_latencies = []
+        local_errors = 0
+        local_bytes = 0
+
+        while time.perf_counter() < deadline:
+            target = paths[i % len(paths)]
+            i += 1
+            if isinstance(target, tuple):
+                url = urllib.request.Request(base_url + target[0], data=json.dumps(target[1]).encode(), headers={'Content-Type': 'application/json'})
+            else:
+                url = base_url + target
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    local_bytes += len(response.read())
+            except urllib.error.HTTPError as e:
+                # 420 (empty window) is a valid answer from this API
+                if e.code != 420:
+                    local_errors += 1
+                    continue
+            except Exception:
+                local_errors += 1
+                continue
+            local_latencies.append((time.perf_counter() - started) * 1000)
+
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+            received[0] += local_bytes
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "bytes": received[0],
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": latencies[-1] if latencies else 0.0
+    }
+
+"""
+    Waits until a server answers, returns False if it does not within the timeout.
+"""
+def wait_for_server(base_url: str, path: str = '/api/pool-stats', timeout: float = 30.0) -> bool:
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=2):
+                return True
+        except Exception:
+            time.sleep(0.2)
+
+    return False
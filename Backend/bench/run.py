@@ -0,0 +1,308 @@
+"""
+    Benchmark of every API route against a seeded database (python -m bench.seed). Starts the server,
+    drives each route in turn at a fixed concurrency and writes p50/p95/p99 latency, throughput and
+    the server's peak resident memory to a JSON baseline. Two baselines can then be compared, any
+    route that got slower (or the server bigger) by more than the threshold is reported and the
+    command exits with 1, so it can gate a CI job.
+
+    Usage (from the Backend directory):
+        python -m bench.run --output baseline.json [--server gunicorn] [--concurrency 8] [--duration 10]
+                                                      (--server uvicorn needs requirements-async.txt)
+        python -m bench.run --output baseline.json --url http://127.0.0.1:5000      (already running server, no RSS)
+        python -m bench.run --compare baseline.json candidate.json [--threshold 0.10]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+from db.queries import execute_query
+from bench.load import run_load, wait_for_server
+from bench.seed import BENCH_DATABASE_NAME
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_COMMANDS = {
+    'gunicorn': lambda port: [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f"127.0.0.1:{port}"],
+    'uvicorn': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:asgi_app', '--port', str(port), '--log-level', 'warning'],
+    'flask': lambda port: [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port)]
+}
+
+# Per route extra parameters, the categories needing a metric get their first one
+ROUTE_PARAMS = {
+    'cases': {},
+    'deaths': {},
+    'testing': {'metric': 't_cumulative_total'},
+    'hospitalizations': {'indicator': 'Daily hospital occupancy', 'per_million': 'false'},
+    'vaccinations': {'metric': 'v_total_vaccinations'}
+}
+
+# Latency regresses upwards, throughput downwards
+LATENCY_KEYS = ['p50_ms', 'p95_ms', 'p99_ms']
+
+"""
+    Builds the request mix of every route: random countries and one year windows within the seeded range.
+
+    :param countries: Country names of the benchmark database.
+    :param first_date: First date with data.
+    :param last_date: Last date with data.
+    :param per_request: Countries per compare/batch request.
+    :param count: Requests per route.
+    :return: Dict of route name to list of paths (or (path, body) tuples for POST).
+"""
+def build_routes(countries: list, first_date: date, last_date: date, per_request: int = 6, count: int = 50) -> dict:
+    rng = random.Random(412)
+    span = max((last_date - first_date).days - 365, 0)
+
+    def window():
+        start = first_date + timedelta(days=rng.randint(0, span))
+        return start.isoformat(), min(start + timedelta(days=364), last_date).isoformat()
+
+    routes = {'get-countries': ['/api/get-countries']}
+
+    for category, extra in ROUTE_PARAMS.items():
+        routes[f"{category}-by-country"] = []
+        routes[f"compare-{category}-by-country"] = []
+
+        for _ in range(count):
+            start, end = window()
+            params = [('country', rng.choice(countries)), ('start', start), ('end', end)] + list(extra.items())
+            routes[f"{category}-by-country"].append(f"/api/{category}-by-country?{urllib.parse.urlencode(params)}")
+
+            start, end = window()
+            params = [('countries', country) for country in rng.sample(countries, min(per_request, len(countries)))]
+            params += [('start', start), ('end', end)] + list(extra.items())
+            routes[f"compare-{category}-by-country"].append(f"/api/compare-{category}-by-country?{urllib.parse.urlencode(params)}")
+
+    routes['ranking'] = []
+    for _ in range(count):
+        category, extra = rng.choice(list(ROUTE_PARAMS.items()))
+        params = [('category', category)] + list(extra.items()) + [('limit', 20)]
+        if rng.random() < 0.5:
+            params.append(('date', (first_date + timedelta(days=rng.randint(0, (last_date - first_date).days))).isoformat()))
+        routes['ranking'].append(f"/api/ranking?{urllib.parse.urlencode(params)}")
+
+    routes['batch'] = []
+    for _ in range(count):
+        start, end = window()
+        series = [{'category': category, **extra} for category, extra in rng.sample(list(ROUTE_PARAMS.items()), 3)]
+        routes['batch'].append(('/api/batch', {'series': series, 'countries': rng.sample(countries, min(per_request, len(countries))),
+                                               'start': start, 'end': end}))
+
+    return routes
+
+
+class RssMonitor:
+    """
+        Samples the resident memory of a process and all of its descendants (gunicorn workers) and
+        keeps the highest total seen. Linux only, reports 0 elsewhere.
+
+        Params:
+            - pid: root process
+            - interval: seconds between two samples
+    """
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        return self.peak_kb / 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, sum(process_rss_kb(pid) for pid in process_tree(self.pid)))
+            self._stop.wait(self.interval)
+
+def process_tree(pid: int) -> list:
+    pids = [pid]
+
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as children_file:
+                    pids.extend(int(child) for child in children_file.read().split())
+        except OSError:
+            continue
+
+    return pids
+
+def process_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def dataset_scale() -> dict:
+    locations, first_date, last_date = execute_query("SELECT (SELECT COUNT(*) FROM location), MIN(c_date), MAX(c_date) FROM cases;",
+                                                     None, True)[0]
+    return {"locations": locations, "first_date": first_date, "last_date": last_date}
+
+"""
+    Runs every route once and returns the baseline document.
+"""
+def run_benchmark(args) -> dict:
+    os.environ["DATABASE_NAME"] = args.database
+    scale = dataset_scale()
+    countries = [row[0] for row in execute_query('SELECT l_nationname FROM location;', None, True)]
+    routes = build_routes(countries, scale['first_date'], scale['last_date'], args.countries)
+
+    if args.routes:
+        routes = {name: paths for name, paths in routes.items() if name in args.routes}
+
+    process = None
+    base_url = args.url
+    if base_url is None:
+        env = {**os.environ, "DATABASE_NAME": args.database, "BIND": f"127.0.0.1:{args.port}", "PROFILE_SLOW_REQUEST_MS": "0"}
+        if args.no_cache:
+            env.update({"SERIES_CACHE_MAX_ENTRIES": "0", "RESPONSE_CACHE_MAX_ENTRIES": "0"})
+        process = subprocess.Popen(SERVER_COMMANDS[args.server](args.port), cwd=BACKEND_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    monitor = None
+    results = {}
+
+    try:
+        if not wait_for_server(base_url, timeout=120):
+            raise RuntimeError(f"server at {base_url} did not start")
+
+        if process is not None:
+            monitor = RssMonitor(process.pid)
+            monitor.start()
+
+        print(f"{'route':>36} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for name, paths in routes.items():
+            if args.warmup:
+                run_load(base_url, paths, args.concurrency, args.warmup)
+            stats = run_load(base_url, paths, args.concurrency, args.duration)
+            results[name] = stats
+            print(f"{name:>36} {stats['throughput']:>9.1f} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['errors']:>7}")
+    finally:
+        peak_rss_mb = monitor.stop() if monitor is not None else None
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "server": args.server if args.url is None else args.url,
+            "database": args.database,
+            "locations": scale['locations'],
+            "first_date": scale['first_date'].isoformat(),
+            "last_date": scale['last_date'].isoformat(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "cache": not args.no_cache
+        },
+        "peak_rss_mb": peak_rss_mb,
+        "routes": results
+    }
+
+"""
+    Compares a candidate baseline to a reference one.
+
+    :param reference: Baseline document of the reference run.
+    :param candidate: Baseline document of the new run.
+    :param threshold: Relative change counted as a regression (0.10 = 10%).
+    :param min_delta_ms: Latency changes below this are noise whatever their relative size.
+    :return: List of (route, measure, reference value, candidate value, relative change, regressed) tuples.
+"""
+def compare(reference: dict, candidate: dict, threshold: float, min_delta_ms: float) -> list:
+    rows = []
+
+    def change(old, new):
+        return (new - old) / old if old else (0.0 if new == old else float('inf'))
+
+    for route, new in candidate['routes'].items():
+        old = reference['routes'].get(route)
+        if old is None:
+            continue
+
+        for key in LATENCY_KEYS:
+            relative = change(old[key], new[key])
+            rows.append((route, key, old[key], new[key], relative, relative > threshold and new[key] - old[key] >= min_delta_ms))
+
+        relative = change(old['throughput'], new['throughput'])
+        rows.append((route, 'throughput', old['throughput'], new['throughput'], relative, relative < -threshold))
+        rows.append((route, 'errors', old['errors'], new['errors'], change(old['errors'], new['errors']), new['errors'] > old['errors']))
+
+    if reference.get('peak_rss_mb') and candidate.get('peak_rss_mb'):
+        relative = change(reference['peak_rss_mb'], candidate['peak_rss_mb'])
+        rows.append(('server', 'peak_rss_mb', reference['peak_rss_mb'], candidate['peak_rss_mb'], relative, relative > threshold))
+
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API route and compare baselines")
+    parser.add_argument('--compare', nargs=2, metavar=('REFERENCE', 'CANDIDATE'), help="compare two baseline files instead of running")
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="smallest latency change reported as a regression")
+    parser.add_argument('--output', help="write the baseline to this file")
+    parser.add_argument('--database', default=BENCH_DATABASE_NAME)
+    parser.add_argument('--server', choices=list(SERVER_COMMANDS), default='gunicorn')
+    parser.add_argument('--url', help="benchmark an already running server instead of starting one")
+    parser.add_argument('--port', type=int, default=5103)
+    parser.add_argument('--routes', nargs='+', help="only these routes (e.g. cases-by-country batch)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per route")
+    parser.add_argument('--warmup', type=float, default=2.0, help="seconds per route before measuring")
+    parser.add_argument('--countries', type=int, default=6, help="countries per compare/batch request")
+    parser.add_argument('--no-cache', action='store_true', help="disable the series and response caches of the server")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as reference_file, open(args.compare[1]) as candidate_file:
+            reference, candidate = json.load(reference_file), json.load(candidate_file)
+
+        rows = compare(reference, candidate, args.threshold, args.min_delta_ms)
+        print(f"{'route':>36} {'measure':>12} {'reference':>11} {'candidate':>11} {'change':>8}")
+        for route, key, old, new, relative, regressed in rows:
+            print(f"{route:>36} {key:>12} {old:>11.1f} {new:>11.1f} {relative:>+8.1%}{'  REGRESSION' if regressed else ''}")
+
+        regressions = sum(1 for row in rows if row[5])
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        return 1 if regressions else 0
+
+    try:
+        baseline = run_benchmark(args)
+    except Exception as e:
+        print(f"Benchmark failed: {e}")
+        return 1
+
+    if baseline['peak_rss_mb'] is not None:
+        print(f"peak server RSS: {baseline['peak_rss_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(baseline, output_file, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+    Seeds a benchmark database with synthetic data at a configurable scale, using the tables of
+    Database/setup_db.sql. The real locations come first, synthetic ones are added beyond them.
+
+    The data is generated inside PostgreSQL (generate_series) so even 10,000 locations over 30 years
+    load in minutes. The same --seed gives the same data.
+
+    Every location has cases and deaths for every day, half of them testing, a quarter hospitalizations
+    (all eight indicators) and 60% vaccinations from the second year on.
+
+    Usage (from the Backend directory, as a user allowed to create databases):
+        python -m bench.seed --locations 160 --years 3
+        python -m bench.seed --locations 10000 --years 30 --database covid_bench_large
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+import psycopg
+from psycopg.conninfo import make_conninfo
+from db import get_conninfo, get_db_connection
+from db.facts import FACT_VIEWS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETUP_SQL = os.path.join(BACKEND_DIR, '..', 'Database', 'setup_db.sql')
+LOCATIONS_CSV = os.path.join(BACKEND_DIR, '..', 'Database', 'Data', 'locations.csv')
+
+BENCH_DATABASE_NAME = os.getenv("BENCH_DATABASE_NAME", "covid_bench")
+START_DATE = '2020-01-01'
+
+# Inserted in this order, dropped in reverse
+TABLES = ['location', 'cases', 'deaths', 'testing', 'hospitalizations', 'vaccinations']
+
+# Every statement gets %(days)s, the series are deterministic functions of the location key, the day and setseed()
+SEED_QUERIES = {
+    'cases': """INSERT INTO cases
+                SELECT l_nationkey, %(start)s::date + day, (day * (100 + abs(hashtext(l_nationkey)) %% 5000) + floor(random() * 100))::bigint
+                FROM location, generate_series(0, %(days)s - 1) AS day;""",
+    'deaths': """INSERT INTO deaths
+                 SELECT l_nationkey, %(start)s::date + day, (day * (1 + abs(hashtext(l_nationkey)) %% 50) + floor(random() * 10))::bigint
+                 FROM location, generate_series(0, %(days)s - 1) AS day;""",
+    'testing': """INSERT INTO testing
+                  SELECT l_nationname || ' - tests performed', l_nationkey, %(start)s::date + day, day * 1000 + 500, 1000 + floor(random() * 500),
+                         round((day * 1000 + 500) / 1000.0, 3), round(random()::numeric, 3), round(random()::numeric, 4), round((random() * 50)::numeric, 1)
+                  FROM location, generate_series(0, %(days)s - 1) AS day
+                  WHERE abs(hashtext(l_nationkey)) %% 2 = 0;""",
+    'hospitalizations': """INSERT INTO hospitalizations
+                           SELECT l_nationname, l_nationkey, %(start)s::date + day, indicator || suffix,
+                                  CASE WHEN suffix = '' THEN floor(random() * 500) ELSE round((random() * 160)::numeric, 3) END
+                           FROM location, generate_series(0, %(days)s - 1) AS day,
+                                unnest(ARRAY['Daily hospital occupancy', 'Daily ICU occupancy', 'Weekly new hospital admissions', 'Weekly new ICU admissions']) AS indicator,
+                                unnest(ARRAY['', ' per million']) AS suffix
+                           WHERE abs(hashtext(l_nationkey)) %% 4 = 1;""",
+    'vaccinations': """INSERT INTO vaccinations
+                       SELECT l_nationname, l_nationkey, %(start)s::date + day, day * 5000, day * 2000, CASE WHEN day > 500 THEN (day - 500) * 1000 END,
+                              5000 + floor(random() * 1000), round(least(day * 0.1, 100)::numeric, 2), CASE WHEN day > 500 THEN round(((day - 500) * 0.05)::numeric, 2) END
+                       FROM location, generate_series(365, greatest(%(days)s - 1, 365)) AS day
+                       WHERE abs(hashtext(l_nationkey)) %% 5 < 3 AND day < %(days)s;"""
+}
+
+"""
+    Reads the CREATE TABLE statements of setup_db.sql.
+"""
+def schema_statements() -> list:
+    with open(SETUP_SQL) as setup_file:
+        return re.findall(r'CREATE TABLE .*?\n\);', setup_file.read(), re.S)
+
+def create_database(name: str):
+    with psycopg.connect(make_conninfo(get_conninfo(), dbname='postgres'), autocommit=True) as connection:
+        if connection.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (name,)).fetchone() is None:
+            connection.execute(f'CREATE DATABASE "{name}";')
+
+"""
+    Lists the locations to seed, the real ones of locations.csv first.
+
+    :return: List of (name, key) tuples.
+"""
+def seed_locations(count: int) -> list:
+    with open(LOCATIONS_CSV) as locations_file:
+        locations = [(row[0], row[1]) for row in list(csv.reader(locations_file))[1:]]
+
+    locations = locations[:count]
+    locations += [(f"Synthetic Location {i:05d}", f"SYN{i:05d}") for i in range(len(locations), count)]
+    return locations
+
+"""
+    Recreates the COVID tables in the benchmark database and fills them.
+
+    :param locations: Number of locations.
+    :param years: Number of years of daily rows, starting 2020-01-01.
+    :param seed: Seed of PostgreSQL's random().
+    :return: Dict of table to row count.
+"""
+def seed(locations: int, years: int, seed: float = 0.412) -> dict:
+    connection = get_db_connection()
+    counts = {}
+
+    try:
+        # latest_facts is built on daily_facts, drop the views in reverse order
+        for view in reversed(FACT_VIEWS):
+            connection.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view};")
+        connection.execute("DROP TABLE IF EXISTS schema_migrations;")
+        for table in reversed(TABLES):
+            connection.execute(f"DROP TABLE IF EXISTS {table} CASCADE;")
+        for statement in schema_statements():
+            connection.execute(statement)
+
+        with connection.cursor() as cursor:
+            with cursor.copy("COPY location (l_nationname, l_nationkey) FROM STDIN") as copy:
+                for row in seed_locations(locations):
+                    copy.write_row(row)
+        counts['location'] = locations
+
+        connection.execute("SELECT setseed(%s);", (seed,))
+        for table, query in SEED_QUERIES.items():
+            started = time.perf_counter()
+            counts[table] = connection.execute(query, {'start': START_DATE, 'days': years * 365}).rowcount
+            print(f"{table}: {counts[table]} rows in {time.perf_counter() - started:.1f}s")
+
+        connection.execute("UPDATE location SET l_last_observation_date = %s::date + %s;", (START_DATE, years * 365 - 1))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database with synthetic COVID data")
+    parser.add_argument('--locations', type=int, default=160, help="number of locations (the first 160 are real)")
+    parser.add_argument('--years', type=int, default=3, help="years of daily rows")
+    parser.add_argument('--seed', type=float, default=0.412, help="seed of random(), between -1 and 1")
+    parser.add_argument('--database', default=BENCH_DATABASE_NAME, help="database to create or overwrite")
+    parser.add_argument('--no-migrate', action='store_true', help="do not apply Database/migrations after seeding")
+    args = parser.parse_args()
+
+    create_database(args.database)
+    os.environ["DATABASE_NAME"] = args.database
+
+    started = time.perf_counter()
+    seed(args.locations, args.years, args.seed)
+
+    if not args.no_migrate:
+        from db.migrate import migrate
+        migrate()
+
+    print(f"Seeded {args.database} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,96 @@
 import psycopg
+from psycopg_pool import ConnectionPool
+from .statements import prepare_statements
 from dotenv import load_dotenv
+import atexit
 import os
 
 load_dotenv()
 
-def get_db_connection():
+_db_pool = None
+
+def get_conninfo():
     DbName = os.getenv("DATABASE_NAME")
     DbUser = os.getenv("DATABASE_USER")
     DbPassword = os.getenv("DATABASE_PASSWORD")
+    DbHost = os.getenv("DATABASE_HOST", "localhost")
+
+    return f"dbname={DbName} user={DbUser} password={DbPassword} host={DbHost}"
+
+def get_db_connection():
+    return psycopg.connect(get_conninfo())
+
+"""
+    Creates the shared connection pool. Safe to call more than once, only the first call opens a pool.
+
+    Pool sizing is read from the environment:
+        - DATABASE_POOL_MIN_SIZE: connections kept open at all times (default 2, at most the max size)
+        - DATABASE_POOL_MAX_SIZE: upper bound on open connections (default 10)
+        - DATABASE_POOL_MAX_IDLE: seconds an idle connection above min size is kept (default 300)
+        - DATABASE_POOL_TIMEOUT: seconds a request waits for a free connection (default 30)
+
+    :return: The shared ConnectionPool.
+"""
+def init_db_pool() -> ConnectionPool:
+    global _db_pool
+
+    if _db_pool is None:
+        max_size = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+        _db_pool = ConnectionPool(
+            get_conninfo(),
+            min_size=min(int(os.getenv("DATABASE_POOL_MIN_SIZE", "2")), max_size),
+            max_size=max_size,
+            max_idle=float(os.getenv("DATABASE_POOL_MAX_IDLE", "300")),
+            timeout=float(os.getenv("DATABASE_POOL_TIMEOUT", "30")),
+            check=ConnectionPool.check_connection,
+            configure=prepare_statements,
+            name="covid_pool",
+            open=True
+        )
+        atexit.register(close_db_pool)
+
+    return _db_pool
+
+def get_db_pool() -> ConnectionPool:
+    if _db_pool is None:
+        return init_db_pool()
+    return _db_pool
+
+def close_db_pool():
+    global _db_pool
+
+    if _db_pool is not None:
+        _db_pool.close()
+        _db_pool = None
+
+"""
+    Reports connection pool usage.
+
+    :return: A dict with the pool size, connections in use and idle, requests waiting
+             for a connection, and the total/average time spent waiting (ms).
+"""
+def get_pool_stats() -> dict:
+    if _db_pool is None:
+        return {"pool_open": False}
+
+    stats = _db_pool.get_stats()
+    pool_size = stats.get("pool_size", 0)
+    pool_available = stats.get("pool_available", 0)
+    requests_num = stats.get("requests_num", 0)
+    requests_wait_ms = stats.get("requests_wait_ms", 0)
 
-    return psycopg.connect(f"dbname={DbName} user={DbUser} password={DbPassword} host=localhost")
\ No newline at end of file
+    return {
+        "pool_open": True,
+        "pool_min": stats.get("pool_min", 0),
+        "pool_max": stats.get("pool_max", 0),
+        "pool_size": pool_size,
+        "in_use": pool_size - pool_available,
+        "idle": pool_available,
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": requests_num,
+        "requests_queued": stats.get("requests_queued", 0),
+        "requests_errors": stats.get("requests_errors", 0),
+        "wait_ms_total": requests_wait_ms,
+        "wait_ms_avg": requests_wait_ms / requests_num if requests_num else 0,
+        "connections_lost": stats.get("connections_lost", 0)
+    }
@@ -0,0 +1,156 @@
+import asyncio
+import atexit
+import os
+import threading
+from psycopg_pool import AsyncConnectionPool
+from . import get_conninfo
+from .statements import prepare_flag, prepare_statements_async
+from .singleflight import QUERY_COALESCING, AsyncSingleFlight, query_key
+from typing import List, Tuple, Optional
+
+# The async pool lives on its own event loop in a background thread, so it can be awaited from any
+# loop (asyncio.wrap_future) and called from the synchronous Flask views (run_async) alike.
+_loop = None
+_loop_thread = None
+_async_pool = None
+_pool_lock = None
+_lock = threading.Lock()
+# Only used from the database loop, like _pool_lock
+_flights = AsyncSingleFlight()
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_thread
+
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="db-async-loop", daemon=True)
+            _loop_thread.start()
+            atexit.register(close_async_db_pool)
+
+    return _loop
+
+async def _open_pool() -> AsyncConnectionPool:
+    global _async_pool, _pool_lock
+
+    if _async_pool is not None:
+        return _async_pool
+
+    # Only ever touched from the database loop, so creating the lock here cannot race
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        if _async_pool is not None:
+            return _async_pool
+
+        max_size = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+        pool = AsyncConnectionPool(
+            get_conninfo(),
+            min_size=min(int(os.getenv("DATABASE_POOL_MIN_SIZE", "2")), max_size),
+            max_size=max_size,
+            max_idle=float(os.getenv("DATABASE_POOL_MAX_IDLE", "300")),
+            timeout=float(os.getenv("DATABASE_POOL_TIMEOUT", "30")),
+            check=AsyncConnectionPool.check_connection,
+            configure=prepare_statements_async,
+            name="covid_async_pool",
+            open=False
+        )
+        await pool.open()
+        _async_pool = pool
+        return _async_pool
+
+"""
+    Runs a coroutine on the database event loop and waits for its result. For synchronous callers.
+"""
+def run_async(coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_loop()).result()
+
+"""
+    Runs a coroutine on the database event loop and awaits it from the caller's own event loop.
+"""
+async def await_async(coroutine):
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, _get_loop()))
+
+def init_async_db_pool() -> AsyncConnectionPool:
+    return run_async(_open_pool())
+
+def close_async_db_pool():
+    global _async_pool, _loop
+
+    if _loop is None:
+        return
+
+    if _async_pool is not None:
+        asyncio.run_coroutine_threadsafe(_async_pool.close(), _loop).result()
+        _async_pool = None
+
+    _loop.call_soon_threadsafe(_loop.stop)
+    _loop = None
+
+async def _execute(query: str, params: Optional[Tuple], fetch_results: bool) -> Optional[List[Tuple]]:
+    if fetch_results and QUERY_COALESCING:
+        return await _flights.do(('query',) + query_key(query, params), lambda: _execute_once(query, params, fetch_results))
+    return await _execute_once(query, params, fetch_results)
+
+async def _execute_once(query: str, params: Optional[Tuple], fetch_results: bool) -> Optional[List[Tuple]]:
+    pool = await _open_pool()
+
+    async with pool.connection() as connection:
+        async with connection.cursor() as cursor:
+            try:
+                await cursor.execute(query, params, prepare=prepare_flag(connection, query))
+
+                if fetch_results:
+                    return await cursor.fetchall()
+                else:
+                    await connection.commit()
+                    return None
+            except Exception as e:
+                print(f"Error executing query: {e}")
+                await connection.rollback()
+                return None
+
+"""
+    Async counterpart of execute_query, using a psycopg AsyncConnection borrowed from the async pool.
+
+    :param query: The SQL query to execute (as a string).
+    :param params: The parameters for parameterized queries (default is None).
+    :param fetch_results: Whether to fetch results for SELECT queries (default is False)
+                          or to commit results for non-SELECT queries.
+    :return: A list of rows for SELECT queries, or None for non-SELECT queries.
+"""
+async def execute_query_async(query: str, params: Optional[Tuple] = None, fetch_results: bool = False) -> Optional[List[Tuple]]:
+    return await await_async(_execute(query, params, fetch_results))
+
+async def _execute_concurrently(queries: List[Tuple[str, Optional[Tuple]]]) -> Optional[List[List[Tuple]]]:
+    results = await asyncio.gather(*(_execute(query, params, True) for query, params in queries))
+    return None if any(result is None for result in results) else list(results)
+
+"""
+    Executes several SELECT queries concurrently, each on its own pooled AsyncConnection.
+
+    :param queries: List of (query, params) tuples.
+    :return: A list with the rows of each query, in order, or None if any query failed.
+"""
+async def execute_queries_async(queries: List[Tuple[str, Optional[Tuple]]]) -> Optional[List[List[Tuple]]]:
+    return await await_async(_execute_concurrently(queries))
+
+"""
+    Synchronous entry point to execute_queries_async for the Flask views.
+"""
+def execute_queries_concurrently(queries: List[Tuple[str, Optional[Tuple]]]) -> Optional[List[List[Tuple]]]:
+    return run_async(_execute_concurrently(queries))
+
+def get_async_pool_stats() -> dict:
+    if _async_pool is None:
+        return {"pool_open": False}
+
+    stats = _async_pool.get_stats()
+    return {
+        "pool_open": True,
+        "pool_size": stats.get("pool_size", 0),
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "wait_ms_total": stats.get("requests_wait_ms", 0)
+    }
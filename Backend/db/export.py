@@ -0,0 +1,135 @@
+from dotenv import load_dotenv
+from .ingest import INGEST_TABLES
+from .queries import copy_query, stream_query
+from Engine.catalogue import country_catalogue
+from typing import Iterator, List, Optional
+import os
+
+# Parquet is optional, without pyarrow only CSV is offered
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+load_dotenv()
+
+# Bytes per chunk of a CSV export, and rows per row group (and per database round trip) of a Parquet export.
+# A Parquet export holds one row group in memory at a time.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", str(256 * 1024)))
+EXPORT_ROW_GROUP_SIZE = int(os.getenv("EXPORT_ROW_GROUP_SIZE", "65536"))
+
+EXPORT_TABLES = list(INGEST_TABLES)
+
+# Column types of the Parquet files. NUMERIC has no fixed scale in the schema, it is exported as double.
+PARQUET_TYPES = {'VARCHAR': 'string', 'DATE': 'date32', 'BIGINT': 'int64', 'NUMERIC': 'float64'}
+
+def export_formats() -> list:
+    return ['csv', 'parquet'] if pyarrow is not None else ['csv']
+
+"""
+    Lists the columns of an export: the country name, then every column of the table
+    (the location table is exported as is).
+
+    :return: List of (column, SQL type) tuples.
+"""
+def export_columns(table: str) -> list:
+    columns = INGEST_TABLES[table]['columns']
+    if table == 'location' or any(name.endswith('_nationname') for name, _ in columns):
+        return columns
+    return [('l_nationname', 'VARCHAR(100)')] + columns
+
+"""
+    Builds the query exporting a table, in primary key order.
+
+    :param table: One of EXPORT_TABLES.
+    :param countries: Country names to export, every country when empty (unknown names are left out).
+    :param start_date: Start of the window (YYYY-MM-DD), the whole table when None. Ignored for location.
+    :param end_date: End of the window (YYYY-MM-DD).
+    :param numeric_as_double: Cast NUMERIC columns to double precision (for Parquet).
+    :return: Tuple of (query without trailing semicolon, params).
+"""
+def export_query(table: str, countries: Optional[List[str]] = None, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 numeric_as_double: bool = False):
+    spec = INGEST_TABLES[table]
+    nationkey = spec['nationkey'] or 'l_nationkey'
+    columns = [f"{name}::DOUBLE PRECISION AS {name}" if numeric_as_double and sql_type == 'NUMERIC' else name
+               for name, sql_type in export_columns(table)]
+    joined = f" JOIN location ON l_nationkey = {nationkey}" if 'l_nationname' in columns and table != 'location' else ''
+    conditions = []
+    params = []
+
+    if countries:
+        conditions.append(f"{nationkey} = ANY(%s)")
+        params.append(country_catalogue.nationkeys(countries))
+
+    if start_date is not None and spec['date'] is not None:
+        conditions.append(f"{spec['date']} BETWEEN %s AND %s")
+        params += [start_date, end_date]
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f"SELECT {', '.join(columns)} FROM {table}{joined}{where} ORDER BY {', '.join(spec['primary_key'])}"
+    return query, tuple(params)
+
+"""
+    Streams a table export as CSV with a header row, straight from COPY TO STDOUT.
+
+    :return: Generator of bytes chunks of about EXPORT_CHUNK_SIZE.
+"""
+def export_csv(table: str, countries: Optional[List[str]] = None, start_date: Optional[str] = None,
+               end_date: Optional[str] = None) -> Iterator[bytes]:
+    query, params = export_query(table, countries, start_date, end_date)
+    return copy_query(query, params, 'FORMAT csv, HEADER true', EXPORT_CHUNK_SIZE)
+
+class _ParquetSink:
+    """
+        Write-only file the Parquet writer writes into, drained after every row group.
+    """
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+"""
+    Streams a table export as a Parquet file, one row group per EXPORT_ROW_GROUP_SIZE rows read from
+    a server-side cursor. The footer is written last, so the file is only readable once complete.
+
+    :return: Generator of bytes, one chunk per row group plus the footer.
+"""
+def export_parquet(table: str, countries: Optional[List[str]] = None, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None) -> Iterator[bytes]:
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs the pyarrow package")
+
+    columns = export_columns(table)
+    schema = pyarrow.schema([(name, getattr(pyarrow, PARQUET_TYPES[sql_type.split('(')[0]])()) for name, sql_type in columns])
+    query, params = export_query(table, countries, start_date, end_date, numeric_as_double=True)
+    sink = _ParquetSink()
+
+    with parquet.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for rows in stream_query(query, params, EXPORT_ROW_GROUP_SIZE):
+            values = list(zip(*rows))
+            writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(values[i], type=field.type) for i, field in enumerate(schema)],
+                                                         schema=schema), row_group_size=EXPORT_ROW_GROUP_SIZE)
+            yield sink.drain()
+
+    yield sink.drain()
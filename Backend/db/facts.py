@@ -0,0 +1,63 @@
+"""
+    Refreshes the daily_facts materialized view (migration 0002), and latest_facts built on it (migration 0003),
+    after the metric tables change.
+
+    Usage (from the Backend directory, as the user that owns the view):
+        python -m db.facts                   refresh without blocking readers
+        python -m db.facts --full            refresh with an exclusive lock (faster, needed while the view is unpopulated)
+"""
+import argparse
+import sys
+import time
+from . import get_db_connection
+
+# Refreshed in this order, each view is built from the previous ones
+FACT_VIEWS = ['daily_facts', 'latest_facts']
+
+"""
+    Refreshes daily_facts, then latest_facts when it exists, and updates their planner statistics.
+
+    :param concurrently: Keep serving reads during the refresh (REFRESH ... CONCURRENTLY, needs a populated view).
+    :return: Number of rows in the refreshed daily_facts.
+"""
+def refresh_facts(concurrently: bool = True) -> int:
+    connection = get_db_connection()
+
+    try:
+        populated = dict(connection.execute("SELECT matviewname, ispopulated FROM pg_matviews WHERE matviewname = ANY(%s);",
+                                            (FACT_VIEWS,)).fetchall())
+        if 'daily_facts' not in populated:
+            raise RuntimeError("daily_facts does not exist, apply the migrations first (python -m db.migrate)")
+
+        for view in FACT_VIEWS:
+            if view in populated:
+                connection.execute(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently and populated[view] else ''}{view};")
+                connection.execute(f"ANALYZE {view};")
+
+        rows = connection.execute("SELECT COUNT(*) FROM daily_facts;").fetchone()[0]
+        connection.commit()
+        return rows
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the daily_facts and latest_facts materialized views")
+    parser.add_argument('--full', action='store_true', help="refresh with an exclusive lock instead of concurrently")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        rows = refresh_facts(concurrently=not args.full)
+    except Exception as e:
+        print(f"Refresh failed: {e}")
+        return 1
+
+    print(f"Refreshed daily_facts: {rows} rows in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
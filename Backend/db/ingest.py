@@ -0,0 +1,519 @@
+"""
+    Bulk loader for the COVID tables, an alternative to the \\COPY statements of setup_db.sql.
+
+    Every table is streamed from its CSV with COPY into an unlogged staging table without any index or
+    constraint, in parallel. Primary keys, the secondary indexes of the live table (e.g. from migrations)
+    and foreign keys are built after the load. The staging tables then replace the live ones in one
+    transaction, readers see either the old or the new data. Views over the tables (daily_facts, and
+    latest_facts over it) are rebuilt in the same transaction, and running servers drop every cached
+    series when it commits.
+
+    Usage (from the Backend directory, as the user that owns the tables):
+        python -m db.ingest                            load every table from Database/Data
+        python -m db.ingest --tables cases,deaths      load some tables only
+        python -m db.ingest --data-dir DIR --workers N
+        python -m db.ingest --incremental              upsert only the rows newer than each country's last loaded date
+
+    The incremental mode keeps the live tables. For every table and country the watermark is the latest
+    date already in that table, rows after it (minus --lookback-days, to pick up revisions) are upserted, and
+    location.l_last_observation_date is moved forward to the newest of them. Running servers are told which
+    series changed.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from typing import Optional
+from . import get_db_connection
+from .facts import refresh_facts
+from Cache.invalidation import INVALIDATION_CHANNEL
+
+load_dotenv()
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Database', 'Data')
+
+# Bytes read from a CSV and sent per COPY write
+INGEST_BUFFER_SIZE = int(os.getenv("INGEST_BUFFER_SIZE", str(1024 * 1024)))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_MAINTENANCE_WORK_MEM = os.getenv("INGEST_MAINTENANCE_WORK_MEM", "512MB")
+INGEST_LOCK_TIMEOUT = os.getenv("INGEST_LOCK_TIMEOUT", "30s")
+
+# Same tables, files and COPY options as setup_db.sql. 'nationname' is the column the endpoints of a table
+# match countries on, l_nationname when None.
+INGEST_TABLES = {
+    'location': {
+        'file': 'locations.csv',
+        'columns': [('l_nationname', 'VARCHAR(100)'), ('l_nationkey', 'VARCHAR(10)'), ('l_last_observation_date', 'DATE'),
+                    ('l_source_name', 'VARCHAR(255)'), ('l_source_website', 'VARCHAR(255)')],
+        'primary_key': ['l_nationkey'],
+        'nationkey': None,
+        'nationname': None,
+        'date': None,
+        'options': "FORMAT csv, HEADER true"
+    },
+    'cases': {
+        'file': 'cases.csv',
+        'columns': [('c_nationkey', 'VARCHAR(10)'), ('c_date', 'DATE'), ('c_cases', 'BIGINT')],
+        'primary_key': ['c_nationkey', 'c_date'],
+        'nationkey': 'c_nationkey',
+        'nationname': None,
+        'date': 'c_date',
+        'options': "DELIMITER ','"
+    },
+    'deaths': {
+        'file': 'deaths.csv',
+        'columns': [('d_nationkey', 'VARCHAR(10)'), ('d_date', 'DATE'), ('d_death', 'BIGINT')],
+        'primary_key': ['d_nationkey', 'd_date'],
+        'nationkey': 'd_nationkey',
+        'nationname': None,
+        'date': 'd_date',
+        'options': "DELIMITER ','"
+    },
+    'testing': {
+        'file': 'testing.csv',
+        'columns': [('t_entity', 'VARCHAR(100)'), ('t_nationkey', 'VARCHAR(10)'), ('t_date', 'DATE'),
+                    ('t_cumulative_total', 'NUMERIC'), ('t_daily_change_ct', 'NUMERIC'), ('t_ct_per_thousand', 'NUMERIC'),
+                    ('t_daily_change_ct_per_thousand', 'NUMERIC'), ('t_short_term_positive_rate', 'NUMERIC'),
+                    ('t_short_term_tests_per_case', 'NUMERIC')],
+        'primary_key': ['t_nationkey', 't_date'],
+        'nationkey': 't_nationkey',
+        'nationname': None,
+        'date': 't_date',
+        'options': "FORMAT csv, HEADER true"
+    },
+    'hospitalizations': {
+        'file': 'hospitalizations.csv',
+        'columns': [('h_nationname', 'VARCHAR(100)'), ('h_nationkey', 'VARCHAR(10)'), ('h_date', 'DATE'),
+                    ('h_indicator', 'VARCHAR(100)'), ('h_value', 'NUMERIC')],
+        'primary_key': ['h_date', 'h_nationkey', 'h_indicator'],
+        'nationkey': 'h_nationkey',
+        'nationname': 'h_nationname',
+        'date': 'h_date',
+        'options': "FORMAT csv, HEADER true"
+    },
+    'vaccinations': {
+        'file': 'vaccinations.csv',
+        'columns': [('v_nationname', 'VARCHAR(100)'), ('v_nationkey', 'VARCHAR(10)'), ('v_date', 'DATE'),
+                    ('v_total_vaccinations', 'BIGINT'), ('v_people_fully_vaccinated', 'BIGINT'), ('v_total_boosters', 'BIGINT'),
+                    ('v_daily_vaccinations', 'BIGINT'), ('v_people_fully_vaccinated_per_hundred', 'NUMERIC'),
+                    ('v_total_boosters_per_hundred', 'NUMERIC')],
+        'primary_key': ['v_nationkey', 'v_date'],
+        'nationkey': 'v_nationkey',
+        'nationname': 'v_nationname',
+        'date': 'v_date',
+        'options': "FORMAT csv, HEADER true"
+    }
+}
+
+# Country names per invalidation message, NOTIFY payloads are limited to 8000 bytes
+INVALIDATION_BATCH_SIZE = 50
+
+INDEX_DEFINITION_PATTERN = re.compile(r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON (?:ONLY )?\S+ (USING .*)$')
+
+def staging_name(name: str) -> str:
+    return f"{name}_load"
+
+def table_exists(connection, table: str) -> bool:
+    return connection.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,)).fetchone()[0]
+
+"""
+    Lists the indexes of a live table that do not back a constraint (those are rebuilt from INGEST_TABLES).
+
+    :return: List of (index name, CREATE INDEX statement for the staging table).
+"""
+def secondary_indexes(connection, table: str) -> list:
+    if not table_exists(connection, table):
+        return []
+
+    rows = connection.execute("""SELECT index_class.relname, pg_get_indexdef(pg_index.indexrelid) FROM pg_index
+                                 JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+                                 WHERE pg_index.indrelid = %s::regclass
+                                 AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = pg_index.indexrelid);""", (table,)).fetchall()
+
+    indexes = []
+    for name, definition in rows:
+        match = INDEX_DEFINITION_PATTERN.match(definition)
+        if match:
+            indexes.append((name, f"{match.group(1)} {staging_name(name)} ON {staging_name(table)} {match.group(2)};"))
+    return indexes
+
+"""
+    Lists GRANT statements reproducing the privileges on a table or view for another one.
+"""
+def grant_statements(connection, relation: str, target: str) -> list:
+    rows = connection.execute("""SELECT CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(acl.grantee)) END, acl.privilege_type
+                                 FROM pg_class, aclexplode(pg_class.relacl) acl
+                                 WHERE pg_class.oid = %s::regclass AND acl.grantee <> pg_class.relowner;""", (relation,)).fetchall()
+    return [f"GRANT {privilege} ON {target} TO {grantee};" for grantee, privilege in rows]
+
+"""
+    Loads one table into its staging table, then makes it logged and builds its primary key and the
+    secondary indexes of the live table.
+
+    :return: Tuple of (table, rows, copy seconds, build seconds, index renames) where index renames
+             lists the (staging name, final name) of the secondary indexes.
+"""
+def load_table(table: str, data_dir: str) -> tuple:
+    spec = INGEST_TABLES[table]
+    staging = staging_name(table)
+    columns = ', '.join(name for name, _ in spec['columns'])
+    connection = get_db_connection()
+
+    try:
+        connection.execute(f"SET maintenance_work_mem = '{INGEST_MAINTENANCE_WORK_MEM}';")
+        connection.execute(f"DROP TABLE IF EXISTS {staging};")
+        connection.execute(f"CREATE UNLOGGED TABLE {staging} ({', '.join(f'{name} {kind}' for name, kind in spec['columns'])});")
+
+        # FREEZE is allowed since the table was created in this transaction, later reads skip setting hint bits
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            with open(os.path.join(data_dir, spec['file']), 'rb') as csv_file:
+                with cursor.copy(f"COPY {staging} ({columns}) FROM STDIN WITH ({spec['options']}, FREEZE true)") as copy:
+                    while block := csv_file.read(INGEST_BUFFER_SIZE):
+                        copy.write(block)
+            rows = cursor.rowcount
+        copy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        connection.execute(f"ALTER TABLE {staging} SET LOGGED;")
+        connection.execute(f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_pkey PRIMARY KEY ({', '.join(spec['primary_key'])});")
+
+        renames = []
+        for name, definition in secondary_indexes(connection, table):
+            connection.execute(definition)
+            renames.append((staging_name(name), name))
+
+        connection.commit()
+        return table, rows, copy_seconds, time.perf_counter() - started, renames
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+"""
+    Adds the location foreign key of a staging table, pointing at the staging location table when
+    location is loaded too.
+"""
+def add_foreign_key(table: str, location: str) -> float:
+    spec = INGEST_TABLES[table]
+    connection = get_db_connection()
+
+    try:
+        started = time.perf_counter()
+        connection.execute(f"""ALTER TABLE {staging_name(table)} ADD CONSTRAINT {table}_{spec['nationkey']}_fkey
+                               FOREIGN KEY ({spec['nationkey']}) REFERENCES {location}(l_nationkey) ON DELETE CASCADE;""")
+        connection.commit()
+        return time.perf_counter() - started
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+"""
+    Lists the views and materialized views over the given tables, and the views over those views, with
+    what is needed to recreate them.
+
+    :return: List of (name, kind, CREATE statement, index statements, grant statements), every view after
+             the views it is built on.
+"""
+def dependent_views(connection, tables: list) -> list:
+    names = []
+    relations = tables
+
+    while relations:
+        rows = connection.execute("""SELECT DISTINCT view_class.relname
+                                     FROM pg_depend
+                                     JOIN pg_rewrite ON pg_rewrite.oid = pg_depend.objid
+                                     JOIN pg_class view_class ON view_class.oid = pg_rewrite.ev_class
+                                     WHERE pg_depend.refobjid = ANY(%s::regclass[]) AND view_class.relkind IN ('v', 'm')
+                                     AND view_class.oid <> pg_depend.refobjid;""", (relations,)).fetchall()
+        relations = [row[0] for row in rows]
+        # A view found again one level down is built on another dependent view, recreate it after that one
+        names = [name for name in names if name not in relations] + relations
+
+    views = []
+    for name in names:
+        relkind, definition = connection.execute("SELECT relkind, pg_get_viewdef(oid) FROM pg_class WHERE oid = %s::regclass;", (name,)).fetchone()
+        kind = 'MATERIALIZED VIEW' if relkind == 'm' else 'VIEW'
+        indexes = [row[0] + ';' for row in connection.execute("SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass;", (name,)).fetchall()]
+        views.append((name, kind, f"CREATE {kind} {name} AS {definition}", indexes, grant_statements(connection, name, name)))
+    return views
+
+"""
+    Replaces the live tables with the loaded staging tables in a single transaction. Listening servers
+    are told to drop every cached series, they receive it when the transaction commits.
+
+    :param renames: Dict of table to the (staging name, final name) of its secondary indexes.
+"""
+def swap_tables(tables: list, renames: dict):
+    connection = get_db_connection()
+
+    try:
+        connection.execute(f"SET lock_timeout = '{INGEST_LOCK_TIMEOUT}';")
+        live = [table for table in tables if table_exists(connection, table)]
+        views = dependent_views(connection, live) if live else []
+        grants = {table: grant_statements(connection, table, table) for table in live}
+
+        for name, kind, *_ in reversed(views):
+            connection.execute(f"DROP {kind} {name};")
+
+        for table in live:
+            connection.execute(f"ALTER TABLE {table} RENAME TO {table}_old;")
+        for table in tables:
+            connection.execute(f"ALTER TABLE {staging_name(table)} RENAME TO {table};")
+        if live:
+            connection.execute(f"DROP TABLE {', '.join(f'{table}_old' for table in live)};")
+
+        for table in tables:
+            connection.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {staging_name(table)}_pkey TO {table}_pkey;")
+            for staging, final in renames[table]:
+                connection.execute(f"ALTER INDEX {staging} RENAME TO {final};")
+            for grant in grants.get(table, []):
+                connection.execute(grant)
+
+        for name, kind, create, indexes, view_grants in views:
+            connection.execute(create)
+            for statement in indexes + view_grants:
+                connection.execute(statement)
+
+        notify_invalidation(connection, None)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    connection = get_db_connection()
+    connection.autocommit = True
+    try:
+        for table in tables:
+            connection.execute(f"ANALYZE {table};")
+    finally:
+        connection.close()
+
+"""
+    Loads tables from their CSVs and swaps them in.
+
+    :param tables: Tables to load (default all). Loading location requires loading every table,
+                   the foreign keys of the others would still point at the old one.
+    :param data_dir: Directory with the CSV files.
+    :param workers: Tables loaded at the same time.
+    :return: Dict of table to (rows, rows per second of the COPY).
+"""
+def ingest(tables: list = None, data_dir: str = DATA_DIR, workers: int = INGEST_WORKERS) -> dict:
+    tables = [table for table in INGEST_TABLES if tables is None or table in tables]
+
+    if 'location' in tables and len(tables) != len(INGEST_TABLES):
+        raise ValueError("location can only be reloaded together with every other table")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        loaded = list(executor.map(lambda table: load_table(table, data_dir), tables))
+
+    report = {}
+    renames = {}
+    for table, rows, copy_seconds, build_seconds, index_renames in loaded:
+        report[table] = (rows, rows / copy_seconds if copy_seconds else 0)
+        renames[table] = index_renames
+        print(f"{table}: {rows} rows copied in {copy_seconds:.2f}s ({report[table][1]:,.0f} rows/s), indexes built in {build_seconds:.2f}s")
+
+    location = staging_name('location') if 'location' in tables else 'location'
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda table: add_foreign_key(table, location), [table for table in tables if INGEST_TABLES[table]['nationkey']]))
+
+    swap_tables(tables, renames)
+
+    total_rows = sum(rows for rows, _ in report.values())
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {total_rows} rows into {len(tables)} tables in {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/s overall)")
+    return report
+
+"""
+    Copies a CSV into a temporary table dropped at commit.
+
+    :return: Number of rows read.
+"""
+def copy_to_temp_table(connection, table: str, data_dir: str) -> int:
+    spec = INGEST_TABLES[table]
+    columns = ', '.join(name for name, _ in spec['columns'])
+
+    connection.execute(f"CREATE TEMP TABLE {table}_delta ({', '.join(f'{name} {kind}' for name, kind in spec['columns'])}) ON COMMIT DROP;")
+    with connection.cursor() as cursor:
+        with open(os.path.join(data_dir, spec['file']), 'rb') as csv_file:
+            with cursor.copy(f"COPY {table}_delta ({columns}) FROM STDIN WITH ({spec['options']})") as copy:
+                while block := csv_file.read(INGEST_BUFFER_SIZE):
+                    copy.write(block)
+        return cursor.rowcount
+
+"""
+    Upserts the locations of the CSV. l_last_observation_date is only taken for new countries, the
+    metric tables move it forward.
+
+    :return: Number of locations inserted or changed.
+"""
+def upsert_locations(connection) -> int:
+    columns = [name for name, _ in INGEST_TABLES['location']['columns']]
+    updated = [name for name in columns if name not in ('l_nationkey', 'l_last_observation_date')]
+
+    rows = connection.execute(f"""INSERT INTO location ({', '.join(columns)}) SELECT DISTINCT ON (l_nationkey) {', '.join(columns)} FROM location_delta
+                                  ON CONFLICT (l_nationkey) DO UPDATE SET {', '.join(f'{name} = EXCLUDED.{name}' for name in updated)}
+                                  WHERE ({', '.join(f'location.{name}' for name in updated)}) IS DISTINCT FROM ({', '.join(f'EXCLUDED.{name}' for name in updated)})
+                                  RETURNING l_nationkey;""").fetchall()
+    return len(rows)
+
+"""
+    Upserts the rows of a metric table that are newer than their country's watermark, the latest date
+    already in this table (MAX of its date column). The watermark is not l_last_observation_date, which
+    covers every table: a country whose cases are ahead of its vaccinations still gets the new vaccinations.
+    l_last_observation_date is then moved forward to the newest upserted date, if it was behind.
+
+    :param lookback_days: Also upsert this many days before the watermark, for revised values.
+    :return: Dict of country name, as the endpoints of the table name it (h_nationname, v_nationname or
+             l_nationname), to number of rows inserted or changed.
+"""
+def upsert_delta(connection, table: str, lookback_days: int) -> dict:
+    spec = INGEST_TABLES[table]
+    nationkey, nationname, day = spec['nationkey'], spec['nationname'], spec['date']
+    columns = [name for name, _ in spec['columns']]
+    updated = [name for name in columns if name not in spec['primary_key']]
+
+    rows = connection.execute(f"""WITH watermarks AS (
+                                      SELECT {nationkey} AS nationkey, MAX({day}) AS watermark FROM {table} GROUP BY {nationkey}
+                                  ), changed AS (
+                                      INSERT INTO {table} ({', '.join(columns)})
+                                      SELECT DISTINCT ON ({', '.join(spec['primary_key'])}) {', '.join(f'delta.{name}' for name in columns)}
+                                      FROM {table}_delta delta
+                                      JOIN location ON l_nationkey = delta.{nationkey}
+                                      LEFT JOIN watermarks ON watermarks.nationkey = delta.{nationkey}
+                                      WHERE watermarks.watermark IS NULL OR delta.{day} > watermarks.watermark - %s::integer
+                                      ON CONFLICT ({', '.join(spec['primary_key'])}) DO UPDATE SET {', '.join(f'{name} = EXCLUDED.{name}' for name in updated)}
+                                      WHERE ({', '.join(f'{table}.{name}' for name in updated)}) IS DISTINCT FROM ({', '.join(f'EXCLUDED.{name}' for name in updated)})
+                                      RETURNING {nationkey} AS nationkey, {day} AS day, {nationname or 'NULL'} AS nationname
+                                  ), marks AS (
+                                      SELECT nationkey, MAX(day) AS day FROM changed GROUP BY nationkey
+                                  ), advanced AS (
+                                      UPDATE location SET l_last_observation_date = marks.day FROM marks
+                                      WHERE l_nationkey = marks.nationkey AND (l_last_observation_date IS NULL OR l_last_observation_date < marks.day)
+                                  )
+                                  SELECT COALESCE(changed.nationname, l_nationname), COUNT(*) FROM changed
+                                  JOIN location ON l_nationkey = changed.nationkey GROUP BY 1;""",
+                              (lookback_days,)).fetchall()
+    return dict(rows)
+
+"""
+    Sends an invalidation message, delivered to the listening servers when the transaction commits.
+
+    :param category: Table whose series changed, every table when None.
+    :param countries: Country names whose series changed, every country when None.
+"""
+def notify_invalidation(connection, category: Optional[str], countries: Optional[list] = None):
+    batches = [countries[i:i + INVALIDATION_BATCH_SIZE] for i in range(0, len(countries), INVALIDATION_BATCH_SIZE)] if countries else [None]
+
+    for batch in batches:
+        payload = {'category': category} if batch is None else {'category': category, 'countries': batch}
+        connection.execute("SELECT pg_notify(%s, %s);", (INVALIDATION_CHANNEL, json.dumps(payload)))
+
+"""
+    Sends invalidation messages in a transaction of their own.
+
+    :param invalidations: List of (category, countries) tuples, see notify_invalidation.
+"""
+def send_invalidations(invalidations: list):
+    connection = get_db_connection()
+
+    try:
+        for category, countries in invalidations:
+            notify_invalidation(connection, category, countries)
+        connection.commit()
+    finally:
+        connection.close()
+
+"""
+    Loads only new rows from the CSVs into the live tables, in one transaction. daily_facts and latest_facts
+    are refreshed after it commits, then servers listening for invalidations are told which series changed,
+    so they never cache the views from before the refresh.
+
+    :param tables: Tables to load (default all).
+    :param data_dir: Directory with the CSV files.
+    :param lookback_days: Also upsert this many days before each watermark.
+    :return: Dict of table to dict of country name to rows upserted.
+"""
+def ingest_incremental(tables: list = None, data_dir: str = DATA_DIR, lookback_days: int = 0) -> dict:
+    tables = [table for table in INGEST_TABLES if tables is None or table in tables]
+    changes = {}
+    invalidations = []
+    connection = get_db_connection()
+    started = time.perf_counter()
+
+    try:
+        for table in tables:
+            table_started = time.perf_counter()
+            read = copy_to_temp_table(connection, table, data_dir)
+
+            if table == 'location':
+                upserted = upsert_locations(connection)
+                if upserted:
+                    invalidations.append(('location', None))
+            else:
+                changes[table] = upsert_delta(connection, table, lookback_days)
+                upserted = sum(changes[table].values())
+                if changes[table]:
+                    invalidations.append((table, sorted(changes[table])))
+
+            seconds = time.perf_counter() - table_started
+            print(f"{table}: {read} rows read, {upserted} upserted in {seconds:.2f}s ({read / seconds if seconds else 0:,.0f} rows/s)")
+
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    if invalidations:
+        try:
+            refresh_facts()
+        except RuntimeError:
+            # No daily_facts view, nothing to refresh
+            pass
+        finally:
+            send_invalidations(invalidations)
+
+    print(f"Incremental load finished in {time.perf_counter() - started:.2f}s")
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load the COVID tables from CSV and swap them in")
+    parser.add_argument('--tables', help="comma separated tables to load (default all)")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="directory with the CSV files")
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS, help="tables loaded in parallel")
+    parser.add_argument('--incremental', action='store_true', help="upsert only rows newer than the loaded data into the live tables")
+    parser.add_argument('--lookback-days', type=int, default=0, help="with --incremental, also upsert this many days before the watermark")
+    args = parser.parse_args()
+
+    tables = args.tables.split(',') if args.tables else None
+    unknown = [table for table in tables or [] if table not in INGEST_TABLES]
+    if unknown:
+        print(f"Unknown tables: {', '.join(unknown)}")
+        return 1
+
+    try:
+        if args.incremental:
+            ingest_incremental(tables, args.data_dir, args.lookback_days)
+        else:
+            ingest(tables, args.data_dir, args.workers)
+    except Exception as e:
+        print(f"Ingest failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+    Versioned schema migrations.
+
+    Migration files live in Database/migrations and are named NNNN_description.sql. Each pending file is
+    applied in order inside its own transaction and recorded in the schema_migrations table.
+
+    Usage (from the Backend directory, as a user that owns the tables):
+        python -m db.migrate               apply every pending migration
+        python -m db.migrate --status      list applied and pending migrations
+        python -m db.migrate --explain     print EXPLAIN ANALYZE of every endpoint query before and after applying
+"""
+import argparse
+import os
+import re
+import sys
+from . import get_db_connection
+from .series import series_query, TESTING_METRICS, VACCINATIONS_METRICS, HOSPITALIZATIONS_INDICATORS
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Database', 'migrations')
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+"""
+    Lists the migration files on disk.
+
+    :return: List of (version, name, path) tuples sorted by version.
+"""
+def find_migrations(directory: str = MIGRATIONS_DIR) -> list:
+    migrations = []
+
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if match:
+            migrations.append((match.group(1), match.group(2), os.path.join(directory, filename)))
+
+    return sorted(migrations)
+
+def ensure_migrations_table(connection):
+    connection.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+                              version VARCHAR(4) PRIMARY KEY,
+                              name VARCHAR(255),
+                              applied_at TIMESTAMPTZ DEFAULT now()
+                          );""")
+    connection.commit()
+
+def applied_versions(connection) -> set:
+    return {row[0] for row in connection.execute('SELECT version FROM schema_migrations;').fetchall()}
+
+"""
+    Builds the query of every data endpoint with representative parameters.
+
+    :return: List of (label, query, params) tuples.
+"""
+def endpoint_queries(country: str) -> list:
+    queries = [('get-countries', 'SELECT l_nationname FROM location;', None)]
+
+    for category, variant in [('cases', None), ('deaths', None), ('testing', TESTING_METRICS[0]),
+                              ('hospitalizations', HOSPITALIZATIONS_INDICATORS[0]), ('vaccinations', VACCINATIONS_METRICS[0])]:
+        query, params = series_query(category, [country], variant)
+        queries.append((f'{category}-by-country', query, params))
+
+    return queries
+
+def explain_endpoints(connection, country: str, heading: str):
+    print(f"\n===== {heading} =====")
+
+    for label, query, params in endpoint_queries(country):
+        plan = connection.execute(f'EXPLAIN (ANALYZE, BUFFERS) {query}', params).fetchall()
+        connection.rollback()
+        print(f"\n--- {label}")
+        for row in plan:
+            print(row[0])
+
+def default_country(connection) -> str:
+    row = connection.execute("""SELECT l_nationname FROM location JOIN cases ON l_nationkey = c_nationkey
+                                GROUP BY l_nationname ORDER BY COUNT(*) DESC LIMIT 1;""").fetchone()
+    connection.rollback()
+    return row[0] if row else ''
+
+"""
+    Applies pending migrations in version order.
+
+    :param target: Stop after this version (default applies everything).
+    :param explain: Print EXPLAIN ANALYZE of the endpoint queries before and after.
+    :param country: Country used for the EXPLAIN ANALYZE queries.
+    :return: List of applied versions. Raises if a migration fails, earlier migrations stay applied.
+"""
+def migrate(target: str = None, explain: bool = False, country: str = None) -> list:
+    connection = get_db_connection()
+
+    try:
+        ensure_migrations_table(connection)
+        done = applied_versions(connection)
+        pending = [migration for migration in find_migrations() if migration[0] not in done and (target is None or migration[0] <= target)]
+
+        if not pending:
+            print("Database is up to date")
+            return []
+
+        if explain:
+            country = country or default_country(connection)
+            explain_endpoints(connection, country, "BEFORE")
+
+        applied = []
+        for version, name, path in pending:
+            with open(path) as migration_file:
+                sql = migration_file.read()
+
+            try:
+                connection.execute(sql)
+                connection.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s);', (version, name))
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                print(f"Migration {version}_{name} failed: {e}")
+                raise
+
+            applied.append(version)
+            print(f"Applied migration {version}_{name}")
+
+        if explain:
+            explain_endpoints(connection, country, "AFTER")
+
+        return applied
+    finally:
+        connection.close()
+
+def print_status():
+    connection = get_db_connection()
+
+    try:
+        ensure_migrations_table(connection)
+        done = applied_versions(connection)
+        for version, name, _ in find_migrations():
+            print(f"{version}_{name}: {'applied' if version in done else 'pending'}")
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument('--status', action='store_true', help="list applied and pending migrations")
+    parser.add_argument('--target', help="apply migrations up to and including this version")
+    parser.add_argument('--explain', action='store_true', help="print EXPLAIN ANALYZE of the endpoint queries before and after")
+    parser.add_argument('--country', help="country used for the EXPLAIN ANALYZE queries")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status()
+        return 0
+
+    try:
+        migrate(args.target, args.explain, args.country)
+    except Exception:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,129 @@
 import psycopg
-from . import get_db_connection
-from typing import List, Tuple, Optional
+import time
+import uuid
+from . import get_db_pool
+from .statements import prepare_flag
+from .singleflight import QUERY_COALESCING, query_flights, query_key
+from Util.instrumentation import phase, record_phase
+from typing import Iterator, List, Tuple, Optional
 
 """
     Executes a database query and optionally returns the results.
+    The connection is borrowed from the shared pool and returned to it afterwards.
     
     :param query: The SQL query to execute (as a string).
     :param params: The parameters for parameterized queries (default is None).
     :param fetch_results: Whether to fetch results for SELECT queries (default is False)
                           or to commit results for non-SELECT queries.
-    :return: A list of rows for SELECT queries, or None for non-SELECT queries.
+    :return: A list of rows for SELECT queries, or None for non-SELECT queries. Concurrent identical
+             SELECT queries share one execution and the same list, which must not be modified.
 """
 def execute_query(query: str, params: Optional[Tuple] = None, fetch_results: bool = False) -> Optional[List[Tuple]]:
-    connection = get_db_connection()
-    cursor = connection.cursor()
+    if fetch_results and QUERY_COALESCING:
+        return query_flights.do(('query',) + query_key(query, params), lambda: _execute_query(query, params, fetch_results))
+    return _execute_query(query, params, fetch_results)
 
-    try:
-        cursor.execute(query, params)
+def _execute_query(query: str, params: Optional[Tuple], fetch_results: bool) -> Optional[List[Tuple]]:
+    started = time.perf_counter()
+    with get_db_pool().connection() as connection:
+        record_phase('db_connect', time.perf_counter() - started)
+        cursor = connection.cursor()
 
-        if fetch_results:
-            return cursor.fetchall()
-        else:
-            connection.commit()
+        try:
+            with phase('db_execute'):
+                cursor.execute(query, params, prepare=prepare_flag(connection, query))
+
+            if fetch_results:
+                with phase('db_fetch'):
+                    return cursor.fetchall()
+            else:
+                connection.commit()
+                return None
+        except Exception as e:
+            print(f"Error executing query: {e}")
+            connection.rollback()
             return None
-    except Exception as e:
-        print(f"Error executing query: {e}")
-        return None
-    finally:
-        cursor.close()
-        connection.close()
+        finally:
+            cursor.close()
+
+"""
+    Executes several SELECT queries in one database session. The queries are pipelined, so the
+    whole batch costs a single network round trip.
+
+    :param queries: List of (query, params) tuples.
+    :return: A list with the rows of each query, in order, or None if the batch failed. Concurrent
+             identical batches share one execution, like execute_query.
+"""
+def execute_queries(queries: List[Tuple[str, Optional[Tuple]]]) -> Optional[List[List[Tuple]]]:
+    if QUERY_COALESCING:
+        return query_flights.do(('batch',) + tuple(query_key(query, params) for query, params in queries), lambda: _execute_queries(queries))
+    return _execute_queries(queries)
+
+def _execute_queries(queries: List[Tuple[str, Optional[Tuple]]]) -> Optional[List[List[Tuple]]]:
+    started = time.perf_counter()
+    with get_db_pool().connection() as connection:
+        record_phase('db_connect', time.perf_counter() - started)
+        cursors = []
+
+        try:
+            with phase('db_execute'):
+                with connection.pipeline():
+                    for query, params in queries:
+                        cursor = connection.cursor()
+                        cursor.execute(query, params, prepare=prepare_flag(connection, query))
+                        cursors.append(cursor)
+
+            with phase('db_fetch'):
+                return [cursor.fetchall() for cursor in cursors]
+        except Exception as e:
+            print(f"Error executing queries: {e}")
+            connection.rollback()
+            return None
+        finally:
+            for cursor in cursors:
+                cursor.close()
+
+"""
+    Executes a SELECT query through a server-side (named) cursor and yields the rows in batches.
+    The pooled connection is held until the generator is exhausted or closed.
+
+    :param query: The SQL query to execute (as a string).
+    :param params: The parameters for parameterized queries (default is None).
+    :param batch_size: Rows fetched per round trip.
+    :return: Generator of lists of rows.
+"""
+def stream_query(query: str, params: Optional[Tuple] = None, batch_size: int = 2000) -> Iterator[List[Tuple]]:
+    with get_db_pool().connection() as connection:
+        with connection.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(query, params)
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+"""
+    Runs a SELECT query as COPY (query) TO STDOUT and yields the output. PostgreSQL sends about one
+    message per row, they are joined into chunks of chunk_size bytes. The pooled connection is held
+    until the generator is exhausted or closed.
+
+    :param query: The SQL query to copy out, without a trailing semicolon. Parameters are bound client-side.
+    :param params: The parameters for parameterized queries (default is None).
+    :param options: COPY options, e.g. 'FORMAT csv, HEADER true'.
+    :param chunk_size: Bytes per yielded chunk (the last one can be shorter).
+    :return: Generator of bytes.
+"""
+def copy_query(query: str, params: Optional[Tuple] = None, options: str = 'FORMAT csv, HEADER true', chunk_size: int = 262144) -> Iterator[bytes]:
+    with get_db_pool().connection() as connection:
+        with connection.cursor() as cursor:
+            with cursor.copy(f"COPY ({query}) TO STDOUT WITH ({options})", params) as copy:
+                buffer = bytearray()
+                for data in copy:
+                    buffer += data
+                    if len(buffer) >= chunk_size:
+                        yield bytes(buffer)
+                        buffer.clear()
+                if buffer:
+                    yield bytes(buffer)
@@ -0,0 +1,685 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from dotenv import load_dotenv
+from .queries import execute_query, execute_queries, stream_query
+from .async_queries import execute_queries_concurrently
+from .statements import register_statement
+from Cache import series_cache, POPULATION_KEY
+from Engine.memory_store import memory_store
+from Engine.catalogue import country_catalogue, AGGREGATE_KEY_PREFIX
+from Util.instrumentation import phase
+from Util.transforms import transform_series, PER_CAPITA_METRICS, DECIMALS
+from typing import Iterator, List, Optional, Tuple
+import os
+
+load_dotenv()
+
+# 'postgres' answers from the database through the series cache, 'memory' from the columnar in-memory store
+QUERY_ENGINE = os.getenv("QUERY_ENGINE", "postgres")
+
+# 'tables' reads the five metric tables, 'facts' the daily_facts materialized view (migration 0002) with
+# every metric of a country and day in one row, 'auto' uses the view once it exists and is populated. The view is only
+# as fresh as its last refresh (python -m db.facts, also run by db.ingest), so reading it is an opt-in.
+SERIES_SOURCE = os.getenv("SERIES_SOURCE", "tables")
+
+# 'sync' fetches cache misses as one pipelined batch on a pooled connection, 'async' runs the query of each
+# spec on its own connection of the async pool (psycopg AsyncConnection) concurrently. Opt-in, it was slower
+# than 'sync' against a local database (see bench.async_benchmark).
+SERVING_MODE = os.getenv("SERVING_MODE", "sync")
+
+TESTING_METRICS = ['t_cumulative_total', 't_daily_change_ct', 't_ct_per_thousand', 't_daily_change_ct_per_thousand',
+                   't_short_term_positive_rate', 't_short_term_tests_per_case']
+VACCINATIONS_METRICS = ['v_total_vaccinations', 'v_people_fully_vaccinated', 'v_total_boosters',
+                        'v_daily_vaccinations', 'v_people_fully_vaccinated_per_hundred', 'v_total_boosters_per_hundred']
+HOSPITALIZATIONS_INDICATORS = ['Daily hospital occupancy', 'Daily ICU occupancy', 'Weekly new hospital admissions',
+                               'Weekly new ICU admissions']
+
+# Series queries. Every row starts with the country (nationkey for NATIONKEY_CATEGORIES, name otherwise)
+# and the formatted date, the remaining columns are exactly the row the endpoints return. {metric} is only
+# ever filled from the lists above, {window} is empty for full series or a date range filter on the
+# category's date column.
+SERIES_QUERIES = {
+    'cases': """SELECT c_nationkey, TO_CHAR(c_date, 'YYYY-MM-DD') AS formatted_date, c_cases FROM cases
+                WHERE c_nationkey = ANY(%s){window} ORDER BY {order};""",
+    'deaths': """SELECT d_nationkey, TO_CHAR(d_date, 'YYYY-MM-DD') AS formatted_date, d_death FROM deaths
+                 WHERE d_nationkey = ANY(%s){window} ORDER BY {order};""",
+    'testing': """SELECT t_nationkey, TO_CHAR(t_date, 'YYYY-MM-DD') AS formatted_date, split_part(t_entity, ' - ', 2) AS metric_value,
+                  {metric} FROM testing WHERE t_nationkey = ANY(%s){window} ORDER BY {order};""",
+    'hospitalizations': """SELECT h_nationname, TO_CHAR(h_date, 'YYYY-MM-DD') AS formatted_date, h_indicator, h_value FROM hospitalizations
+                           WHERE h_nationname = ANY(%s) AND h_indicator = %s{window} ORDER BY {order};""",
+    'vaccinations': """SELECT v_nationname, TO_CHAR(v_date, 'YYYY-MM-DD') AS formatted_date, {metric} FROM vaccinations
+                       WHERE v_nationname = ANY(%s){window} ORDER BY {order};"""
+}
+# Tables without a country name, queried by the nationkeys of the country catalogue instead of joining location
+NATIONKEY_CATEGORIES = ['cases', 'deaths', 'testing']
+SERIES_DATE_COLUMNS = {'cases': 'c_date', 'deaths': 'd_date', 'testing': 't_date', 'hospitalizations': 'h_date', 'vaccinations': 'v_date'}
+SERIES_COUNTRY_COLUMNS = {'cases': 'c_nationkey', 'deaths': 'd_nationkey', 'testing': 't_nationkey', 'hospitalizations': 'h_nationname',
+                          'vaccinations': 'v_nationname'}
+# Orders streamed rows by the position of their country in the array of the requested countries sorted by name. The
+# tables are ordered by nationkey and the database collation need not sort names like Python, while the buffered
+# JSON responses list countries in Python's order of their names.
+NAME_ORDER = "array_position(%s::varchar[], {country}::varchar), {date}"
+
+COUNTRIES_QUERY = 'SELECT l_nationname FROM location;'
+
+# The schema has no population column. Every source table also has a per-capita variant of a total
+# (vaccinations per hundred, tests per thousand, hospitalizations per million), the median ratio of the
+# two gives the population the source used. Small per-capita values are left out, their rounding dominates.
+POPULATION_QUERY = """WITH estimates AS (
+                          SELECT v_nationkey AS nationkey, v_people_fully_vaccinated * 100.0 / v_people_fully_vaccinated_per_hundred AS population
+                          FROM vaccinations WHERE v_people_fully_vaccinated_per_hundred >= 1
+                          UNION ALL
+                          SELECT t_nationkey, t_cumulative_total * 1000.0 / t_ct_per_thousand
+                          FROM testing WHERE t_ct_per_thousand >= 1
+                          UNION ALL
+                          SELECT total.h_nationkey, total.h_value * 1000000.0 / per_million.h_value
+                          FROM hospitalizations total JOIN hospitalizations per_million
+                               ON per_million.h_nationkey = total.h_nationkey AND per_million.h_date = total.h_date
+                              AND per_million.h_indicator = total.h_indicator || ' per million'
+                          WHERE per_million.h_value >= 1
+                      )
+                      SELECT nationkey, percentile_cont(0.5) WITHIN GROUP (ORDER BY population) FROM estimates GROUP BY nationkey;"""
+
+# daily_facts columns of each category and the f_present bit set when the source row exists
+FACT_CATEGORY_COLUMNS = {'cases': (['c_cases'], 1), 'deaths': (['d_death'], 2), 'testing': (['t_note'], 4), 'vaccinations': ([], 8)}
+HOSPITALIZATIONS_FACT_COLUMNS = {
+    'Daily hospital occupancy': ('h_daily_hospital_occupancy', 16),
+    'Daily hospital occupancy per million': ('h_daily_hospital_occupancy_per_million', 32),
+    'Daily ICU occupancy': ('h_daily_icu_occupancy', 64),
+    'Daily ICU occupancy per million': ('h_daily_icu_occupancy_per_million', 128),
+    'Weekly new hospital admissions': ('h_weekly_new_hospital_admissions', 256),
+    'Weekly new hospital admissions per million': ('h_weekly_new_hospital_admissions_per_million', 512),
+    'Weekly new ICU admissions': ('h_weekly_new_icu_admissions', 1024),
+    'Weekly new ICU admissions per million': ('h_weekly_new_icu_admissions_per_million', 2048)
+}
+# daily_facts name column of each category, the name column of its table (f_nationname is l_nationname)
+FACT_NAME_COLUMNS = {'cases': 'f_nationname', 'deaths': 'f_nationname', 'testing': 'f_nationname',
+                     'hospitalizations': 'f_h_nationname', 'vaccinations': 'f_v_nationname'}
+VIEW_AVAILABLE_QUERY = "SELECT ispopulated FROM pg_matviews WHERE matviewname = %s;"
+
+# Snapshots of every location (/api/ranking): one date through the date index of daily_facts, or the latest
+# observations precomputed in latest_facts (migration 0003). {column} is only ever filled from fact_spec_columns,
+# {name} from FACT_NAME_COLUMNS.
+SNAPSHOT_DATE_QUERY = "SELECT {name}, f_day, {column} FROM daily_facts WHERE f_date = %s AND {column} IS NOT NULL;"
+SNAPSHOT_LATEST_QUERY = "SELECT lf_nationname, lf_day, lf_value FROM latest_facts WHERE lf_metric = %s;"
+# Same from the metric tables, read by nationkey. {value} is the metric column, {indicator} the hospitalizations filter.
+SNAPSHOT_TABLE_DATE_QUERY = """SELECT {nationkey}, TO_CHAR({date}, 'YYYY-MM-DD'), {value} FROM {table}
+                               WHERE {date} = %s AND {value} IS NOT NULL{indicator};"""
+SNAPSHOT_TABLE_LATEST_QUERY = """SELECT DISTINCT ON ({nationkey}) {nationkey}, TO_CHAR({date}, 'YYYY-MM-DD'), {value} FROM {table}
+                                 WHERE {value} IS NOT NULL{indicator} ORDER BY {nationkey}, {date} DESC;"""
+SERIES_NATIONKEY_COLUMNS = {'cases': 'c_nationkey', 'deaths': 'd_nationkey', 'testing': 't_nationkey', 'hospitalizations': 'h_nationkey',
+                            'vaccinations': 'v_nationkey'}
+
+# latest_facts stores every value as NUMERIC, these columns are BIGINT in daily_facts
+INTEGRAL_METRICS = ['c_cases', 'd_death', 'v_total_vaccinations', 'v_people_fully_vaccinated', 'v_total_boosters', 'v_daily_vaccinations']
+
+_views_available = {}
+
+# Rows per round trip when streaming a series window through a server-side cursor
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "2000"))
+
+"""
+    Builds the series query and its parameters for a category.
+
+    :param category: One of cases, deaths, testing, hospitalizations, vaccinations.
+    :param countries: Country names to fetch (unknown names are left out of the nationkey queries).
+    :param variant: Metric column (testing, vaccinations) or full indicator name (hospitalizations).
+    :param start_date: Start of the window (YYYY-MM-DD), the full series is fetched when None.
+    :param end_date: End of the window (YYYY-MM-DD).
+    :param by_name: Order the countries by name (see NAME_ORDER) rather than by the country column of the table.
+    :return: Tuple of (query, params).
+"""
+def series_query(category: str, countries: List[str], variant: Optional[str] = None, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 by_name: bool = False):
+    metric = None
+    countries = sorted(countries) if by_name else countries
+    keys = country_catalogue.nationkeys(countries) if category in NATIONKEY_CATEGORIES else list(countries)
+    params = [keys]
+
+    if category in ('testing', 'vaccinations'):
+        accepted = TESTING_METRICS if category == 'testing' else VACCINATIONS_METRICS
+        if variant not in accepted:
+            raise ValueError(f"Invalid metric name: {variant}")
+        metric = variant
+    elif category == 'hospitalizations':
+        params.append(variant)
+
+    window = ''
+    if start_date is not None:
+        window = f" AND {SERIES_DATE_COLUMNS[category]} BETWEEN %s AND %s"
+        params += [start_date, end_date]
+
+    order = f"{SERIES_COUNTRY_COLUMNS[category]}, {SERIES_DATE_COLUMNS[category]}"
+    if by_name:
+        order = NAME_ORDER.format(country=SERIES_COUNTRY_COLUMNS[category], date=SERIES_DATE_COLUMNS[category])
+        params.append(keys)
+
+    return SERIES_QUERIES[category].format(metric=metric, window=window, order=order), tuple(params)
+
+"""
+    Registers the full-series query of every (table, metric) with the statement registry, so each is
+    prepared once per pooled connection. Countries are a single array parameter, so the text does not
+    depend on how many are requested. daily_facts gets one statement per single spec, the multi-spec
+    queries of /api/batch vary with the specs and are left to psycopg's own prepare threshold.
+"""
+def register_series_statements():
+    variants = {'cases': [None], 'deaths': [None], 'testing': TESTING_METRICS, 'hospitalizations': [None], 'vaccinations': VACCINATIONS_METRICS}
+    for category, category_variants in variants.items():
+        for variant in category_variants:
+            query, params = series_query(category, [], '' if category == 'hospitalizations' else variant)
+            register_statement('_'.join(filter(None, ['series', category, variant])), query, ([''],) + params[1:])
+
+    variants['hospitalizations'] = list(HOSPITALIZATIONS_FACT_COLUMNS)
+    for category, category_variants in variants.items():
+        for variant in category_variants:
+            query, params, _ = fact_series_query([(category, variant)], [''])
+            name = '_'.join(filter(None, ['facts', category, variant and variant.lower().replace(' ', '_')]))
+            register_statement(name, query, params, relation='daily_facts')
+
+"""
+    Checks whether series are read from the daily_facts view. With SERIES_SOURCE 'auto' the catalog is
+    looked up once per process.
+"""
+def use_facts() -> bool:
+    return use_view('daily_facts')
+
+"""
+    Checks whether a materialized view of the migrations is read instead of the metric tables, see use_facts.
+"""
+def use_view(name: str) -> bool:
+    if SERIES_SOURCE != 'auto':
+        return SERIES_SOURCE == 'facts'
+
+    if name not in _views_available:
+        data = execute_query(VIEW_AVAILABLE_QUERY, (name,), fetch_results=True)
+        if data is None:
+            return False
+        _views_available[name] = bool(data and data[0][0])
+
+    return _views_available[name]
+
+"""
+    Gets the daily_facts columns and presence bit of a (category, variant) spec.
+
+    :return: Tuple of (columns, bit). The columns are the row the endpoints return, after the date
+             (hospitalization rows also carry the indicator name, which is not a column).
+"""
+def fact_spec_columns(category: str, variant: Optional[str] = None):
+    if category == 'hospitalizations':
+        if variant not in HOSPITALIZATIONS_FACT_COLUMNS:
+            raise ValueError(f"Invalid indicator name: {variant}")
+        column, bit = HOSPITALIZATIONS_FACT_COLUMNS[variant]
+        return [column], bit
+
+    columns, bit = FACT_CATEGORY_COLUMNS[category]
+    if category in ('testing', 'vaccinations'):
+        accepted = TESTING_METRICS if category == 'testing' else VACCINATIONS_METRICS
+        if variant not in accepted:
+            raise ValueError(f"Invalid metric name: {variant}")
+        columns = columns + [variant]
+
+    return columns, bit
+
+"""
+    Builds one daily_facts query for several (category, variant) specs: a single range scan per country
+    returns every requested metric. The specs must share a name column (see FACT_NAME_COLUMNS).
+
+    :param by_name: Order the countries by name (see NAME_ORDER) rather than by the name column.
+    :return: Tuple of (query, params, columns), columns being the metric columns selected after
+             the name, the formatted date and f_present.
+"""
+def fact_series_query(specs: List[Tuple[str, Optional[str]]], countries: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      by_name: bool = False):
+    columns = []
+    mask = 0
+    countries = sorted(countries) if by_name else list(countries)
+    params = [countries]
+    name = FACT_NAME_COLUMNS[specs[0][0]]
+    if any(FACT_NAME_COLUMNS[category] != name for category, _ in specs):
+        raise ValueError("daily_facts specs of one query must share a name column")
+
+    for category, variant in specs:
+        spec_columns, bit = fact_spec_columns(category, variant)
+        columns += [column for column in spec_columns if column not in columns]
+        mask |= bit
+
+    window = ''
+    if start_date is not None:
+        window = " AND f_date BETWEEN %s AND %s"
+        params += [start_date, end_date]
+
+    order = f"{name}, f_date"
+    if by_name:
+        order = NAME_ORDER.format(country=name, date='f_date')
+        params.append(countries)
+
+    query = f"""SELECT {name}, f_day, f_present, {', '.join(columns)} FROM daily_facts
+                WHERE {name} = ANY(%s) AND f_present & {mask} <> 0{window} ORDER BY {order};"""
+    return query, tuple(params), columns
+
+"""
+    Builds a function extracting the endpoint row of one spec from daily_facts rows,
+    returning None for days without a source row.
+"""
+def fact_row_reader(category: str, variant: Optional[str], columns: List[str]):
+    spec_columns, bit = fact_spec_columns(category, variant)
+    positions = [3 + columns.index(column) for column in spec_columns]
+    label = [variant] if category == 'hospitalizations' else []
+
+    def read(row):
+        if not row[2] & bit:
+            return None
+        return to_series_row([row[1]] + label + [row[position] for position in positions])
+
+    return read
+
+"""
+    Groups daily_facts rows by spec and country.
+
+    :return: Dict of (category, variant) to a dict of country name to (dates, rows), with every requested country.
+"""
+def group_fact_rows(data: list, specs: List[Tuple[str, Optional[str]]], countries: List[str], columns: List[str]) -> dict:
+    readers = {spec: fact_row_reader(*spec, columns) for spec in specs}
+    grouped = {spec: {country: ([], []) for country in countries} for spec in specs}
+
+    for row in data:
+        for spec, read in readers.items():
+            values = read(row)
+            if values is not None:
+                dates, rows = grouped[spec].setdefault(row[0], ([], []))
+                dates.append(row[1])
+                rows.append(values)
+
+    return grouped
+
+"""
+    Converts the values of a query row to what the endpoints return. NUMERIC comes back as Decimal,
+    serialize it as a JSON number like the memory engine does (Flask would write a string).
+"""
+def to_series_row(values) -> list:
+    return [float(value) if isinstance(value, Decimal) else value for value in values]
+
+"""
+    Groups full-series query rows by country.
+
+    :param by_nationkey: The rows start with the nationkey rather than the name (NATIONKEY_CATEGORIES).
+    :return: Dict of country name to a tuple of (dates, rows). Requested countries without rows map to empty lists.
+"""
+def group_series_rows(data: list, countries: List[str], by_nationkey: bool = False) -> dict:
+    series = {country: ([], []) for country in countries}
+
+    for row in data:
+        dates, rows = series.setdefault(country_catalogue.name_of(row[0]) if by_nationkey else row[0], ([], []))
+        dates.append(row[1])
+        rows.append(to_series_row(row[1:]))
+
+    return series
+
+"""
+    Gets the full series of several countries for several (category, variant) specs. Cached series are
+    served from the series cache, everything else is fetched in one pipelined database session
+    (or one query per spec concurrently over the async pool when SERVING_MODE is 'async').
+
+    :param specs: List of (category, variant) tuples.
+    :param countries: Country names.
+    :return: Dict of (category, variant) to a dict of country name to (dates, rows).
+"""
+def get_full_series_many(specs: List[Tuple[str, Optional[str]]], countries: List[str]) -> dict:
+    result = {}
+    to_fetch = []
+
+    for category, variant in dict.fromkeys(specs):
+        result[(category, variant)] = {}
+        missing = []
+
+        for country in dict.fromkeys(countries):
+            cached = series_cache.get((category, variant, country))
+            if cached is None:
+                missing.append(country)
+            else:
+                result[(category, variant)][country] = cached
+
+        if missing:
+            to_fetch.append((category, variant, missing))
+
+    if to_fetch and use_facts():
+        return fetch_fact_series(to_fetch, result)
+
+    if to_fetch and SERVING_MODE == 'async':
+        with phase('db_execute'):
+            data = execute_queries_concurrently([series_query(category, missing, variant) for category, variant, missing in to_fetch])
+    elif to_fetch:
+        data = execute_queries([series_query(category, missing, variant) for category, variant, missing in to_fetch])
+
+    if to_fetch and data is not None:
+        for (category, variant, missing), rows in zip(to_fetch, data):
+            with phase('regroup'):
+                fetched = group_series_rows(rows, missing, category in NATIONKEY_CATEGORIES)
+            for country in missing:
+                series_cache.put((category, variant, country), fetched[country])
+                result[(category, variant)][country] = fetched[country]
+
+    return result
+
+"""
+    Fetches the missing full series of get_full_series_many from daily_facts, one query for all specs sharing
+    a name column (run concurrently over the async pool when SERVING_MODE is 'async'), and caches them.
+"""
+def fetch_fact_series(to_fetch: list, result: dict) -> dict:
+    by_name = {}
+    for category, variant, missing in to_fetch:
+        by_name.setdefault(FACT_NAME_COLUMNS[category], []).append((category, variant, missing))
+
+    groups = []
+    for group in by_name.values():
+        specs = [(category, variant) for category, variant, _ in group]
+        countries = list(dict.fromkeys(country for _, _, missing in group for country in missing))
+        groups.append((group, specs, countries, fact_series_query(specs, countries)))
+
+    queries = [(query, params) for _, _, _, (query, params, _) in groups]
+    if SERVING_MODE == 'async':
+        with phase('db_execute'):
+            data = execute_queries_concurrently(queries)
+    else:
+        data = execute_queries(queries)
+
+    if data is None:
+        return result
+
+    for (group, specs, countries, (_, _, columns)), rows in zip(groups, data):
+        with phase('regroup'):
+            fetched = group_fact_rows(rows, specs, countries, columns)
+        for category, variant, missing in group:
+            for country in missing:
+                series_cache.put((category, variant, country), fetched[(category, variant)][country])
+                result[(category, variant)][country] = fetched[(category, variant)][country]
+
+    return result
+
+"""
+    Gets the full series of several countries, serving what it can from the series cache and
+    fetching the remaining countries in a single query.
+
+    :return: Dict of country name to a tuple of (dates, rows) for every requested country.
+"""
+def get_full_series(category: str, countries: List[str], variant: Optional[str] = None) -> dict:
+    return get_full_series_many([(category, variant)], countries)[(category, variant)]
+
+"""
+    Gets the names of all locations, sorted, from the country catalogue.
+
+    :return: List of country names, empty if the catalogue could not be loaded.
+"""
+def get_country_names() -> list:
+    try:
+        return country_catalogue.names()
+    except RuntimeError:
+        return []
+
+"""
+    Gets the population of every location with per-capita data, cached like a series. It is keyed by nationkey,
+    the tables do not all name a country the same (see CountryCatalogue.resolve).
+
+    :return: Dict of nationkey to population, empty if the query failed.
+"""
+def get_populations() -> dict:
+    populations = series_cache.get(POPULATION_KEY)
+
+    if populations is None:
+        data = execute_query(POPULATION_QUERY, fetch_results=True)
+        if data is None:
+            return {}
+        populations = {nationkey: float(population) for nationkey, population in data}
+        series_cache.put(POPULATION_KEY, populations)
+
+    return populations
+
+"""
+    Gets derived series (see Util.transforms) of several countries and specs. Each is computed once
+    from the full series and cached next to it, under the variant (variant, transform), so the
+    invalidation of a category or country drops the derived series too.
+
+    :param transform: One of Util.transforms.TRANSFORMS.
+    :return: Dict of (category, variant) to a dict of country name to (dates, rows). Countries without
+             a population figure have an empty per_million series.
+"""
+def get_derived_series_many(specs: List[Tuple[str, Optional[str]]], countries: List[str], transform: str) -> dict:
+    result = {}
+    missing = []
+
+    for category, variant in dict.fromkeys(specs):
+        if transform == 'per_million' and variant in PER_CAPITA_METRICS:
+            raise ValueError(f"per_million does not apply to metric: {variant}")
+
+        result[(category, variant)] = {}
+        for country in dict.fromkeys(countries):
+            cached = series_cache.get((category, (variant, transform), country))
+            if cached is None:
+                missing.append((category, variant, country))
+            else:
+                result[(category, variant)][country] = cached
+
+    if not missing:
+        return result
+
+    populations = get_populations() if transform == 'per_million' else {}
+    if QUERY_ENGINE == 'memory':
+        memory_store.load()
+        full_series_many = {}
+        for category, variant, country in missing:
+            rows = memory_store.get_rows(category, country, '0001-01-01', '9999-12-31', variant)
+            full_series_many.setdefault((category, variant), {})[country] = ([row[0] for row in rows], rows)
+    else:
+        full_series_many = get_full_series_many([(category, variant) for category, variant, _ in missing],
+                                                [country for _, _, country in missing])
+
+    for category, variant, country in missing:
+        dates, rows = full_series_many[(category, variant)].get(country, ([], []))
+        population = populations.get(country_catalogue.resolve(country)) if transform == 'per_million' else None
+        if transform == 'per_million' and not population:
+            derived = ([], [])
+        else:
+            derived = transform_series(dates, rows, transform, variant, population)
+        series_cache.put((category, (variant, transform), country), derived)
+        result[(category, variant)][country] = derived
+
+    return result
+
+"""
+    Builds the query of a snapshot: the value of every location on a date, or its latest observation.
+
+    :param date: Date of the snapshot (YYYY-MM-DD), or None for the latest observation of each location.
+    :return: Tuple of (query, params, by_nationkey), by_nationkey telling whether rows start with the nationkey
+             rather than the name.
+"""
+def snapshot_query(category: str, variant: Optional[str] = None, date: Optional[str] = None):
+    column = fact_spec_columns(category, variant)[0][-1]
+
+    if date is None and use_view('latest_facts'):
+        return SNAPSHOT_LATEST_QUERY, (column,), False
+    if date is not None and use_facts():
+        return SNAPSHOT_DATE_QUERY.format(name=FACT_NAME_COLUMNS[category], column=column), (date,), False
+
+    params = [] if date is None else [date]
+    indicator = ''
+    if category == 'hospitalizations':
+        column, indicator = 'h_value', ' AND h_indicator = %s'
+        params.append(variant)
+
+    query = SNAPSHOT_TABLE_LATEST_QUERY if date is None else SNAPSHOT_TABLE_DATE_QUERY
+    query = query.format(nationkey=SERIES_NATIONKEY_COLUMNS[category], date=SERIES_DATE_COLUMNS[category], value=column,
+                         table=category, indicator=indicator)
+    return query, tuple(params), True
+
+"""
+    Gets the value of every location on a date, or its latest observation, in one scan. Cached like a series,
+    under the country None, which the invalidation of any country of the category drops.
+
+    :param category: One of cases, deaths, testing, hospitalizations, vaccinations.
+    :param variant: Metric column (testing, vaccinations) or full indicator name (hospitalizations).
+    :param date: Date of the snapshot (YYYY-MM-DD), or None for the latest observation of each location.
+    :return: List of [country name, date, value] rows in no particular order, locations without a value left out.
+"""
+def get_snapshot(category: str, variant: Optional[str] = None, date: Optional[str] = None) -> list:
+    if QUERY_ENGINE == 'memory':
+        memory_store.load()
+        return memory_store.get_snapshot(category, date, variant)
+
+    key = (category, ('snapshot', variant, date), None)
+    snapshot = series_cache.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    query, params, by_nationkey = snapshot_query(category, variant, date)
+    data = execute_query(query, params, fetch_results=True)
+    if data is None:
+        return []
+
+    with phase('regroup'):
+        integral = fact_spec_columns(category, variant)[0][-1] in INTEGRAL_METRICS
+        snapshot = []
+        for country, day, value in data:
+            if by_nationkey:
+                country = country_catalogue.name_of(country)
+            value = int(value) if integral else float(value) if isinstance(value, Decimal) else value
+            if country is not None:
+                snapshot.append([country, day, value])
+
+    series_cache.put(key, snapshot)
+    return snapshot
+
+"""
+    Ranks the locations by their value on a date, or by their latest observation.
+
+    :param per_million: Divide the values by the population (see get_populations), locations without one are left out.
+    :param descending: Highest values first.
+    :param limit: Number of locations returned, all of them when None.
+    :param aggregates: Keep the aggregate regions (continents, income groups, World) next to the countries.
+    :return: List of [country name, date, value] rows, ranked.
+"""
+def get_ranking(category: str, variant: Optional[str] = None, date: Optional[str] = None, per_million: bool = False,
+                descending: bool = True, limit: Optional[int] = None, aggregates: bool = False) -> list:
+    if per_million and variant in PER_CAPITA_METRICS:
+        raise ValueError(f"per_million does not apply to metric: {variant}")
+
+    rows = get_snapshot(category, variant, date)
+    populations = get_populations() if per_million else {}
+
+    with phase('transform'):
+        # Snapshot rows are named like the category's table (h_nationname, v_nationname from the facts views)
+        keyed = [(country_catalogue.resolve(row[0]) or '', row) for row in rows]
+        if not aggregates:
+            keyed = [(key, row) for key, row in keyed if not key.startswith(AGGREGATE_KEY_PREFIX)]
+        if per_million:
+            rows = [[country, day, round(value / populations[key] * 1e6, DECIMALS)] for key, (country, day, value) in keyed
+                    if populations.get(key)]
+        else:
+            rows = [row for _, row in keyed]
+
+        ranked = sorted(rows, key=lambda row: (-row[2] if descending else row[2], row[0]))
+        return ranked if limit is None else ranked[:limit]
+
+"""
+    Slices a (dates, rows) series to the dates between start_date and end_date (inclusive).
+    Dates are 'YYYY-MM-DD' strings, so they sort like the dates they represent.
+"""
+def slice_series(series, start_date: str, end_date: str) -> list:
+    dates, rows = series
+    return rows[bisect_left(dates, start_date):bisect_right(dates, end_date)]
+
+"""
+    Leaves out the rows whose date falls in any of the given ranges, for clients that already hold them.
+
+    :param rows: Date-sorted rows, each starting with its 'YYYY-MM-DD' date.
+    :param ranges: List of [start, end] date pairs (inclusive), in any order and possibly overlapping.
+    :return: The remaining rows, in order.
+"""
+def exclude_ranges(rows: list, ranges: list) -> list:
+    ranges = sorted(ranges)
+    remaining = []
+    i = 0
+
+    for row in rows:
+        while i < len(ranges) and ranges[i][1] < row[0]:
+            i += 1
+        if i == len(ranges) or row[0] < ranges[i][0]:
+            remaining.append(row)
+
+    return remaining
+
+"""
+    Gets the rows of one or more countries within a window of time.
+
+    :param category: One of cases, deaths, testing, hospitalizations, vaccinations.
+    :param countries: Country names.
+    :param start_date: Start of the window (YYYY-MM-DD).
+    :param end_date: End of the window (YYYY-MM-DD).
+    :param variant: Metric column (testing, vaccinations) or full indicator name (hospitalizations).
+    :param transform: Derived series to return instead of the stored values (see Util.transforms), or None.
+    :return: Dict of country name to its rows. Countries without rows in the window are left out.
+"""
+def get_series_window(category: str, countries: List[str], start_date: str, end_date: str, variant: Optional[str] = None,
+                      transform: Optional[str] = None) -> dict:
+    return get_series_windows([(category, variant)], countries, start_date, end_date, transform)[(category, variant)]
+
+"""
+    Gets the rows of several (category, variant) specs for the same countries and window of time,
+    using a single database session for everything that is not cached.
+
+    :param specs: List of (category, variant) tuples.
+    :param transform: Derived series to return instead of the stored values (see Util.transforms), or None.
+    :return: Dict of (category, variant) to a dict of country name to its rows.
+"""
+def get_series_windows(specs: List[Tuple[str, Optional[str]]], countries: List[str], start_date: str, end_date: str,
+                       transform: Optional[str] = None) -> dict:
+    if transform is None and QUERY_ENGINE == 'memory':
+        memory_store.load()
+        with phase('regroup'):
+            return {(category, variant): memory_store.get_series_window(category, countries, start_date, end_date, variant)
+                    for category, variant in dict.fromkeys(specs)}
+
+    result = {}
+    if transform is None:
+        full_series_many = get_full_series_many(specs, countries)
+    else:
+        full_series_many = get_derived_series_many(specs, countries, transform)
+
+    with phase('regroup'):
+        for spec, full_series in full_series_many.items():
+            result[spec] = {}
+            for country, series in full_series.items():
+                rows = slice_series(series, start_date, end_date)
+                if rows:
+                    result[spec][country] = rows
+
+    return result
+
+"""
+    Streams the rows of one or more countries within a window of time straight from a server-side cursor,
+    bypassing the series cache, so memory use does not depend on the size of the window.
+
+    :return: Generator of batches, each a list of (country, row) tuples ordered by country name then date,
+             the order of the buffered responses.
+"""
+def stream_series_window(category: str, countries: List[str], start_date: str, end_date: str, variant: Optional[str] = None,
+                         batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[Tuple[str, list]]]:
+    if QUERY_ENGINE == 'memory':
+        memory_store.load()
+        for country, rows in sorted(memory_store.get_series_window(category, countries, start_date, end_date, variant).items()):
+            yield [(country, row) for row in rows]
+        return
+
+    if use_facts():
+        query, params, columns = fact_series_query([(category, variant)], countries, start_date, end_date, by_name=True)
+        read = fact_row_reader(category, variant, columns)
+        for batch in stream_query(query, params, batch_size):
+            yield [(row[0], read(row)) for row in batch]
+        return
+
+    query, params = series_query(category, countries, variant, start_date, end_date, by_name=True)
+    name_of = country_catalogue.name_of if category in NATIONKEY_CATEGORIES else (lambda country: country)
+    for batch in stream_query(query, params, batch_size):
+        yield [(name_of(row[0]), to_series_row(row[1:])) for row in batch]
+
+
+register_series_statements()
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import threading
+from dotenv import load_dotenv
+from Util.instrumentation import CounterMetric, phase
+
+load_dotenv()
+
+# Concurrent identical reads share one database execution
+QUERY_COALESCING = os.getenv("QUERY_COALESCING", "true").lower() == "true"
+
+coalesced_queries = CounterMetric('covid_api_coalesced_queries_total',
+                                  'Read queries by outcome: executed on the database or shared with an identical one in flight', ['result'])
+
+"""
+    Builds the key identifying a query: its text with whitespace normalized, and its parameters with
+    lists turned into tuples so they can be hashed.
+"""
+def query_key(query: str, params) -> tuple:
+    def freeze(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(item) for item in value)
+        return value
+
+    return ' '.join(query.split()), freeze(params)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+        Runs at most one execution per key at a time. Callers arriving while the key is in flight wait
+        for it and get the same result (or exception), which they must not modify.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            coalesced_queries.inc(('shared',))
+            with phase('db_execute'):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        coalesced_queries.inc(('executed',))
+        try:
+            call.result = function()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+        SingleFlight for coroutines, every caller must run on the same event loop.
+    """
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, coroutine_function):
+        future = self._calls.get(key)
+        if future is not None:
+            coalesced_queries.inc(('shared',))
+            return await asyncio.shield(future)
+
+        coalesced_queries.inc(('executed',))
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await coroutine_function()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting, do not warn about an exception that was never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+query_flights = SingleFlight()
+
+"""
+    Reports how many read queries ran on the database and how many were served by an identical query in flight.
+"""
+def get_coalescing_stats() -> dict:
+    executed = coalesced_queries.value(('executed',))
+    shared = coalesced_queries.value(('shared',))
+
+    return {
+        "enabled": QUERY_COALESCING,
+        "executed": executed,
+        "saved": shared,
+        "saved_ratio": shared / (executed + shared) if executed + shared else 0
+    }
@@ -0,0 +1,136 @@
+import os
+import threading
+import weakref
+from dotenv import load_dotenv
+from Util.instrumentation import CounterMetric
+from typing import Optional, Tuple
+
+load_dotenv()
+
+# Registered statements are prepared server-side on every pooled connection and executed by name
+# afterwards, so PostgreSQL parses and plans each of them once per connection. Disable when running
+# behind a pooler that does not keep sessions (e.g. pgbouncer in transaction mode).
+PREPARED_STATEMENTS = os.getenv("PREPARED_STATEMENTS", "true").lower() == "true"
+
+# Statements psycopg may keep prepared on a connection on top of the registered ones
+EXTRA_PREPARED_MAX = 100
+
+# Counted from the registry's own bookkeeping: 'after_warmup' when the statement was already sent to the
+# connection (by prepare_statements or an earlier execution), 'first' otherwise. PostgreSQL and psycopg are not
+# asked, so these are not plan-cache hits.
+statement_executions = CounterMetric('covid_api_registered_statement_executions_total',
+                                     'Executions of registered statements, after_warmup when the registry had already sent it to the connection',
+                                     ['connection'])
+
+_statements = {}
+_prepared = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+"""
+    Registers a statement to prepare on every pooled connection.
+
+    :param name: Unique name of the statement, for stats and errors.
+    :param query: The SQL text. Executions match the registry on this exact text.
+    :param params: Parameters to prepare the statement with, of the same types as the real ones
+                   (psycopg keys its prepared statements on the text and the parameter types).
+    :param relation: Relation the statement reads, it is only prepared if the relation exists.
+"""
+def register_statement(name: str, query: str, params: Tuple, relation: Optional[str] = None):
+    _statements[query] = (name, params, relation)
+
+def registered_statements() -> dict:
+    return {name: query for query, (name, _, _) in _statements.items()}
+
+"""
+    Decides how psycopg executes a query on a connection and counts the executions of registered statements.
+
+    :return: The prepare argument of cursor.execute: True for registered statements, None (psycopg's
+             default, prepare after a few executions) for everything else.
+"""
+def prepare_flag(connection, query: str) -> Optional[bool]:
+    if not PREPARED_STATEMENTS or query not in _statements:
+        return None
+
+    with _lock:
+        prepared = _prepared.setdefault(connection, set())
+        sent = query in prepared
+        prepared.add(query)
+
+    statement_executions.inc(('after_warmup' if sent else 'first',))
+    return True
+
+def statements_to_prepare(existing_relations: set) -> list:
+    return [(query, params) for query, (_, params, relation) in _statements.items() if relation is None or relation in existing_relations]
+
+def relations_query() -> Tuple[str, Tuple]:
+    relations = sorted({relation for _, _, relation in _statements.values() if relation is not None})
+    return "SELECT relname FROM pg_class WHERE relname = ANY(%s);", (relations,)
+
+def mark_prepared(connection, queries: list):
+    with _lock:
+        _prepared.setdefault(connection, set()).update(queries)
+
+"""
+    Pool configure callback: prepares every registered statement on a new connection, in one pipeline.
+"""
+def prepare_statements(connection):
+    if not PREPARED_STATEMENTS or not _statements:
+        return
+
+    connection.prepared_max = len(_statements) + EXTRA_PREPARED_MAX
+    existing = {row[0] for row in connection.execute(*relations_query()).fetchall()}
+    statements = statements_to_prepare(existing)
+
+    try:
+        with connection.pipeline():
+            for query, params in statements:
+                connection.execute(query, params, prepare=True)
+        connection.commit()
+    except Exception as e:
+        # Leave them to be prepared on first use, a failing statement will fail the request instead
+        print(f"Error preparing statements: {e}")
+        connection.rollback()
+        return
+    mark_prepared(connection, [query for query, _ in statements])
+
+"""
+    Async pool configure callback, see prepare_statements.
+"""
+async def prepare_statements_async(connection):
+    if not PREPARED_STATEMENTS or not _statements:
+        return
+
+    connection.prepared_max = len(_statements) + EXTRA_PREPARED_MAX
+    cursor = await connection.execute(*relations_query())
+    existing = {row[0] for row in await cursor.fetchall()}
+    statements = statements_to_prepare(existing)
+
+    try:
+        async with connection.pipeline():
+            for query, params in statements:
+                await connection.execute(query, params, prepare=True)
+        await connection.commit()
+    except Exception as e:
+        print(f"Error preparing statements: {e}")
+        await connection.rollback()
+        return
+    mark_prepared(connection, [query for query, _ in statements])
+
+"""
+    Reports the statement registry usage.
+
+    :return: A dict with the number of registered statements, connections they were sent to, and the
+             executions of registered statements on a connection that already had them (after warm-up)
+             or not. Both come from the registry, not from the server's plan cache.
+"""
+def get_statement_stats() -> dict:
+    with _lock:
+        connections = len(_prepared)
+
+    return {
+        "enabled": PREPARED_STATEMENTS,
+        "registered": len(_statements),
+        "connections": connections,
+        "executions_after_warmup": statement_executions.value(('after_warmup',)),
+        "first_executions": statement_executions.value(('first',))
+    }
@@ -0,0 +1,79 @@
+"""
+    Production server settings, picked up automatically by gunicorn when started from the Backend directory:
+        gunicorn app:app
+
+    The app is imported once in the master and N workers are pre-forked from it. Optional cache warm-up
+    runs in the master before the socket is bound and the workers are forked, so no request reaches a cold
+    worker: every worker starts with the country list and the common series (or the whole in-memory store)
+    already loaded and shared copy-on-write. Until the warm-up is done the port refuses connections. With a MEMORY_SNAPSHOT file the
+    in-memory store is mapped instead, workers share its page cache pages even after they map a rebuilt file.
+
+    Every worker has its own connection pool plus the connection of the invalidation listener. Unless
+    WEB_CONCURRENCY is set, the number of workers (2 per CPU plus 1) is capped so that every worker gets one
+    pooled connection per thread and all of them stay within DATABASE_MAX_CONNECTIONS (default 90, PostgreSQL
+    allows 100 by default). Worker and pool sizes that do not fit stop gunicorn before it starts.
+
+    Signals:
+        - HUP: graceful reload, re-warms the caches in the master then replaces the workers one by one
+        - USR2 then QUIT on the old master: zero-downtime upgrade to new code
+        - TERM: graceful shutdown
+"""
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = os.getenv("BIND", "127.0.0.1:5000")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+# Connections the workers may open together, leave room for the ingest tools and psql
+max_connections = int(os.getenv("DATABASE_MAX_CONNECTIONS", "90"))
+# A worker needs a connection per thread and one for the invalidation listener
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(1, min(multiprocessing.cpu_count() * 2 + 1, max_connections // (threads + 1))))))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# Read by db.init_db_pool in every worker, fewer connections than threads only with an explicit WEB_CONCURRENCY
+os.environ.setdefault("DATABASE_POOL_MAX_SIZE", str(min(threads, max_connections // workers - 1)))
+pool_size = int(os.environ["DATABASE_POOL_MAX_SIZE"])
+if pool_size < 1 or workers * (pool_size + 1) > max_connections:
+    raise RuntimeError(f"{workers} workers with {pool_size} pooled connections each (plus a listener) do not fit in "
+                       f"DATABASE_MAX_CONNECTIONS={max_connections}, lower WEB_CONCURRENCY or DATABASE_POOL_MAX_SIZE")
+
+warmup = os.getenv("WARMUP", "true").lower() == "true"
+
+def _warm(server):
+    from Cache import invalidate_series_cache
+    from Cache.warmup import warm_caches
+    from db import close_db_pool
+    from db.async_queries import close_async_db_pool
+
+    invalidate_series_cache()
+    try:
+        warm_caches()
+    except Exception as e:
+        server.log.warning(f"Cache warm-up failed: {e}")
+    finally:
+        # Connections and the async loop thread must not be inherited by the forked workers
+        close_db_pool()
+        close_async_db_pool()
+
+def on_starting(server):
+    if warmup:
+        _warm(server)
+
+def on_reload(server):
+    if warmup:
+        _warm(server)
+
+def post_fork(server, worker):
+    from Cache.invalidation import start_invalidation_listener
+    from db import init_db_pool
+
+    init_db_pool()
+    start_invalidation_listener()
@@ -0,0 +1,13 @@
+import psycopg
+import pytest
+from db import get_conninfo
+
+"""
+    Skips the test when the database configured in .env cannot be reached.
+"""
+@pytest.fixture(scope='session')
+def database():
+    try:
+        psycopg.connect(get_conninfo(), connect_timeout=3).close()
+    except psycopg.Error as e:
+        pytest.skip(f"Database not reachable: {e}")
@@ -0,0 +1,96 @@
+import pytest
+import Util.http_cache
+from Cache import response_cache
+
+ROWS = {
+    ('cases', None): {'Peru': [['2021-01-01', 1], ['2021-01-02', 2], ['2021-01-03', 3]], 'Chile': [['2021-01-02', 5]]},
+    ('testing', 't_ct_per_thousand'): {'Peru': [['2021-01-01', 'tests performed', 0.5]]},
+    ('hospitalizations', 'Daily ICU occupancy per million'): {}
+}
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+    requested = []
+
+    def get_series_windows(specs, countries, start_date, end_date):
+        requested.append(specs)
+        return {spec: {country: [list(row) for row in rows] for country, rows in ROWS[spec].items() if country in countries} for spec in specs}
+
+    monkeypatch.setattr(app, 'get_series_windows', get_series_windows)
+    monkeypatch.setattr(Util.http_cache, 'get_dataset_version', lambda: 'test')
+    response_cache.invalidate()
+    client = app.app.test_client()
+    client.requested = requested
+    return client
+
+SERIES = [{'category': 'cases'}, {'category': 'testing', 'metric': 't_ct_per_thousand'},
+          {'category': 'hospitalizations', 'indicator': 'Daily ICU occupancy', 'per_million': True}]
+
+def batch(client, **body):
+    return client.post('/api/batch', json={'series': SERIES, 'countries': ['Peru', 'Chile'], 'start': '2021-01-01', 'end': '2021-01-31', **body})
+
+def test_batch_is_keyed_by_spec(client):
+    response = batch(client)
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'cases': {'Peru': [['2021-01-01', 1], ['2021-01-02', 2], ['2021-01-03', 3]], 'Chile': [['2021-01-02', 5]]},
+        'testing:t_ct_per_thousand': {'Peru': [['2021-01-01', 'tests performed', 0.5]]},
+        'hospitalizations:Daily ICU occupancy per million': {}
+    }
+    assert client.requested == [[('cases', None), ('testing', 't_ct_per_thousand'), ('hospitalizations', 'Daily ICU occupancy per million')]]
+
+def test_batch_leaves_out_known_ranges(client):
+    response = batch(client, known={'Peru': [['2021-01-01', '2021-01-02']], 'Chile': [['2021-01-01', '2021-01-31']]})
+
+    assert response.get_json() == {'cases': {'Peru': [['2021-01-03', 3]]}, 'testing:t_ct_per_thousand': {},
+                                   'hospitalizations:Daily ICU occupancy per million': {}}
+
+def test_batch_with_nothing_new_is_empty_rather_than_an_error(client):
+    response = batch(client, known={'Peru': [['2021-01-01', '2021-01-31']], 'Chile': [['2021-01-01', '2021-01-31']]})
+
+    assert response.status_code == 200
+    assert all(series == {} for series in response.get_json().values())
+
+def test_batch_downsamples_each_series(client):
+    response = batch(client, series=[{'category': 'cases'}], countries=['Peru'], resolution='month')
+
+    assert response.get_json() == {'cases': {'Peru': [['2021-01-01', 2.0]]}}
+
+def test_batch_without_rows(client):
+    response = batch(client, series=[SERIES[2]])
+
+    assert response.status_code == 420
+
+@pytest.mark.parametrize('body, message', [
+    ({'stream': True}, "Unknown parameters: stream"),
+    ({'countries': []}, "At least 1 country must be provided"),
+    ({'series': [{'category': 'cases'}] * 21}, "Between 1 and 20 specs"),
+    ({'series': ['cases']}, "Each series spec must be a JSON object"),
+    ({'end': 20210131}, "Dates must be of the form YYYY-MM-DD"),
+    ({'max_points': 2}, "max_points must be an integer of at least 3"),
+    ({'known': {'Peru': [['2021-01-31', '2021-01-01']]}}, "known must map countries"),
+    ({'known': {'Peru': []}, 'max_points': 10}, "known requires resolution day without max_points")
+])
+def test_batch_rejects(client, body, message):
+    response = batch(client, **body)
+
+    assert response.status_code == 400
+    assert message in response.get_json()['error']
+    assert client.requested == []
+
+def test_batch_rejects_non_object_bodies(client):
+    assert client.post('/api/batch', json=['cases']).status_code == 400
+
+def test_unexpected_errors_are_json_500s(client, monkeypatch):
+    import app
+
+    def fail():
+        raise RuntimeError("Could not load the country catalogue")
+
+    monkeypatch.setattr(app.country_catalogue, 'load', fail)
+    response = client.get('/api/countries?prefix=Pe')
+
+    assert response.status_code == 500
+    assert response.get_json() == {'error': "Could not load the country catalogue"}
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+from db.async_queries import (await_async, close_async_db_pool, execute_queries_concurrently, execute_query_async,
+                              get_async_pool_stats, run_async)
+
+@pytest.fixture
+def async_pool(database, monkeypatch):
+    monkeypatch.setenv('DATABASE_POOL_MIN_SIZE', '1')
+    monkeypatch.setenv('DATABASE_POOL_MAX_SIZE', '3')
+    yield
+    close_async_db_pool()
+
+async def double(value):
+    await asyncio.sleep(0)
+    return value * 2
+
+def test_coroutines_run_on_the_database_loop_from_sync_and_async_callers():
+    try:
+        assert run_async(double(2)) == 4
+        assert asyncio.run(await_async(double(3))) == 6
+    finally:
+        close_async_db_pool()
+
+def test_concurrent_queries_keep_their_order(async_pool):
+    rows = execute_queries_concurrently([("SELECT %s::int;", (value,)) for value in range(6)])
+
+    assert rows == [[(value,)] for value in range(6)]
+    stats = get_async_pool_stats()
+    assert stats['pool_open'] and 1 <= stats['pool_size'] <= 3
+
+def test_one_failed_query_fails_the_group(async_pool):
+    assert execute_queries_concurrently([("SELECT 1;", None), ("SELECT * FROM no_such_table;", None)]) is None
+
+def test_queries_can_be_awaited_from_another_loop(async_pool):
+    assert asyncio.run(execute_query_async("SELECT 1;", fetch_results=True)) == [(1,)]
+
+def test_stats_before_the_pool_is_opened():
+    close_async_db_pool()
+
+    assert get_async_pool_stats() == {'pool_open': False}
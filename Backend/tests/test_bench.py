@@ -0,0 +1,38 @@
+from bench.load import percentile
+from bench.run import compare
+
+def route(p50, throughput=100.0, errors=0):
+    return {'p50_ms': p50, 'p95_ms': p50 * 2, 'p99_ms': p50 * 3, 'throughput': throughput, 'errors': errors}
+
+def regressions(rows):
+    return [(name, measure) for name, measure, _, _, _, regressed in rows if regressed]
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+
+    assert [percentile(values, fraction) for fraction in [0.5, 0.95, 0.99, 1.0]] == [50, 95, 99, 100]
+    assert percentile([7], 0.99) == 7
+    assert percentile([], 0.5) == 0.0
+
+def test_unchanged_baseline_has_no_regression():
+    baseline = {'routes': {'cases': route(10.0)}, 'peak_rss_mb': 200}
+
+    assert regressions(compare(baseline, baseline, 0.10, 1.0)) == []
+
+def test_slower_route_regresses():
+    reference = {'routes': {'cases': route(10.0), 'deaths': route(10.0)}}
+    candidate = {'routes': {'cases': route(12.0), 'deaths': route(10.5)}}
+
+    assert regressions(compare(reference, candidate, 0.10, 1.0)) == [('cases', 'p50_ms'), ('cases', 'p95_ms'), ('cases', 'p99_ms')]
+
+def test_small_latency_changes_are_noise():
+    reference = {'routes': {'cases': route(1.0)}}
+    candidate = {'routes': {'cases': route(1.3)}}
+
+    assert regressions(compare(reference, candidate, 0.10, 1.0)) == []
+
+def test_throughput_errors_and_memory_regress():
+    reference = {'routes': {'cases': route(10.0, 100.0, 0)}, 'peak_rss_mb': 200}
+    candidate = {'routes': {'cases': route(10.0, 80.0, 3), 'ranking': route(50.0)}, 'peak_rss_mb': 260}
+
+    assert regressions(compare(reference, candidate, 0.10, 1.0)) == [('cases', 'throughput'), ('cases', 'errors'), ('server', 'peak_rss_mb')]
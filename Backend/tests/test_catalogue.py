@@ -0,0 +1,45 @@
+import pytest
+import Engine.catalogue
+from Engine.catalogue import CountryCatalogue
+
+LOCATIONS = [('Algeria', 'DZA'), ('Democratic Republic of Congo', 'COD'), ('Denmark', 'DNK'), ('Germany', 'DEU'),
+             ('Dominica', 'DMA'), ('Europe', 'OWID_EUR'), ('World', 'OWID_WRL'), ('United Kingdom', 'GBR'),
+             ('United States', 'USA'), ('Uganda', 'UGA')]
+
+@pytest.fixture
+def catalogue(monkeypatch):
+    monkeypatch.setattr(Engine.catalogue, 'execute_query', lambda query, params, fetch_results: list(LOCATIONS))
+    return CountryCatalogue()
+
+def names(results: list) -> list:
+    return [result['name'] for result in results]
+
+def test_key_matches_compete_on_name_order(catalogue):
+    assert names(catalogue.search('D', 1)) == ['Algeria']
+    assert names(catalogue.search('d', 4)) == ['Algeria', 'Democratic Republic of Congo', 'Denmark', 'Dominica']
+
+def test_name_and_key_matches_are_merged(catalogue):
+    assert names(catalogue.search('u', 10)) == ['Uganda', 'United Kingdom', 'United States']
+    assert names(catalogue.search('de', 10)) == ['Democratic Republic of Congo', 'Denmark', 'Germany']
+
+def test_empty_prefix_lists_every_location_in_name_order(catalogue):
+    assert names(catalogue.search('', 3)) == ['Algeria', 'Democratic Republic of Congo', 'Denmark']
+    assert len(catalogue.search('', 100)) == len(LOCATIONS)
+
+def test_aggregates_are_flagged(catalogue):
+    assert catalogue.search('owid_w', 5) == [{"name": "World", "key": "OWID_WRL", "aggregate": True}]
+
+def test_lookups(catalogue):
+    assert catalogue.nationkeys(['Denmark', 'Atlantis', 'Uganda']) == ['DNK', 'UGA']
+    assert catalogue.name_of('GBR') == 'United Kingdom'
+    assert catalogue.nationkey('Atlantis') is None
+
+def test_table_names_resolve_to_their_nationkey(monkeypatch):
+    table_names = [('United States of America', 'USA'), ('Denmark', 'DNK'), ('Germany', 'DNK'), (None, 'UGA')]
+    monkeypatch.setattr(Engine.catalogue, 'execute_query',
+                        lambda query, params, fetch_results: list(table_names if query == Engine.catalogue.TABLE_NAMES_QUERY else LOCATIONS))
+    catalogue = CountryCatalogue()
+
+    assert [catalogue.resolve(name) for name in ['United States of America', 'United States', 'Germany', 'Atlantis']] == ['USA', 'USA', 'DEU', None]
+    assert catalogue.nationkey('United States of America') is None
+    assert 'United States of America' not in names(catalogue.search('u', 10))
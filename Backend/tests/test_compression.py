@@ -0,0 +1,71 @@
+import gzip
+import zlib
+import pytest
+from flask import Flask, Response, jsonify
+import Util.http_cache
+from Cache import response_cache
+from Util.compression import register_compression, COMPRESSION_MIN_SIZE
+from Util.http_cache import register_http_caching
+
+ROWS = [[f"2021-01-{day:02d}", day * 1000] for day in range(1, 32)] * 4
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Util.http_cache, 'get_dataset_version', lambda: 'v1')
+    response_cache.invalidate()
+
+    app = Flask(__name__)
+    register_http_caching(app)
+    register_compression(app)
+    calls = []
+
+    @app.route('/api/cases-by-country')
+    def cases():
+        calls.append(1)
+        return jsonify(ROWS)
+
+    @app.route('/api/deaths-by-country')
+    def deaths():
+        return jsonify(ROWS[:1])
+
+    @app.route('/api/compare-cases-by-country')
+    def compare():
+        return Response(iter(['{"Albania":', '[1,2,3]', '}']), mimetype='application/json')
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+def test_large_json_is_gzipped(client):
+    response = client.get('/api/cases-by-country', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == client.get('/api/cases-by-country').get_data()
+    assert response.headers['ETag'].endswith('-gzip"')
+
+def test_small_responses_and_clients_without_gzip_are_not_compressed(client):
+    assert len(client.get('/api/deaths-by-country').get_data()) < COMPRESSION_MIN_SIZE
+    assert 'Content-Encoding' not in client.get('/api/deaths-by-country', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in client.get('/api/cases-by-country', headers={'Accept-Encoding': 'identity'}).headers
+
+def test_compressed_responses_are_served_from_the_cache(client):
+    first = client.get('/api/cases-by-country', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/api/cases-by-country', headers={'Accept-Encoding': 'gzip'})
+
+    assert len(client.calls) == 1
+    assert second.get_data() == first.get_data()
+    assert second.headers['Content-Encoding'] == 'gzip'
+
+def test_streamed_responses_are_compressed_chunk_by_chunk(client):
+    response = client.get('/api/compare-cases-by-country', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert zlib.decompress(response.get_data(), 31) == b'{"Albania":[1,2,3]}'
+
+def test_brotli_is_preferred(client):
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/api/cases-by-country', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.get_data()) == client.get('/api/cases-by-country').get_data()
@@ -0,0 +1,29 @@
+import pytest
+import Cache.dataset_version
+from Cache.dataset_version import DATASET_VERSION_QUERY, get_dataset_version, reset_dataset_version
+from db.facts import FACT_VIEWS
+
+def test_every_facts_view_is_part_of_the_version():
+    for view in FACT_VIEWS:
+        assert f"'{view}'" in DATASET_VERSION_QUERY
+
+def test_refreshed_latest_facts_changes_the_version(database, monkeypatch):
+    from db import get_db_connection
+    monkeypatch.delenv('DATASET_VERSION', raising=False)
+    monkeypatch.setattr(Cache.dataset_version, '_version', None)
+    before = get_dataset_version()
+
+    connection = get_db_connection()
+    try:
+        if connection.execute("SELECT to_regclass('latest_facts');").fetchone()[0] is None:
+            pytest.skip("latest_facts does not exist")
+        connection.execute("REFRESH MATERIALIZED VIEW latest_facts;")
+        connection.commit()
+        # Reports the counters of the refresh before the session goes idle, instead of within a second
+        connection.execute("SELECT pg_stat_force_next_flush();")
+        connection.commit()
+    finally:
+        connection.close()
+
+    reset_dataset_version()
+    assert get_dataset_version() != before
@@ -0,0 +1,49 @@
+import pytest
+from Util.downsample import bucket_rows, downsample_rows, lttb_rows
+
+DAYS = [f"2021-01-{day:02d}" for day in range(1, 32)]
+
+def test_week_buckets_start_on_monday():
+    rows = [[day, f"note {i}", value] for i, (day, value) in enumerate(zip(DAYS[2:9], [1, 2, None, 4, 5, 6, 7]))]
+
+    # 2021-01-03 is a Sunday, the rest of the rows fall in the week of Monday 2021-01-04
+    assert bucket_rows(rows, 'week') == [['2020-12-28', 'note 0', 1.0], ['2021-01-04', 'note 6', 4.8]]
+
+def test_month_buckets_average_non_null_values():
+    rows = [['2021-01-30', 1], ['2021-01-31', 3], ['2021-02-01', None], ['2021-02-02', None], ['2021-03-15', 7]]
+
+    assert bucket_rows(rows, 'month') == [['2021-01-01', 2.0], ['2021-02-01', None], ['2021-03-01', 7.0]]
+
+def test_lttb_keeps_first_last_and_peaks():
+    rows = [[day, float(i)] for i, day in enumerate(DAYS)]
+    rows[10][1] = 100.0
+    rows[20][1] = -100.0
+
+    kept = lttb_rows(rows, 6)
+
+    assert len(kept) == 6
+    assert kept[0] is rows[0] and kept[-1] is rows[-1]
+    assert rows[10] in kept and rows[20] in kept
+    assert [row[0] for row in kept] == sorted(row[0] for row in kept)
+
+def test_lttb_drops_null_values():
+    rows = [[day, None if i % 2 else i] for i, day in enumerate(DAYS[:6])]
+
+    assert lttb_rows(rows, 5) == [['2021-01-01', 0], ['2021-01-03', 2], ['2021-01-05', 4]]
+
+@pytest.mark.parametrize('resolution, max_points', [(None, None), ('day', None), ('day', 31), (None, 100)])
+def test_downsample_leaves_series_unchanged(resolution, max_points):
+    rows = [[day, i] for i, day in enumerate(DAYS)]
+
+    assert downsample_rows(rows, resolution, max_points) is rows
+
+def test_downsample_buckets_before_lttb():
+    rows = [[day, i] for i, day in enumerate(DAYS)]
+
+    weeks = downsample_rows(rows, 'week')
+    assert [row[0] for row in weeks] == ['2020-12-28', '2021-01-04', '2021-01-11', '2021-01-18', '2021-01-25']
+    assert downsample_rows(rows, 'week', 3) == lttb_rows(weeks, 3)
+
+def test_downsample_empty_series():
+    assert downsample_rows([], 'month', 3) == []
+    assert downsample_rows(None, 'week') is None
@@ -0,0 +1,64 @@
+import json
+from decimal import Decimal
+import pytest
+import db.series
+from db.series import group_series_rows, slice_series
+from Engine.memory_store import MemoryStore, TABLES
+from tests.test_memory_store import FIXTURE_ROWS
+
+SPECS = [('cases', None), ('testing', 't_ct_per_thousand'), ('testing', 't_short_term_tests_per_case'),
+         ('hospitalizations', 'Daily ICU occupancy'), ('vaccinations', 'v_total_vaccinations'),
+         ('vaccinations', 'v_total_boosters_per_hundred')]
+COUNTRIES = ['Canada', 'Peru', 'Atlantis']
+WINDOWS = [('2020-01-01', '2024-12-31'), ('2021-01-02', '2021-01-03'), ('2021-01-05', '2021-01-31'), ('2021-02-02', '2021-02-30')]
+
+"""
+    Builds the rows the series query of a spec returns for the fixture: country, formatted date, then
+    the endpoint row after the date.
+"""
+def sql_rows(category: str, variant: str) -> list:
+    columns = TABLES[category]['columns']
+    rows = []
+
+    for country, group, day, label, *values in FIXTURE_ROWS[category]:
+        if category == 'hospitalizations' and group != variant:
+            continue
+        value = values[0] if category in ('cases', 'deaths', 'hospitalizations') else values[columns.index(variant)]
+        extra = [label] if category == 'testing' else [group] if category == 'hospitalizations' else []
+        rows.append((country, day.isoformat(), *extra, value))
+
+    return rows
+
+@pytest.mark.parametrize('category,variant', SPECS)
+def test_memory_engine_matches_sql_path(category, variant):
+    store = MemoryStore()
+    store.frames = store._build_frames(category, TABLES[category], FIXTURE_ROWS[category])
+    store.loaded = True
+    series = group_series_rows(sql_rows(category, variant), COUNTRIES)
+
+    for start_date, end_date in WINDOWS:
+        expected = {country: rows for country in COUNTRIES if (rows := slice_series(series[country], start_date, end_date))}
+        actual = store.get_series_window(category, COUNTRIES, start_date, end_date, variant)
+        # Compared as JSON, 12 and 12.0 are different responses
+        assert json.dumps(actual) == json.dumps(expected)
+
+def test_numeric_values_are_json_numbers():
+    assert group_series_rows([('Peru', '2021-02-01', Decimal('0.03'))], ['Peru']) == {'Peru': (['2021-02-01'], [['2021-02-01', 0.03]])}
+
+"""
+    Runs Engine.consistency against the configured database: every series route through both engines.
+"""
+def test_engines_agree_on_database(database):
+    from db.queries import execute_query
+    from Engine.consistency import build_requests, run
+    from Engine.memory_store import memory_store
+
+    countries = [row[0] for row in execute_query('SELECT l_nationname FROM location ORDER BY l_nationname LIMIT 3;', None, True)]
+    requests = build_requests(countries, '2020-01-01', '2024-12-31')
+    engine = db.series.QUERY_ENGINE
+
+    try:
+        memory_store.load()
+        assert run(requests, 'memory') == run(requests, 'postgres')
+    finally:
+        db.series.QUERY_ENGINE = engine
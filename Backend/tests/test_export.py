@@ -0,0 +1,35 @@
+import pytest
+import db.export
+from db.export import EXPORT_TABLES, export_columns, export_query
+
+@pytest.fixture(autouse=True)
+def nationkeys(monkeypatch):
+    monkeypatch.setattr(db.export.country_catalogue, 'nationkeys', lambda countries: ['PER'] if 'Peru' in countries else [])
+
+def test_window_of_some_countries():
+    assert export_query('cases', ['Peru'], '2021-01-01', '2021-01-31') == (
+        "SELECT l_nationname, c_nationkey, c_date, c_cases FROM cases JOIN location ON l_nationkey = c_nationkey"
+        " WHERE c_nationkey = ANY(%s) AND c_date BETWEEN %s AND %s ORDER BY c_nationkey, c_date",
+        (['PER'], '2021-01-01', '2021-01-31'))
+
+def test_location_ignores_the_window():
+    query, params = export_query('location', ['Peru'], '2021-01-01', '2021-01-31')
+
+    assert 'JOIN' not in query and 'BETWEEN' not in query
+    assert params == (['PER'],)
+
+def test_tables_holding_their_own_name_are_not_joined():
+    query, params = export_query('hospitalizations')
+
+    assert query.startswith("SELECT h_nationname, h_nationkey") and 'JOIN' not in query and 'WHERE' not in query
+    assert params == ()
+
+def test_numeric_columns_are_cast_for_parquet():
+    query, _ = export_query('testing', numeric_as_double=True)
+
+    assert "t_cumulative_total::DOUBLE PRECISION AS t_cumulative_total" in query
+    assert "t_entity::" not in query and "t_date::" not in query
+
+@pytest.mark.parametrize('table', EXPORT_TABLES)
+def test_every_export_starts_with_the_country_name(table):
+    assert export_columns(table)[0][0].endswith('_nationname')
@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+import msgpack
+import pytest
+from flask import Flask
+from Util.formats import columnar_series, format_response, response_formats, to_arrow
+
+@pytest.fixture
+def client_app():
+    return Flask(__name__)
+
+"""
+    Expands a columnar series back into rows the way Frontend/app.js (expandColumnarSeries) does:
+    nulls of the start and step form are skipped, the date still advancing.
+"""
+def expand(series: dict) -> list:
+    rows = []
+    for index, value in enumerate(series['values']):
+        if 'dates' not in series and value is None:
+            continue
+        if 'dates' in series:
+            day = series['dates'][index]
+        elif series['step'] == 'month':
+            start = date.fromisoformat(series['start'])
+            months = start.month - 1 + index
+            day = start.replace(year=start.year + months // 12, month=months % 12 + 1).isoformat()
+        else:
+            day = (date.fromisoformat(series['start']) + timedelta(days=index * (7 if series['step'] == 'week' else 1))).isoformat()
+        label = [series['label']] if 'label' in series else [series['labels'][index]] if 'labels' in series else []
+        rows.append([day, *label, value])
+    return rows
+
+SERIES = {
+    'contiguous': ([['2021-01-01', 1], ['2021-01-02', 2], ['2021-01-03', 3]], 'day'),
+    'gaps': ([['2021-01-01', 1], ['2021-01-03', 3], ['2021-01-04', 4]], 'day'),
+    'null values': ([['2021-01-01', 1], ['2021-01-02', None], ['2021-01-04', 4]], 'day'),
+    'sparse': ([['2021-01-01', 1], ['2021-03-01', 2]], 'day'),
+    'constant label': ([['2021-01-01', 'Daily ICU occupancy', 8.5], ['2021-01-03', 'Daily ICU occupancy', 9.0]], 'day'),
+    'labels': ([['2021-01-01', 'tests performed', 0.1], ['2021-01-02', None, None], ['2021-01-03', 'people tested', 0.2]], 'day'),
+    'weeks': ([['2021-01-04', 1.5], ['2021-01-18', 2.5]], 'week'),
+    'months': ([['2020-11-01', 1.0], ['2021-01-01', 3.0], ['2021-02-01', 4.0]], 'month'),
+    'empty': ([], 'day')
+}
+
+@pytest.mark.parametrize('name', SERIES)
+def test_columnar_round_trip(name):
+    rows, resolution = SERIES[name]
+    assert expand(columnar_series(rows, resolution)) == rows
+
+def test_null_values_are_sent_with_dates():
+    series = columnar_series(SERIES['null values'][0])
+    assert series['dates'] == ['2021-01-01', '2021-01-02', '2021-01-04']
+    assert 'start' not in series
+
+def test_gaps_are_filled():
+    assert columnar_series(SERIES['gaps'][0]) == {'start': '2021-01-01', 'step': 'day', 'values': [1, None, 3, 4]}
+
+def test_msgpack_packs_integral_floats(client_app):
+    with client_app.app_context():
+        response = format_response({'Peru': [['2021-01-01', 2.0], ['2021-01-02', 2.5]]}, 'msgpack')
+    assert msgpack.unpackb(response.get_data()) == {'Peru': {'start': '2021-01-01', 'step': 'day', 'values': [2, 2.5]}}
+
+def test_arrow_table_of_a_batch():
+    pytest.importorskip('pyarrow')
+    table = to_arrow({'cases': {'Peru': [['2021-01-01', 1]]},
+                      'testing:t_ct_per_thousand': {'Peru': [['2021-01-01', 'tests performed', 0.5], ['2021-01-02', None, None]]}})
+    assert table.column_names == ['series', 'country', 'date', 'label', 'value']
+    assert table.to_pylist()[1] == {'series': 'testing:t_ct_per_thousand', 'country': 'Peru', 'date': date(2021, 1, 1),
+                                    'label': 'tests performed', 'value': 0.5}
+    assert table.column('value').to_pylist() == [1.0, 0.5, None]
+
+def test_arrow_response_is_an_ipc_stream(client_app):
+    pyarrow = pytest.importorskip('pyarrow')
+    assert 'arrow' in response_formats()
+    with client_app.app_context():
+        response = format_response([['2021-01-01', 1], ['2021-01-02', 2]], 'arrow')
+    table = pyarrow.ipc.open_stream(response.get_data()).read_all()
+    assert table.column_names == ['date', 'label', 'value']
+    assert table.num_rows == 2
@@ -0,0 +1,46 @@
+import importlib.util
+import multiprocessing
+import os
+import pytest
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+
+"""
+    Loads gunicorn.conf.py the way gunicorn does, with the given environment and number of CPUs.
+"""
+@pytest.fixture
+def load_config(monkeypatch):
+    def load(cpus=4, **env):
+        # The config sets DATABASE_POOL_MAX_SIZE itself, setting first restores it after the test
+        for name in ('WEB_CONCURRENCY', 'GUNICORN_THREADS', 'DATABASE_MAX_CONNECTIONS', 'DATABASE_POOL_MAX_SIZE'):
+            monkeypatch.setenv(name, '')
+            monkeypatch.delenv(name)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setattr(multiprocessing, 'cpu_count', lambda: cpus)
+        spec = importlib.util.spec_from_file_location('gunicorn_conf', CONFIG)
+        config = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(config)
+        return config
+    return load
+
+def test_default_workers_get_a_connection_per_thread(load_config):
+    config = load_config(cpus=4)
+
+    assert (config.workers, config.threads, config.pool_size) == (9, 4, 4)
+
+def test_default_workers_are_capped_by_the_connection_budget(load_config):
+    config = load_config(cpus=32)
+
+    assert (config.workers, config.pool_size) == (18, 4)
+    assert config.workers * (config.pool_size + 1) <= config.max_connections
+
+def test_explicit_workers_shrink_the_pools_to_fit(load_config):
+    config = load_config(WEB_CONCURRENCY='30')
+
+    assert (config.workers, config.pool_size) == (30, 2)
+
+@pytest.mark.parametrize('env', [{'WEB_CONCURRENCY': '60'}, {'WEB_CONCURRENCY': '20', 'DATABASE_POOL_MAX_SIZE': '8'}])
+def test_pools_that_do_not_fit_stop_gunicorn(load_config, env):
+    with pytest.raises(RuntimeError, match='DATABASE_MAX_CONNECTIONS=90'):
+        load_config(**env)
@@ -0,0 +1,47 @@
+import pytest
+from flask import Flask, jsonify
+import Util.http_cache
+from Util.http_cache import register_http_caching, encoded_etag
+
+@pytest.fixture
+def client(monkeypatch):
+    version = {'current': 'v1'}
+    monkeypatch.setattr(Util.http_cache, 'get_dataset_version', lambda: version['current'])
+
+    app = Flask(__name__)
+    register_http_caching(app)
+
+    @app.route('/api/cases-by-country')
+    def cases():
+        return jsonify([["2021-01-01", 1]])
+
+    client = app.test_client()
+    client.version = version
+    return client
+
+def test_equivalent_urls_share_an_etag(client):
+    first = client.get('/api/cases-by-country?country=Peru&start=2021-01-01')
+    second = client.get('/api/cases-by-country?start=2021-01-01&country=Peru')
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.headers['X-Dataset-Version'] == 'v1'
+
+def test_matching_etag_is_answered_with_304(client):
+    etag = client.get('/api/cases-by-country?country=Peru').headers['ETag']
+    assert client.get('/api/cases-by-country?country=Peru', headers={'If-None-Match': etag}).status_code == 304
+
+    gzip_etag = encoded_etag(etag, 'gzip')
+    response = client.get('/api/cases-by-country?country=Peru', headers={'If-None-Match': f'W/{gzip_etag}'})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == gzip_etag
+
+def test_new_dataset_version_changes_the_etag(client):
+    etag = client.get('/api/cases-by-country?country=Peru').headers['ETag']
+    client.version['current'] = 'v2'
+    response = client.get('/api/cases-by-country?country=Peru', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_only_the_etag_validates(client):
+    response = client.get('/api/cases-by-country?country=Peru', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
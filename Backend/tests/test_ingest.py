@@ -0,0 +1,178 @@
+from datetime import date
+import json
+import psycopg
+import pytest
+import db.ingest
+from db import get_conninfo
+from Cache.invalidation import INVALIDATION_CHANNEL
+from db.ingest import copy_to_temp_table, ingest, ingest_incremental, upsert_delta
+
+SCHEMA = 'ingest_test'
+
+def connect(**kwargs):
+    return psycopg.connect(get_conninfo(), options=f"-c search_path={SCHEMA}", **kwargs)
+
+"""
+    Live location and cases tables in a scratch schema. The loader connects with that schema on the
+    search path, so it never touches the real tables.
+"""
+@pytest.fixture
+def schema(database, monkeypatch):
+    with psycopg.connect(get_conninfo(), autocommit=True) as connection:
+        try:
+            connection.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+            connection.execute(f"CREATE SCHEMA {SCHEMA};")
+        except psycopg.errors.InsufficientPrivilege as e:
+            pytest.skip(f"Cannot create a scratch schema: {e}")
+
+    with connect(autocommit=True) as connection:
+        connection.execute("""CREATE TABLE location (l_nationname VARCHAR(100), l_nationkey VARCHAR(10) PRIMARY KEY, l_last_observation_date DATE,
+                                                     l_source_name VARCHAR(255), l_source_website VARCHAR(255));""")
+        connection.execute("INSERT INTO location (l_nationname, l_nationkey) VALUES ('Peru', 'PER'), ('Chile', 'CHL');")
+        connection.execute("""CREATE TABLE cases (c_nationkey VARCHAR(10) REFERENCES location(l_nationkey) ON DELETE CASCADE, c_date DATE,
+                                                  c_cases BIGINT, PRIMARY KEY (c_nationkey, c_date));""")
+        connection.execute("INSERT INTO cases VALUES ('PER', '2021-01-01', 1);")
+        connection.execute("CREATE INDEX cases_date_idx ON cases (c_date);")
+        connection.execute("CREATE VIEW cases_total AS SELECT c_nationkey, SUM(c_cases) AS total FROM cases GROUP BY c_nationkey;")
+
+    monkeypatch.setattr(db.ingest, 'get_db_connection', connect)
+    yield
+    with psycopg.connect(get_conninfo(), autocommit=True) as connection:
+        connection.execute(f"DROP SCHEMA {SCHEMA} CASCADE;")
+
+def write_cases(directory, rows):
+    (directory / 'cases.csv').write_text(''.join(f"{row}\n" for row in rows))
+    return str(directory)
+
+def test_swap_replaces_the_table_and_keeps_indexes_and_views(schema, tmp_path):
+    report = ingest(['cases'], write_cases(tmp_path, ['PER,2021-01-01,5', 'PER,2021-01-02,7', 'CHL,2021-01-01,3']), workers=1)
+
+    assert report['cases'][0] == 3
+    with connect() as connection:
+        assert connection.execute("SELECT * FROM cases ORDER BY c_nationkey, c_date;").fetchall() == [
+            ('CHL', date(2021, 1, 1), 3), ('PER', date(2021, 1, 1), 5), ('PER', date(2021, 1, 2), 7)
+        ]
+        assert connection.execute("SELECT * FROM cases_total ORDER BY c_nationkey;").fetchall() == [('CHL', 3), ('PER', 12)]
+        assert {row[0] for row in connection.execute("SELECT indexname FROM pg_indexes WHERE schemaname = %s AND tablename = 'cases';", (SCHEMA,))} == \
+               {'cases_pkey', 'cases_date_idx'}
+        assert connection.execute("SELECT COUNT(*) FROM pg_constraint WHERE conrelid = 'cases'::regclass AND contype = 'f';").fetchone()[0] == 1
+        assert connection.execute("SELECT to_regclass('cases_load'), to_regclass('cases_old');").fetchone() == (None, None)
+
+def test_failed_load_keeps_the_live_table(schema, tmp_path):
+    with pytest.raises(psycopg.Error):
+        ingest(['cases'], write_cases(tmp_path, ['PER,2021-01-01,5', 'PER,not a date,7']), workers=1)
+
+    with connect() as connection:
+        assert connection.execute("SELECT c_nationkey, c_cases FROM cases;").fetchall() == [('PER', 1)]
+
+"""
+    Reads the invalidation messages sent since the last call. The facts views are not refreshed, the
+    refreshes are recorded with the messages received by then.
+"""
+@pytest.fixture
+def listener(schema, monkeypatch):
+    with psycopg.connect(get_conninfo(), autocommit=True) as connection:
+        connection.execute(f"LISTEN {INVALIDATION_CHANNEL};")
+        received = lambda: [json.loads(notify.payload) for notify in connection.notifies(timeout=0.5)]
+        received.refreshes = []
+        monkeypatch.setattr(db.ingest, 'refresh_facts', lambda: received.refreshes.append(received()))
+        yield received
+
+def test_incremental_upserts_rows_after_each_watermark(listener, tmp_path):
+    rows = ['PER,2020-12-31,9', 'PER,2021-01-01,2', 'PER,2021-01-02,7', 'CHL,2021-01-01,3', 'XXX,2021-01-01,4']
+    changes = ingest_incremental(['cases'], write_cases(tmp_path, rows))
+
+    assert changes == {'cases': {'Peru': 1, 'Chile': 1}}
+    assert listener() == [{'category': 'cases', 'countries': ['Chile', 'Peru']}]
+    with connect() as connection:
+        assert connection.execute("SELECT c_nationkey, c_date, c_cases FROM cases ORDER BY c_nationkey, c_date;").fetchall() == [
+            ('CHL', date(2021, 1, 1), 3), ('PER', date(2021, 1, 1), 1), ('PER', date(2021, 1, 2), 7)
+        ]
+        assert connection.execute("SELECT l_nationkey, l_last_observation_date FROM location ORDER BY l_nationkey;").fetchall() == [
+            ('CHL', date(2021, 1, 1)), ('PER', date(2021, 1, 2))
+        ]
+
+def test_incremental_lookback_picks_up_revisions_only(listener, tmp_path):
+    changes = ingest_incremental(['cases'], write_cases(tmp_path, ['PER,2020-12-31,9', 'PER,2021-01-01,1']), lookback_days=1)
+
+    assert changes == {'cases': {}}
+    assert listener() == []
+
+    changes = ingest_incremental(['cases'], write_cases(tmp_path, ['PER,2021-01-01,2']), lookback_days=1)
+
+    assert changes == {'cases': {'Peru': 1}}
+    assert listener() == [{'category': 'cases', 'countries': ['Peru']}]
+
+def test_swap_tells_the_servers_to_drop_every_series(listener, tmp_path):
+    ingest(['cases'], write_cases(tmp_path, ['PER,2021-01-01,5']), workers=1)
+
+    assert listener() == [{'category': None}]
+
+def test_failed_load_sends_nothing(listener, tmp_path):
+    with pytest.raises(psycopg.Error):
+        ingest(['cases'], write_cases(tmp_path, ['PER,not a date,5']), workers=1)
+
+    assert listener() == []
+
+def test_incremental_notifies_after_the_facts_refresh(listener, tmp_path, monkeypatch):
+    ingest_incremental(['cases'], write_cases(tmp_path, ['PER,2021-01-02,7']))
+
+    assert listener.refreshes == [[]]
+    assert listener() == [{'category': 'cases', 'countries': ['Peru']}]
+
+    def fail():
+        raise psycopg.OperationalError("refresh failed")
+
+    monkeypatch.setattr(db.ingest, 'refresh_facts', fail)
+    with pytest.raises(psycopg.OperationalError):
+        ingest_incremental(['cases'], write_cases(tmp_path, ['PER,2021-01-03,8']))
+
+    assert listener() == [{'category': 'cases', 'countries': ['Peru']}]
+
+"""
+    Hospitalizations and vaccinations tables that name Peru differently from location, like the datasets do.
+    Peru's vaccinations are behind its l_last_observation_date.
+"""
+@pytest.fixture
+def named_tables(listener):
+    with connect(autocommit=True) as connection:
+        connection.execute("UPDATE location SET l_last_observation_date = '2021-01-05' WHERE l_nationkey = 'PER';")
+        connection.execute("""CREATE TABLE hospitalizations (h_nationname VARCHAR(100), h_nationkey VARCHAR(10) REFERENCES location(l_nationkey),
+                                                             h_date DATE, h_indicator VARCHAR(100), h_value NUMERIC,
+                                                             PRIMARY KEY (h_date, h_nationkey, h_indicator));""")
+        connection.execute("""CREATE TABLE vaccinations (v_nationname VARCHAR(100), v_nationkey VARCHAR(10) REFERENCES location(l_nationkey), v_date DATE,
+                                                         v_total_vaccinations BIGINT, v_people_fully_vaccinated BIGINT, v_total_boosters BIGINT,
+                                                         v_daily_vaccinations BIGINT, v_people_fully_vaccinated_per_hundred NUMERIC,
+                                                         v_total_boosters_per_hundred NUMERIC, PRIMARY KEY (v_nationkey, v_date));""")
+        connection.execute("INSERT INTO vaccinations (v_nationname, v_nationkey, v_date, v_total_vaccinations) VALUES ('Peru (PER)', 'PER', '2021-01-01', 10);")
+    return listener
+
+def write_csv(directory, name, header, rows):
+    (directory / name).write_text(''.join(f"{row}\n" for row in [header] + rows))
+    return str(directory)
+
+def test_upsert_delta_names_countries_after_their_own_table(named_tables, tmp_path):
+    data_dir = write_csv(tmp_path, 'hospitalizations.csv', 'entity,iso_code,date,indicator,value',
+                         ['Republic of Peru,PER,2021-01-02,Daily ICU occupancy,4', 'Republic of Peru,PER,2021-01-02,Daily hospital occupancy,9',
+                          'Chile,CHL,2021-01-02,Daily ICU occupancy,1'])
+
+    with connect() as connection:
+        copy_to_temp_table(connection, 'hospitalizations', data_dir)
+
+        assert upsert_delta(connection, 'hospitalizations', 0) == {'Republic of Peru': 2, 'Chile': 1}
+
+def test_upsert_delta_watermark_is_the_latest_date_of_the_table(named_tables, tmp_path):
+    data_dir = write_csv(tmp_path, 'vaccinations.csv', 'location,iso_code,date,total_vaccinations,people_fully_vaccinated,total_boosters,'
+                         'daily_vaccinations,people_fully_vaccinated_per_hundred,total_boosters_per_hundred',
+                         ['Peru (PER),PER,2021-01-01,11,,,,,', 'Peru (PER),PER,2021-01-03,30,,,,,', 'Peru (PER),PER,2021-01-07,70,,,,,'])
+
+    changes = ingest_incremental(['vaccinations'], data_dir)
+
+    # 2021-01-03 is behind l_last_observation_date but after the latest vaccination, 2021-01-01 is not
+    assert changes == {'vaccinations': {'Peru (PER)': 2}}
+    assert named_tables() == [{'category': 'vaccinations', 'countries': ['Peru (PER)']}]
+    with connect() as connection:
+        assert connection.execute("SELECT v_date, v_total_vaccinations FROM vaccinations ORDER BY v_date;").fetchall() == [
+            (date(2021, 1, 1), 10), (date(2021, 1, 3), 30), (date(2021, 1, 7), 70)
+        ]
+        assert connection.execute("SELECT l_last_observation_date FROM location WHERE l_nationkey = 'PER';").fetchone()[0] == date(2021, 1, 7)
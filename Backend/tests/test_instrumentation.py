@@ -0,0 +1,56 @@
+import time
+from flask import Flask, jsonify
+import Util.instrumentation
+from Util.instrumentation import CounterMetric, Histogram, escape_label, phase, register_instrumentation
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('api_seconds', 'Time', ['route'], buckets=[0.1, 1.0])
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(('/api/cases',), value)
+
+    assert histogram.render() == [
+        '# HELP api_seconds Time',
+        '# TYPE api_seconds histogram',
+        'api_seconds_bucket{route="/api/cases",le="0.1"} 2',
+        'api_seconds_bucket{route="/api/cases",le="1.0"} 3',
+        'api_seconds_bucket{route="/api/cases",le="+Inf"} 4',
+        'api_seconds_sum{route="/api/cases"} 2.65',
+        'api_seconds_count{route="/api/cases"} 4'
+    ]
+
+def test_counter(monkeypatch):
+    monkeypatch.setattr(Util.instrumentation, 'counters', [])
+    counter = CounterMetric('queries_total', 'Queries', ['result'])
+    counter.inc(('shared',))
+    counter.inc(('executed',), 2)
+
+    assert counter.value(('executed',)) == 2 and counter.value(('missing',)) == 0
+    assert counter.render()[2:] == ['queries_total{result="executed"} 2', 'queries_total{result="shared"} 1']
+    assert Util.instrumentation.counters == [counter]
+
+def test_escape_label():
+    assert escape_label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+def test_server_timing_lists_phases_in_order():
+    app = Flask(__name__)
+    register_instrumentation(app)
+
+    @app.route('/api/cases-by-country')
+    def cases():
+        with phase('serialize'):
+            body = jsonify([])
+        with phase('db_execute'):
+            time.sleep(0.001)
+        with phase('db_execute'):
+            pass
+        return body
+
+    header = app.test_client().get('/api/cases-by-country').headers['Server-Timing']
+    names = [part.split(';')[0] for part in header.split(', ')]
+
+    assert names == ['db_execute', 'serialize', 'total']
+    assert float(header.split(', ')[0].split('=')[1]) >= 1.0
+
+def test_phase_outside_a_request_is_ignored():
+    with phase('db_execute'):
+        pass
@@ -0,0 +1,107 @@
+import time
+import pytest
+import Cache
+from Cache import invalidate_series_cache, POPULATION_KEY
+from Cache.lru_cache import LRUCache, estimate_size
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=0)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_enforces_memory_cap():
+    cache = LRUCache(max_bytes=100, ttl=0)
+    cache.put('a', 'x', size=40)
+    cache.put('b', 'y', size=40)
+    cache.put('c', 'z', size=40)
+
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 80
+
+def test_skips_oversized_entries():
+    cache = LRUCache(max_bytes=100, ttl=0)
+    cache.put('a', 'x', size=40)
+    cache.put('b', 'y', size=101)
+
+    assert cache.get('a') == 'x' and cache.get('b') is None
+
+def test_replacing_an_entry_updates_its_size():
+    cache = LRUCache(ttl=0)
+    cache.put('a', 'x', size=40)
+    cache.put('a', 'y', size=10)
+
+    assert cache.get('a') == 'y'
+    assert cache.stats()['entries'] == 1 and cache.stats()['bytes'] == 10
+
+def test_entries_expire(clock):
+    cache = LRUCache(ttl=60)
+    cache.put('a', 1)
+
+    clock[0] += 59
+    assert cache.get('a') == 1
+
+    clock[0] += 2
+    assert cache.get('a', 'missing') == 'missing'
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+def test_zero_ttl_never_expires(clock):
+    cache = LRUCache(ttl=0)
+    cache.put('a', 1)
+    clock[0] += 10 ** 9
+
+    assert cache.get('a') == 1
+
+def test_invalidate():
+    cache = LRUCache(ttl=0)
+    for key in [('cases', 'France'), ('cases', 'Italy'), ('deaths', 'France')]:
+        cache.put(key, [key], size=10)
+
+    assert cache.invalidate(lambda key: key[0] == 'cases') == 2
+    assert cache.get(('deaths', 'France')) == [('deaths', 'France')]
+    assert cache.stats()['bytes'] == 10
+
+    assert cache.invalidate() == 1
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+def test_counts_hits_and_misses():
+    cache = LRUCache(ttl=0)
+    cache.put('a', 1)
+    cache.get('a')
+    cache.get('b')
+
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+def test_estimate_size_walks_containers():
+    rows = [['2021-01-01', 1], ['2021-01-02', 2]]
+
+    assert estimate_size(rows) > estimate_size(rows[0]) + estimate_size(rows[1])
+    assert estimate_size({'France': rows}) > estimate_size(rows)
+
+@pytest.fixture
+def series_cache(monkeypatch):
+    cache = LRUCache(max_entries=100, ttl=0)
+    monkeypatch.setattr(Cache, 'series_cache', cache)
+    for key in [POPULATION_KEY, ('cases', None, 'Peru'), ('cases', (None, 'per_million'), 'Peru'), ('cases', (None, 'per_million'), 'Chile'),
+                ('cases', (None, 'rolling_7'), 'Chile'), ('vaccinations', ('snapshot', 'v_total_vaccinations', None), None)]:
+        cache.put(key, [])
+    return cache
+
+def test_invalidating_a_population_source_drops_the_populations(series_cache):
+    assert invalidate_series_cache('vaccinations', 'Peru') == 4
+    assert series_cache.get(('cases', None, 'Peru')) == [] and series_cache.get(('cases', (None, 'rolling_7'), 'Chile')) == []
+
+def test_invalidating_cases_keeps_the_populations(series_cache):
+    assert invalidate_series_cache('cases', 'Peru') == 2
+    assert series_cache.get(POPULATION_KEY) == [] and series_cache.get(('cases', (None, 'per_million'), 'Chile')) == []
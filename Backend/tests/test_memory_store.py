@@ -0,0 +1,134 @@
+import sys
+from datetime import date
+from decimal import Decimal
+import pytest
+from Engine.memory_store import MemoryStore, TABLES
+
+# One source row per (country, date): country, group (hospitalization indicator), date, label (testing note), then
+# the values of TABLES[category]['columns']. NUMERIC values are Decimal, as psycopg returns them.
+FIXTURE_ROWS = {
+    'cases': [('Canada', None, date(2021, 1, 1), None, 10), ('Canada', None, date(2021, 1, 2), None, None),
+              ('Canada', None, date(2021, 1, 4), None, 12), ('Peru', None, date(2021, 1, 2), None, 7)],
+    'testing': [('Canada', None, date(2021, 1, 1), 'tests performed', Decimal('1200'), Decimal('15'), Decimal('0.031'),
+                 Decimal('0.0004'), Decimal('0.052'), None),
+                ('Canada', None, date(2021, 1, 3), None, Decimal('1215'), None, Decimal('0.032'), None, Decimal('0.05'), Decimal('19.2'))],
+    'hospitalizations': [('Canada', 'Daily ICU occupancy', date(2021, 1, 1), None, Decimal('88')),
+                         ('Canada', 'Daily ICU occupancy', date(2021, 1, 2), None, Decimal('91.5')),
+                         ('Canada', 'Daily hospital occupancy', date(2021, 1, 2), None, Decimal('400'))],
+    'vaccinations': [('Peru', None, date(2021, 2, 1), None, 1000, 10, None, 100, Decimal('0.03'), None),
+                     ('Peru', None, date(2021, 2, 2), None, 1100, 20, 1, 100, Decimal('0.06'), Decimal('0.01'))]
+}
+
+"""
+    Builds a loaded store from the fixture rows, reading store.tables instead of PostgreSQL on reload,
+    with no snapshot file to follow.
+"""
+@pytest.fixture
+def store(monkeypatch):
+    # Engine re-exports the memory_store instance under the module's name
+    monkeypatch.setattr(sys.modules[MemoryStore.__module__], 'MEMORY_SNAPSHOT', '')
+    store = MemoryStore()
+    tables = dict(FIXTURE_ROWS)
+    reads = []
+
+    def load_tables(categories=None):
+        reads.append(sorted(categories) if categories is not None else None)
+        frames = {}
+        for category, rows in tables.items():
+            if categories is None or category in categories:
+                frames.update(store._build_frames(category, TABLES[category], rows))
+        return frames
+
+    monkeypatch.setattr(store, 'load_tables', load_tables)
+    store.frames = load_tables()
+    store.loaded = True
+    store.tables = tables
+    store.reads = reads
+    return store
+
+def test_invalidated_table_is_read_again_on_load(store):
+    store.tables['cases'] = FIXTURE_ROWS['cases'][:1]
+    store.invalidate('cases')
+    store.load()
+
+    assert store.reads[-1] == ['cases']
+    assert store.get_series_window('cases', ['Canada', 'Peru'], '2021-01-01', '2021-01-31') == {'Canada': [['2021-01-01', 10]]}
+    assert store.get_series_window('testing', ['Canada'], '2021-01-01', '2021-01-31', 't_ct_per_thousand')
+
+    store.load()
+    assert len(store.reads) == 2
+
+def test_location_change_reloads_every_table(store):
+    store.invalidate('location')
+    store.load()
+
+    assert store.reads[-1] == sorted(TABLES)
+
+def test_unknown_category_is_ignored(store):
+    store.invalidate('recoveries')
+    store.load()
+
+    assert len(store.reads) == 1
+
+def test_failed_reload_keeps_the_frames(store, monkeypatch):
+    frames = store.frames
+
+    def fail(categories=None):
+        raise RuntimeError("Could not load table 'cases' into the memory store")
+
+    monkeypatch.setattr(store, 'load_tables', fail)
+    store.invalidate('cases')
+    store.load()
+
+    assert store.frames is frames
+    assert store._stale == {'cases'}
+
+def test_unloaded_store_ignores_invalidations():
+    store = MemoryStore()
+    store.invalidate('cases')
+
+    assert store._stale == set()
+
+def test_snapshot_on_a_date_and_latest(store):
+    assert store.get_snapshot('cases', '2021-01-02') == [['Peru', '2021-01-02', 7]]
+    assert sorted(store.get_snapshot('cases')) == [['Canada', '2021-01-04', 12], ['Peru', '2021-01-02', 7]]
+    assert store.get_snapshot('testing', None, 't_short_term_tests_per_case') == [['Canada', '2021-01-03', 19.2]]
+    assert store.get_snapshot('hospitalizations', '2021-01-02', 'Daily hospital occupancy') == [['Canada', '2021-01-02', 400.0]]
+    assert store.get_snapshot('vaccinations', '2021-02-01', 'v_total_boosters') == []
+
+def test_snapshot_file_round_trip(store, tmp_path):
+    path = str(tmp_path / 'memory.snapshot')
+    MemoryStore.save_snapshot(path, store.frames, {'Canada': 'CAN'}, 'v42')
+    mapped = MemoryStore()
+    mapped._map_snapshot(path)
+
+    index = MemoryStore.read_snapshot_index(path)
+    assert index['dataset_version'] == 'v42'
+    assert sorted(index['locations']) == ['CAN', 'Peru']
+    assert mapped.snapshot['dataset_version'] == 'v42'
+
+    for category, variant in [('cases', None), ('testing', 't_ct_per_thousand'), ('hospitalizations', 'Daily ICU occupancy'),
+                              ('vaccinations', 'v_total_boosters_per_hundred')]:
+        assert mapped.get_series_window(category, ['Canada', 'Peru'], '2020-01-01', '2024-12-31', variant) == \
+            store.get_series_window(category, ['Canada', 'Peru'], '2020-01-01', '2024-12-31', variant)
+
+def test_mapped_frames_are_read_only_and_ignore_invalidations(store, tmp_path):
+    path = str(tmp_path / 'memory.snapshot')
+    MemoryStore.save_snapshot(path, store.frames, {})
+    mapped = MemoryStore()
+    mapped._map_snapshot(path)
+
+    with pytest.raises(ValueError):
+        mapped.get_frame('cases', 'Canada').dates[0] = 0
+
+    mapped.invalidate('cases')
+    assert mapped._stale == set()
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'memory.snapshot'
+    path.write_bytes(b'not a snapshot' * 4)
+
+    with pytest.raises(RuntimeError, match="is not a memory store snapshot"):
+        MemoryStore.read_snapshot_index(str(path))
+    with pytest.raises(RuntimeError, match="is not a memory store snapshot"):
+        MemoryStore()._map_snapshot(str(path))
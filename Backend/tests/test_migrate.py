@@ -0,0 +1,15 @@
+import os
+from db.migrate import MIGRATIONS_DIR, find_migrations
+
+def test_migrations_are_numbered_without_gaps():
+    versions = [version for version, _, _ in find_migrations()]
+
+    assert versions == [f"{number:04d}" for number in range(1, len(versions) + 1)]
+    assert all(os.path.isfile(path) for _, _, path in find_migrations(MIGRATIONS_DIR))
+
+def test_only_migration_files_are_listed(tmp_path):
+    for filename in ['0002_second.sql', '0001_first.sql', 'README.md', '0003_draft.sql.bak', '12_short.sql']:
+        (tmp_path / filename).write_text('')
+
+    assert find_migrations(str(tmp_path)) == [('0001', 'first', str(tmp_path / '0001_first.sql')),
+                                               ('0002', 'second', str(tmp_path / '0002_second.sql'))]
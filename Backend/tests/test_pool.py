@@ -0,0 +1,40 @@
+import pytest
+from db import init_db_pool, get_db_pool, close_db_pool, get_pool_stats
+from db.queries import execute_query
+
+@pytest.fixture
+def pool(database, monkeypatch):
+    monkeypatch.setenv('DATABASE_POOL_MIN_SIZE', '1')
+    monkeypatch.setenv('DATABASE_POOL_MAX_SIZE', '3')
+    monkeypatch.setenv('DATABASE_POOL_TIMEOUT', '5')
+    close_db_pool()
+    pool = init_db_pool()
+    pool.wait()
+    yield pool
+    close_db_pool()
+
+def test_stats_before_the_pool_is_opened():
+    close_db_pool()
+
+    assert get_pool_stats() == {'pool_open': False}
+
+def test_pool_is_sized_from_the_environment(pool):
+    assert (pool.min_size, pool.max_size, pool.timeout) == (1, 3, 5)
+    assert init_db_pool() is pool
+    assert get_db_pool() is pool
+
+def test_stats_count_borrowed_connections(pool):
+    with pool.connection():
+        stats = get_pool_stats()
+
+    assert stats['pool_open'] and (stats['pool_min'], stats['pool_max']) == (1, 3)
+    assert stats['in_use'] == 1
+    assert get_pool_stats()['in_use'] == 0
+
+def test_queries_return_their_connection(pool):
+    for _ in range(5):
+        assert execute_query("SELECT 1;", fetch_results=True) == [(1,)]
+
+    stats = get_pool_stats()
+    assert stats['in_use'] == 0 and stats['pool_size'] <= 3
+    assert stats['requests'] >= 5
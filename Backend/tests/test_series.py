@@ -0,0 +1,92 @@
+from decimal import Decimal
+import pytest
+import db.series
+from db.series import exclude_ranges, fact_series_query, group_fact_rows, series_query
+
+ROWS = [[f"2021-01-{day:02d}", day] for day in range(1, 11)]
+
+def days(rows):
+    return [row[1] for row in rows]
+
+@pytest.mark.parametrize('ranges, remaining', [
+    ([], list(range(1, 11))),
+    ([['2021-01-03', '2021-01-05']], [1, 2, 6, 7, 8, 9, 10]),
+    ([['2020-12-01', '2021-01-31']], []),
+    ([['2021-01-08', '2021-01-02']], list(range(1, 11))),
+    ([['2021-01-09', '2021-01-10'], ['2021-01-01', '2021-01-02']], [3, 4, 5, 6, 7, 8]),
+    ([['2021-01-02', '2021-01-06'], ['2021-01-04', '2021-01-07']], [1, 8, 9, 10]),
+    ([['2021-01-02', '2021-01-08'], ['2021-01-04', '2021-01-05']], [1, 9, 10]),
+    ([['2021-01-05', '2021-01-05']], [1, 2, 3, 4, 6, 7, 8, 9, 10]),
+    ([['2020-01-01', '2020-12-31'], ['2022-01-01', '2022-12-31']], list(range(1, 11)))
+])
+def test_exclude_ranges(ranges, remaining):
+    assert days(exclude_ranges(ROWS, ranges)) == remaining
+
+def test_exclude_ranges_keeps_rows_outside_every_range():
+    ranges = [['2021-01-02', '2021-01-03'], ['2021-01-06', '2021-01-06']]
+
+    assert exclude_ranges(ROWS, ranges) == [row for row in ROWS
+                                            if not any(start <= row[0] <= end for start, end in ranges)]
+
+def test_fact_query_reads_the_name_column_of_the_category():
+    query, params, columns = fact_series_query([('hospitalizations', 'Daily ICU occupancy per million')], ['Peru'], '2021-01-01', '2021-01-31')
+
+    assert query.startswith("SELECT f_h_nationname, f_day, f_present, h_daily_icu_occupancy_per_million FROM daily_facts")
+    assert "WHERE f_h_nationname = ANY(%s) AND f_present & 128 <> 0 AND f_date BETWEEN %s AND %s" in query
+    assert params == (['Peru'], '2021-01-01', '2021-01-31')
+
+def test_fact_query_rejects_specs_of_different_name_columns():
+    with pytest.raises(ValueError):
+        fact_series_query([('cases', None), ('vaccinations', 'v_total_vaccinations')], ['Peru'])
+
+def test_fact_rows_are_split_by_spec():
+    specs = [('cases', None), ('testing', 't_ct_per_thousand')]
+    _, _, columns = fact_series_query(specs, ['Peru', 'Chile'])
+    rows = [('Peru', '2021-01-01', 1 | 4, 10, 'tests performed', Decimal('0.5')), ('Peru', '2021-01-02', 1, 12, None, None),
+            ('Peru', '2021-01-03', 4, None, None, Decimal('0.7'))]
+
+    assert group_fact_rows(rows, specs, ['Peru', 'Chile'], columns) == {
+        ('cases', None): {'Peru': (['2021-01-01', '2021-01-02'], [['2021-01-01', 10], ['2021-01-02', 12]]), 'Chile': ([], [])},
+        ('testing', 't_ct_per_thousand'): {'Peru': (['2021-01-01', '2021-01-03'], [['2021-01-01', 'tests performed', 0.5], ['2021-01-03', None, 0.7]]),
+                                           'Chile': ([], [])}
+    }
+
+SNAPSHOT = [['Peru', '2021-06-01', 300], ['World', '2021-06-01', 9000], ['Chile', '2021-06-01', 300], ['Atlantis', '2021-06-01', 5],
+            ['Canada', '2021-05-30', 100]]
+NATIONKEYS = {'Peru': 'PER', 'World': 'OWID_WRL', 'Chile': 'CHL', 'Canada': 'CAN'}
+# Names of the vaccinations table, known to the catalogue through resolve() only
+TABLE_NATIONKEYS = {**NATIONKEYS, 'Republic of Peru': 'PER', 'Worldwide': 'OWID_WRL'}
+
+@pytest.fixture
+def ranking(monkeypatch):
+    monkeypatch.setattr(db.series, 'get_snapshot', lambda category, variant, date: [list(row) for row in SNAPSHOT])
+    monkeypatch.setattr(db.series, 'get_populations', lambda: {'PER': 3e7, 'CHL': 2e7, 'CAN': 4e7, 'OWID_WRL': 8e9})
+    monkeypatch.setattr(db.series.country_catalogue, 'resolve', TABLE_NATIONKEYS.get)
+    return db.series.get_ranking
+
+def test_ranking_breaks_ties_by_name_and_leaves_out_aggregates(ranking):
+    assert [row[0] for row in ranking('cases')] == ['Chile', 'Peru', 'Canada', 'Atlantis']
+    assert [row[0] for row in ranking('cases', descending=False, limit=2)] == ['Atlantis', 'Canada']
+    assert ranking('cases', aggregates=True, limit=1) == [['World', '2021-06-01', 9000]]
+
+def test_ranking_per_million_leaves_out_locations_without_population(ranking):
+    assert ranking('cases', per_million=True) == [['Chile', '2021-06-01', 15.0], ['Peru', '2021-06-01', 10.0],
+                                                   ['Canada', '2021-05-30', 2.5]]
+
+def test_ranking_resolves_the_names_of_the_category_table(ranking, monkeypatch):
+    monkeypatch.setattr(db.series, 'get_snapshot', lambda category, variant, date: [['Republic of Peru', '2021-06-01', 600],
+                                                                                    ['Worldwide', '2021-06-01', 9000]])
+
+    assert ranking('vaccinations', 'v_total_vaccinations', per_million=True) == [['Republic of Peru', '2021-06-01', 20.0]]
+
+def test_ranking_per_million_of_per_capita_metric(ranking):
+    with pytest.raises(ValueError):
+        ranking('vaccinations', 'v_total_boosters_per_hundred', per_million=True)
+
+def test_series_query_by_name_orders_by_the_sorted_countries(monkeypatch):
+    monkeypatch.setattr(db.series.country_catalogue, 'nationkeys', lambda names: [NATIONKEYS[name] for name in names])
+    query, params = series_query('cases', ['Peru', 'Canada', 'Chile'], None, '2021-01-01', '2021-01-31', by_name=True)
+
+    assert query.endswith("ORDER BY array_position(%s::varchar[], c_nationkey::varchar), c_date;")
+    assert params == (['CAN', 'CHL', 'PER'], '2021-01-01', '2021-01-31', ['CAN', 'CHL', 'PER'])
+    assert series_query('cases', ['Peru'])[0].endswith("ORDER BY c_nationkey, c_date;")
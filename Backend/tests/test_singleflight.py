@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+from db.singleflight import AsyncSingleFlight, SingleFlight, coalesced_queries, query_key
+
+def test_query_key_normalizes_whitespace_and_lists():
+    assert query_key("SELECT *\n  FROM cases WHERE c_nationkey = ANY(%s);", (['FRA', 'ITA'], '2021-01-01')) == \
+        query_key("SELECT * FROM cases WHERE c_nationkey = ANY(%s);", [('FRA', 'ITA'), '2021-01-01'])
+    hash(query_key("SELECT 1;", [['a'], ['b', ['c']]]))
+
+"""
+    Calls the same key from several threads while the first execution is held, and releases it once
+    every other caller is waiting on it.
+"""
+def run_concurrently(flights, callers, function):
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+    results = [None] * callers
+    shared = coalesced_queries.value(('shared',))
+
+    def execute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return function()
+
+    def caller(index):
+        try:
+            results[index] = flights.do('key', execute)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(callers)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+
+    deadline = time.monotonic() + 5
+    while coalesced_queries.value(('shared',)) < shared + callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return calls, results
+
+def test_concurrent_callers_share_one_execution():
+    result = [['2021-01-01', 1]]
+    calls, results = run_concurrently(SingleFlight(), 8, lambda: result)
+
+    assert len(calls) == 1
+    assert all(item is result for item in results)
+
+def test_concurrent_callers_share_the_exception():
+    def fail():
+        raise RuntimeError("connection lost")
+
+    calls, results = run_concurrently(SingleFlight(), 4, fail)
+
+    assert len(calls) == 1
+    assert all(isinstance(item, RuntimeError) for item in results)
+
+def test_sequential_calls_execute_again():
+    flights = SingleFlight()
+    calls = []
+
+    for _ in range(3):
+        flights.do('key', lambda: calls.append(1))
+
+    assert len(calls) == 3
+    assert flights._calls == {}
+
+def test_async_callers_share_one_execution():
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ['2021-01-01', 1]
+
+    async def main():
+        return await asyncio.gather(*(flights.do('key', execute) for _ in range(5)), flights.do('other', execute))
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 2
+    assert all(result == ['2021-01-01', 1] for result in results)
+    assert flights._calls == {}
+
+def test_async_callers_share_the_exception():
+    flights = AsyncSingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("connection lost")
+
+    async def main():
+        return await asyncio.gather(*(flights.do('key', fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
@@ -0,0 +1,54 @@
+import weakref
+import pytest
+import db.statements
+from db.statements import get_statement_stats, mark_prepared, prepare_flag, register_statement, registered_statements, relations_query, statements_to_prepare, statement_executions
+
+class Connection:
+    pass
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(db.statements, '_statements', {})
+    monkeypatch.setattr(db.statements, '_prepared', weakref.WeakKeyDictionary())
+    monkeypatch.setattr(db.statements, 'PREPARED_STATEMENTS', True)
+    register_statement('cases', "SELECT c_date, c_cases FROM cases WHERE c_nationkey = ANY(%s);", (['PER'],))
+    register_statement('facts', "SELECT * FROM daily_facts WHERE f_nationname = ANY(%s);", (['Peru'],), 'daily_facts')
+
+def executions():
+    return statement_executions.value(('after_warmup',)), statement_executions.value(('first',))
+
+def test_registered_statements_are_prepared_once_per_connection():
+    query = registered_statements()['cases']
+    first, second = Connection(), Connection()
+    before = executions()
+
+    assert [prepare_flag(first, query), prepare_flag(first, query), prepare_flag(second, query)] == [True, True, True]
+    assert executions() == (before[0] + 1, before[1] + 2)
+
+def test_other_queries_keep_the_default():
+    assert prepare_flag(Connection(), "SELECT 1;") is None
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(db.statements, 'PREPARED_STATEMENTS', False)
+
+    assert prepare_flag(Connection(), registered_statements()['cases']) is None
+
+def test_statements_on_missing_relations_are_skipped():
+    assert relations_query() == ("SELECT relname FROM pg_class WHERE relname = ANY(%s);", (['daily_facts'],))
+    assert [query for query, _ in statements_to_prepare(set())] == [registered_statements()['cases']]
+    assert len(statements_to_prepare({'daily_facts'})) == 2
+
+def test_stats_count_executions_after_the_warm_up():
+    query = registered_statements()['cases']
+    warm, cold = Connection(), Connection()
+    mark_prepared(warm, [query])
+    before = get_statement_stats()
+
+    prepare_flag(warm, query)
+    prepare_flag(cold, query)
+
+    stats = get_statement_stats()
+    assert (stats['registered'], stats['connections']) == (2, 2)
+    assert stats['executions_after_warmup'] == before['executions_after_warmup'] + 1
+    assert stats['first_executions'] == before['first_executions'] + 1
+    assert 'hit_ratio' not in stats
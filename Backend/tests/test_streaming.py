@@ -0,0 +1,67 @@
+import json
+import pytest
+from flask import Flask
+from Errors.custom_exceptions import EmptyQueryOutputError
+from Util.streaming import download_response, grouped_json_response
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+BATCHES = [
+    [('Albania', ['2021-01-01', 1]), ('Albania', ['2021-01-02', 2])],
+    [('Albania', ['2021-01-03', 3]), ('Andorra', ['2021-01-01', 'tests performed', 0.5])],
+    [],
+    [('Angola', ['2021-01-01', None])]
+]
+
+def test_grouped_json_matches_the_buffered_response(app):
+    app.add_url_rule('/compare', 'compare', lambda: grouped_json_response(iter(BATCHES), "no rows"))
+    response = app.test_client().get('/compare')
+
+    assert response.is_streamed
+    assert json.loads(response.get_data()) == {
+        'Albania': [['2021-01-01', 1], ['2021-01-02', 2], ['2021-01-03', 3]],
+        'Andorra': [['2021-01-01', 'tests performed', 0.5]],
+        'Angola': [['2021-01-01', None]]
+    }
+
+def test_grouped_json_without_rows_raises_and_closes_the_cursor(app):
+    closed = []
+
+    def batches():
+        try:
+            return
+            yield
+        finally:
+            closed.append(True)
+
+    with app.test_request_context(), pytest.raises(EmptyQueryOutputError, match="no rows"):
+        grouped_json_response(batches(), "no rows")
+    assert closed == [True]
+
+def test_download_response_reads_the_first_chunk_up_front():
+    def chunks():
+        raise RuntimeError("relation does not exist")
+        yield b''
+
+    with pytest.raises(RuntimeError):
+        download_response(chunks(), 'text/csv', 'cases.csv')
+
+    response = download_response(iter([b'a,b\n', b'1,2\n']), 'text/csv', 'cases.csv')
+    assert response.headers['Content-Disposition'] == 'attachment; filename="cases.csv"'
+    assert b''.join(response.response) == b'a,b\n1,2\n'
+
+@pytest.mark.parametrize('category', ['cases', 'vaccinations'])
+def test_streamed_compare_lists_countries_like_the_buffered_response(database, category):
+    from app import app
+    query = {'countries': ['Canada', 'Austria', 'Algeria'], 'start': '2021-06-01', 'end': '2021-06-03'}
+    if category == 'vaccinations':
+        query['metric'] = 'v_total_vaccinations'
+    client = app.test_client()
+
+    buffered = json.loads(client.get(f'/api/compare-{category}-by-country', query_string=query).get_data())
+    streamed = json.loads(client.get(f'/api/compare-{category}-by-country', query_string={**query, 'stream': 'true'}).get_data())
+
+    assert len(buffered) >= 2 and list(buffered) == sorted(buffered)
+    assert list(streamed.items()) == list(buffered.items())
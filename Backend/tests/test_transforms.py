@@ -0,0 +1,51 @@
+import pytest
+from Util.transforms import transform_series
+
+DATES = ['2021-01-01', '2021-01-02', '2021-01-03', '2021-01-05']
+
+def rows(values, dates=DATES):
+    return [[date, value] for date, value in zip(dates, values)]
+
+def test_daily_differences_running_totals_between_observations():
+    assert transform_series(DATES, rows([10, 12, None, 20]), 'daily', 'c_cases') == \
+        (['2021-01-02', '2021-01-05'], rows([2, 8], ['2021-01-02', '2021-01-05']))
+
+def test_daily_keeps_values_of_daily_metrics():
+    assert transform_series(DATES, rows([5, 6, 7, 8]), 'daily', 'v_daily_vaccinations') == (DATES, rows([5, 6, 7, 8]))
+
+def test_growth_rate_skips_zero_previous_values():
+    assert transform_series(DATES, rows([0, 5, 10, 5]), 'growth_rate', 'c_cases') == \
+        (['2021-01-03', '2021-01-05'], rows([100.0, -50.0], ['2021-01-03', '2021-01-05']))
+
+def test_growth_rate_is_rounded():
+    assert transform_series(DATES[:2], rows([3, 4]), 'growth_rate', 'c_cases')[1] == [['2021-01-02', 33.333]]
+
+def test_per_million():
+    assert transform_series(DATES, rows([10, 12, None, 20]), 'per_million', 'c_cases', 2e6) == \
+        (['2021-01-01', '2021-01-02', '2021-01-05'], rows([5.0, 6.0, 10.0], ['2021-01-01', '2021-01-02', '2021-01-05']))
+
+def test_rolling7_of_running_total():
+    dates = [f"2021-01-{day:02d}" for day in range(1, 11)]
+
+    assert transform_series(dates, rows([i * 7 for i in range(10)], dates), 'rolling7', 'c_cases') == \
+        (dates[7:], rows([7.0, 7.0, 7.0], dates[7:]))
+
+def test_rolling7_of_daily_metric():
+    dates = [f"2021-01-{day:02d}" for day in range(1, 11)]
+
+    assert transform_series(dates, rows(list(range(10)), dates), 'rolling7', 'v_daily_vaccinations') == \
+        (dates[7:], rows([4.0, 5.0, 6.0], dates[7:]))
+
+def test_rolling7_spreads_a_gap_over_the_elapsed_days():
+    dates = ['2021-01-01', '2021-01-11']
+
+    assert transform_series(dates, rows([0, 20], dates), 'rolling7', 'c_cases') == (['2021-01-11'], [['2021-01-11', 2.0]])
+
+def test_keeps_middle_columns():
+    data = [[date, 'Daily ICU occupancy', value] for date, value in zip(DATES[:2], [1, 3])]
+
+    assert transform_series(DATES[:2], data, 'daily')[1] == [['2021-01-02', 'Daily ICU occupancy', 2]]
+
+@pytest.mark.parametrize('transform', ['daily', 'rolling7', 'growth_rate'])
+def test_series_without_observations(transform):
+    assert transform_series(DATES, rows([None] * 4), transform, 'c_cases') == ([], [])
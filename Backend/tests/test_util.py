@@ -0,0 +1,99 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+from Errors.custom_exceptions import MissingParameterError, UnknownParameterError, IncorrectParameterFormError
+from Util.util import *
+
+def test_check_unknown_parameters():
+    check_unknown_parameters(MultiDict([('countries', 'Peru'), ('countries', 'Chile')]), ['countries'])
+
+    with pytest.raises(UnknownParameterError, match="Unknown parameters: foo, bar"):
+        check_unknown_parameters({'country': 'Peru', 'foo': 1, 'bar': 2}, ['country'])
+
+def test_check_missing_parameters():
+    check_missing_parameters(country='Peru', countries=[])
+
+    with pytest.raises(MissingParameterError, match="Missing required parameters: start_date, end_date"):
+        check_missing_parameters(country='Peru', start_date=None, end_date=None)
+
+@pytest.mark.parametrize('start_date, end_date', [('2021-1-01', '2021-01-31'), ('2021-01-01', None), (20210101, '2021-01-31')])
+def test_check_date_window(start_date, end_date):
+    check_date_window('2021-01-01', '2021-01-31')
+
+    with pytest.raises(IncorrectParameterFormError):
+        check_date_window(start_date, end_date)
+
+def test_check_countries():
+    check_countries(['Peru'], 1)
+
+    with pytest.raises(IncorrectParameterFormError, match="At least 2 countries"):
+        check_countries(['Peru'], 2)
+    with pytest.raises(IncorrectParameterFormError, match="At least 1 country must"):
+        check_countries('Peru', 1)
+    with pytest.raises(IncorrectParameterFormError):
+        check_countries(['Peru', 1], 1)
+
+@pytest.mark.parametrize('value, expected', [('true', True), ('FALSE', False), (True, True), (False, False)])
+def test_parse_boolean(value, expected):
+    assert parse_boolean(value, 'stream') is expected
+
+def test_parse_boolean_rejects_other_values():
+    with pytest.raises(IncorrectParameterFormError, match="stream must be a boolean value"):
+        parse_boolean('yes', 'stream')
+
+def test_parse_limit():
+    assert parse_limit(None) is None
+    assert parse_limit('1000') == 1000
+
+    for limit in ['0', '1001', '-1', 'ten']:
+        with pytest.raises(IncorrectParameterFormError):
+            parse_limit(limit)
+
+def test_parse_series_options_defaults():
+    assert parse_series_options({}) == ('day', None, 'json', None)
+    assert parse_series_options(MultiDict({'resolution': 'week', 'max_points': '10', 'format': 'columnar', 'transform': 'rolling7'})) == \
+        ('week', 10, 'columnar', 'rolling7')
+
+def test_parse_series_options_from_a_json_body():
+    assert parse_series_options({'max_points': 5})[1] == 5
+
+@pytest.mark.parametrize('params, message', [
+    ({'resolution': 'year'}, "resolution must be one of"),
+    ({'max_points': '2'}, "max_points must be an integer of at least 3"),
+    ({'max_points': 2.5}, "max_points"),
+    ({'format': 'xml'}, "format must be one of: json, columnar"),
+    ({'transform': 'cumulative'}, "transform must be one of: daily, rolling7, per_million, growth_rate")
+])
+def test_parse_series_options_rejects(params, message):
+    with pytest.raises(IncorrectParameterFormError, match=message):
+        parse_series_options(params)
+
+def test_parse_series_variant():
+    assert parse_series_variant('cases') is None
+    assert parse_series_variant('testing', metric='t_cumulative_total') == 't_cumulative_total'
+    assert parse_series_variant('vaccinations', metric='v_total_boosters') == 'v_total_boosters'
+    assert parse_series_variant('hospitalizations', indicator='Daily ICU occupancy') == 'Daily ICU occupancy'
+    assert parse_series_variant('hospitalizations', indicator='Daily ICU occupancy', per_million='True') == 'Daily ICU occupancy per million'
+    assert parse_series_variant('hospitalizations', indicator='Daily ICU occupancy', per_million=True) == 'Daily ICU occupancy per million'
+
+@pytest.mark.parametrize('args, message', [
+    (('recoveries',), "Invalid category name: recoveries"),
+    (('testing', 'v_total_boosters'), "Invalid metric name: v_total_boosters"),
+    (('vaccinations', None), "Invalid metric name: None"),
+    (('hospitalizations', None, 'Daily ICU occupancy per million'), "Invalid indicator name")
+])
+def test_parse_series_variant_rejects(args, message):
+    with pytest.raises(ValueError, match=message):
+        parse_series_variant(*args)
+
+def test_check_per_million():
+    check_per_million('v_total_vaccinations')
+
+    with pytest.raises(IncorrectParameterFormError, match="per_million does not apply to metric: v_total_boosters_per_hundred"):
+        check_per_million('v_total_boosters_per_hundred')
+
+def test_is_valid_date_ranges():
+    assert is_valid_date_ranges([['2021-01-01', '2021-01-31'], ['2021-03-01', '2021-03-01']], 2)
+    assert not is_valid_date_ranges([['2021-01-01', '2021-01-31']] * 3, 2)
+    assert not is_valid_date_ranges([['2021-01-31', '2021-01-01']], 2)
+    assert not is_valid_date_ranges([['2021-01-01']], 2)
+    assert not is_valid_date_ranges({'2021-01-01': '2021-01-31'}, 2)
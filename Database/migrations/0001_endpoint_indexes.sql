@@ -0,0 +1,19 @@
+-- Indexes for the filters the /api endpoints run
+
+-- cases/deaths/testing are read by nationkey, the country catalogue maps the names in memory, so location
+-- (a few hundred rows, always read whole) needs no index on l_nationname
+
+-- cases and deaths are read by their primary keys (c_nationkey, c_date) and (d_nationkey, d_date), a covering
+-- copy of those keys would double the write cost of every load for at best an index-only scan
+
+-- The primary key (h_date, h_nationkey, h_indicator) cannot serve h_nationname = %s AND h_indicator = %s
+CREATE INDEX IF NOT EXISTS hospitalizations_nationname_indicator_date_idx
+    ON hospitalizations (h_nationname, h_indicator, h_date) INCLUDE (h_value);
+
+-- Vaccinations are filtered by v_nationname, which had no index
+CREATE INDEX IF NOT EXISTS vaccinations_nationname_date_idx ON vaccinations (v_nationname, v_date);
+
+ANALYZE cases;
+ANALYZE deaths;
+ANALYZE hospitalizations;
+ANALYZE vaccinations;
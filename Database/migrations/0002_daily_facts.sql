@@ -0,0 +1,91 @@
+-- Wide per-country daily fact table: one row per (nationkey, date) with every metric of the five tables,
+-- hospitalization indicators pivoted into columns. Refresh with `python -m db.facts` after loading data.
+--
+-- f_nationname is the location name. The hospitalizations and vaccinations endpoints match countries on the
+-- names of their own tables, so f_h_nationname and f_v_nationname carry those (NULL on days without a row there).
+--
+-- f_present records which source rows exist for the day, so a NULL metric can be told apart from a missing row:
+--     1 cases, 2 deaths, 4 testing, 8 vaccinations,
+--     16/32 daily hospital occupancy (/per million), 64/128 daily ICU occupancy (/per million),
+--     256/512 weekly new hospital admissions (/per million), 1024/2048 weekly new ICU admissions (/per million)
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS daily_facts AS
+WITH days AS (
+    SELECT c_nationkey AS nationkey, c_date AS date FROM cases
+    UNION SELECT d_nationkey, d_date FROM deaths
+    UNION SELECT t_nationkey, t_date FROM testing
+    UNION SELECT h_nationkey, h_date FROM hospitalizations
+    UNION SELECT v_nationkey, v_date FROM vaccinations
+), hospitalizations_wide AS (
+    SELECT h_nationkey, h_date,
+           min(h_nationname) AS h_nationname,
+           max(h_value) FILTER (WHERE h_indicator = 'Daily hospital occupancy') AS h_daily_hospital_occupancy,
+           max(h_value) FILTER (WHERE h_indicator = 'Daily hospital occupancy per million') AS h_daily_hospital_occupancy_per_million,
+           max(h_value) FILTER (WHERE h_indicator = 'Daily ICU occupancy') AS h_daily_icu_occupancy,
+           max(h_value) FILTER (WHERE h_indicator = 'Daily ICU occupancy per million') AS h_daily_icu_occupancy_per_million,
+           max(h_value) FILTER (WHERE h_indicator = 'Weekly new hospital admissions') AS h_weekly_new_hospital_admissions,
+           max(h_value) FILTER (WHERE h_indicator = 'Weekly new hospital admissions per million') AS h_weekly_new_hospital_admissions_per_million,
+           max(h_value) FILTER (WHERE h_indicator = 'Weekly new ICU admissions') AS h_weekly_new_icu_admissions,
+           max(h_value) FILTER (WHERE h_indicator = 'Weekly new ICU admissions per million') AS h_weekly_new_icu_admissions_per_million,
+           bit_or(CASE h_indicator
+                      WHEN 'Daily hospital occupancy' THEN 16
+                      WHEN 'Daily hospital occupancy per million' THEN 32
+                      WHEN 'Daily ICU occupancy' THEN 64
+                      WHEN 'Daily ICU occupancy per million' THEN 128
+                      WHEN 'Weekly new hospital admissions' THEN 256
+                      WHEN 'Weekly new hospital admissions per million' THEN 512
+                      WHEN 'Weekly new ICU admissions' THEN 1024
+                      WHEN 'Weekly new ICU admissions per million' THEN 2048
+                      ELSE 0
+                  END) AS h_present
+    FROM hospitalizations
+    GROUP BY h_nationkey, h_date
+)
+SELECT days.nationkey AS f_nationkey,
+       l_nationname AS f_nationname,
+       hospitalizations_wide.h_nationname AS f_h_nationname,
+       v_nationname AS f_v_nationname,
+       days.date AS f_date,
+       TO_CHAR(days.date, 'YYYY-MM-DD') AS f_day,
+       (CASE WHEN c_nationkey IS NOT NULL THEN 1 ELSE 0 END
+        | CASE WHEN d_nationkey IS NOT NULL THEN 2 ELSE 0 END
+        | CASE WHEN t_nationkey IS NOT NULL THEN 4 ELSE 0 END
+        | CASE WHEN v_nationkey IS NOT NULL THEN 8 ELSE 0 END
+        | COALESCE(h_present, 0)) AS f_present,
+       c_cases,
+       d_death,
+       split_part(t_entity, ' - ', 2) AS t_note,
+       t_cumulative_total, t_daily_change_ct, t_ct_per_thousand, t_daily_change_ct_per_thousand,
+       t_short_term_positive_rate, t_short_term_tests_per_case,
+       h_daily_hospital_occupancy, h_daily_hospital_occupancy_per_million,
+       h_daily_icu_occupancy, h_daily_icu_occupancy_per_million,
+       h_weekly_new_hospital_admissions, h_weekly_new_hospital_admissions_per_million,
+       h_weekly_new_icu_admissions, h_weekly_new_icu_admissions_per_million,
+       v_total_vaccinations, v_people_fully_vaccinated, v_total_boosters, v_daily_vaccinations,
+       v_people_fully_vaccinated_per_hundred, v_total_boosters_per_hundred
+FROM days
+JOIN location ON l_nationkey = days.nationkey
+LEFT JOIN cases ON c_nationkey = days.nationkey AND c_date = days.date
+LEFT JOIN deaths ON d_nationkey = days.nationkey AND d_date = days.date
+LEFT JOIN testing ON t_nationkey = days.nationkey AND t_date = days.date
+LEFT JOIN hospitalizations_wide ON hospitalizations_wide.h_nationkey = days.nationkey AND h_date = days.date
+LEFT JOIN vaccinations ON v_nationkey = days.nationkey AND v_date = days.date;
+
+-- Unique key, also required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS daily_facts_nationkey_date_idx ON daily_facts (f_nationkey, f_date);
+
+-- The endpoints look countries up by name, one range scan per country on the name column of the category
+CREATE INDEX IF NOT EXISTS daily_facts_nationname_date_idx ON daily_facts (f_nationname, f_date);
+CREATE INDEX IF NOT EXISTS daily_facts_h_nationname_date_idx ON daily_facts (f_h_nationname, f_date);
+CREATE INDEX IF NOT EXISTS daily_facts_v_nationname_date_idx ON daily_facts (f_v_nationname, f_date);
+
+-- setup_db.sql only granted the tables that existed at the time
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'covid_user') THEN
+        GRANT SELECT ON daily_facts TO covid_user;
+    END IF;
+END
+$$;
+
+ANALYZE daily_facts;
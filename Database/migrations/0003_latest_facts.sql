@@ -0,0 +1,67 @@
+-- Cross-country snapshots (/api/ranking): the value of every location on one date, or its latest observation.
+
+-- Every location on one date is a single range scan
+CREATE INDEX IF NOT EXISTS daily_facts_date_idx ON daily_facts (f_date);
+
+-- Same for the metric tables when SERIES_SOURCE=tables (the hospitalizations primary key already starts with h_date)
+CREATE INDEX IF NOT EXISTS cases_date_idx ON cases (c_date);
+CREATE INDEX IF NOT EXISTS deaths_date_idx ON deaths (d_date);
+CREATE INDEX IF NOT EXISTS testing_date_idx ON testing (t_date);
+CREATE INDEX IF NOT EXISTS vaccinations_date_idx ON vaccinations (v_date);
+
+-- Latest non-null value of every metric and location, one row per (metric, location). lf_metric is the
+-- daily_facts column name, lf_nationname the country name of the metric's own table.
+-- Refreshed together with daily_facts by `python -m db.facts`.
+CREATE MATERIALIZED VIEW IF NOT EXISTS latest_facts AS
+SELECT DISTINCT ON (metric, f_nationkey)
+       metric AS lf_metric,
+       f_nationkey AS lf_nationkey,
+       nationname AS lf_nationname,
+       f_date AS lf_date,
+       f_day AS lf_day,
+       value AS lf_value
+FROM daily_facts
+CROSS JOIN LATERAL (VALUES
+    ('c_cases', c_cases::NUMERIC, f_nationname),
+    ('d_death', d_death::NUMERIC, f_nationname),
+    ('t_cumulative_total', t_cumulative_total, f_nationname),
+    ('t_daily_change_ct', t_daily_change_ct, f_nationname),
+    ('t_ct_per_thousand', t_ct_per_thousand, f_nationname),
+    ('t_daily_change_ct_per_thousand', t_daily_change_ct_per_thousand, f_nationname),
+    ('t_short_term_positive_rate', t_short_term_positive_rate, f_nationname),
+    ('t_short_term_tests_per_case', t_short_term_tests_per_case, f_nationname),
+    ('h_daily_hospital_occupancy', h_daily_hospital_occupancy, f_h_nationname),
+    ('h_daily_hospital_occupancy_per_million', h_daily_hospital_occupancy_per_million, f_h_nationname),
+    ('h_daily_icu_occupancy', h_daily_icu_occupancy, f_h_nationname),
+    ('h_daily_icu_occupancy_per_million', h_daily_icu_occupancy_per_million, f_h_nationname),
+    ('h_weekly_new_hospital_admissions', h_weekly_new_hospital_admissions, f_h_nationname),
+    ('h_weekly_new_hospital_admissions_per_million', h_weekly_new_hospital_admissions_per_million, f_h_nationname),
+    ('h_weekly_new_icu_admissions', h_weekly_new_icu_admissions, f_h_nationname),
+    ('h_weekly_new_icu_admissions_per_million', h_weekly_new_icu_admissions_per_million, f_h_nationname),
+    ('v_total_vaccinations', v_total_vaccinations::NUMERIC, f_v_nationname),
+    ('v_people_fully_vaccinated', v_people_fully_vaccinated::NUMERIC, f_v_nationname),
+    ('v_total_boosters', v_total_boosters::NUMERIC, f_v_nationname),
+    ('v_daily_vaccinations', v_daily_vaccinations::NUMERIC, f_v_nationname),
+    ('v_people_fully_vaccinated_per_hundred', v_people_fully_vaccinated_per_hundred, f_v_nationname),
+    ('v_total_boosters_per_hundred', v_total_boosters_per_hundred, f_v_nationname)
+) AS metrics (metric, value, nationname)
+WHERE value IS NOT NULL
+ORDER BY metric, f_nationkey, f_date DESC;
+
+-- Unique key, also required by REFRESH MATERIALIZED VIEW CONCURRENTLY. A snapshot reads one metric's rows.
+CREATE UNIQUE INDEX IF NOT EXISTS latest_facts_metric_nationkey_idx ON latest_facts (lf_metric, lf_nationkey);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'covid_user') THEN
+        GRANT SELECT ON latest_facts TO covid_user;
+    END IF;
+END
+$$;
+
+ANALYZE daily_facts;
+ANALYZE cases;
+ANALYZE deaths;
+ANALYZE testing;
+ANALYZE vaccinations;
+ANALYZE latest_facts;
@@ -16,6 +16,15 @@ const vaccinationsMetrics = [["Total Vaccinations", "v_total_vaccinations"], ["P
                                 ["Daily Vaccinations", "v_daily_vaccinations"], ["Pople Fully Vaccinated Per Hundred", "v_people_fully_vaccinated_per_hundred"], 
                                 ["Total Boosters Per Hundred", "v_total_boosters_per_hundred"]];
 
+// Series already downloaded, keyed by batch spec and country: the date ranges fetched so far and their rows.
+// Kept in memory and in IndexedDB, so only dates not fetched before are requested, even across reloads.
+// Entries belong to the dataset version the server reports and are dropped when it changes.
+const seriesCache = new Map();
+const seriesCacheDbName = 'covid-series-cache';
+const seriesCacheStore = 'series';
+let seriesCacheDb = null;
+let datasetVersion = null;
+
 
 // Retrieve all valid country names from database
 async function populateCountries() 
@@ -28,6 +37,8 @@ async function populateCountries()
             throw new Error(`${response.status} ${response.statusText}`);
         }
 
+        await setDatasetVersion(response.headers.get('X-Dataset-Version'));
+
         const countries = await response.json();
         console.log(countries);
 
@@ -106,40 +117,123 @@ function validateInputs()
 }
 
 async function singleCountryQueries()
+{
+    const data = await cachedSeriesQueries([selectedCountries[0]]);
+    if (typeof data === "number")
+    {
+        return data;
+    }
+
+    console.log(data[selectedCountries[0]]);
+    return data[selectedCountries[0]];
+}
+
+async function multiCountryComparisonQueries()
+{
+    const data = await cachedSeriesQueries(selectedCountries);
+    console.log(data);
+
+    return data;
+}
+
+// Key of the selected series in /api/batch requests and responses
+function selectedSeriesSpec()
+{
+    const spec = { category: selectedCategory };
+    let key = selectedCategory;
+
+    if (selectedCategory === "testing" || selectedCategory === "vaccinations")
+    {
+        spec.metric = selectedMetric;
+        key += `:${selectedMetric}`;
+    }
+    else if (selectedCategory === "hospitalizations")
+    {
+        spec.indicator = selectedMetric;
+        spec.per_million = selectedPerMillion;
+        key += `:${selectedMetric}${selectedPerMillion ? " per million" : ""}`;
+    }
+
+    return { spec, key };
+}
+
+// Get the selected series of several countries between startDate and endDate. Only the dates not cached
+// yet are requested, in one /api/batch request listing the ranges already held (delta fetch).
+// Returns an object of country to rows (countries without rows left out), or the HTTP status on error
+// (420 when no country has rows)
+async function cachedSeriesQueries(countries)
 {
     try
     {
-        const params = new URLSearchParams({
-            country: selectedCountries[0],
-            start: startDate,
-            end: endDate
-        });
+        const { spec, key } = selectedSeriesSpec();
+        const entries = {};
+        const known = {};
 
-        if (selectedCategory === "testing" || selectedCategory === "vaccinations")
+        for (const country of countries)
         {
-            params.append('metric', selectedMetric);
+            entries[country] = await getCachedSeries(`${key}|${country}`);
+            known[country] = entries[country].ranges.filter(range => range[0] <= endDate && range[1] >= startDate);
         }
-        else if (selectedCategory === "hospitalizations")
+
+        const missing = countries.filter(country => !known[country].some(range => range[0] <= startDate && range[1] >= endDate));
+
+        if (missing.length > 0)
         {
-            params.append('indicator', selectedMetric);
-            params.append('per_million', selectedPerMillion);
+            const body = {
+                series: [spec],
+                countries: missing,
+                start: startDate,
+                end: endDate,
+                format: 'columnar',
+                known: Object.fromEntries(missing.map(country => [country, known[country]]))
+            };
+
+            const response = await fetch('http://127.0.0.1:5000/api/batch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(body)
+            });
+
+            if (!response.ok)
+            {
+                const errorData = await response.json();
+                const error = new Error(`HTTP request error!: Status: ${response.status}, Message: ${errorData.error}`);
+                error.status = response.status;
+                throw error;
+            }
+
+            if (await setDatasetVersion(response.headers.get('X-Dataset-Version')))
+            {
+                // The data changed on the server, what was cached may be outdated
+                return cachedSeriesQueries(countries);
+            }
+
+            const rawData = (await response.json())[key] || {};
+
+            for (const country of missing)
+            {
+                const rows = rawData[country] !== undefined ? expandColumnarSeries(rawData[country]) : [];
+                entries[country] = mergeCachedSeries(entries[country], [startDate, endDate], rows);
+                await putCachedSeries(`${key}|${country}`, entries[country]);
+            }
         }
-        
-        const url = `http://127.0.0.1:5000/api/${selectedCategory}-by-country?${params.toString()}`;
 
-        const response = await fetch(url);
+        const data = {};
+        countries.forEach(country => {
+            const rows = entries[country].rows.filter(row => row[0] >= startDate && row[0] <= endDate);
+            if (rows.length > 0)
+            {
+                data[country] = rows;
+            }
+        });
 
-        if (!response.ok)
+        if (Object.keys(data).length === 0)
         {
-            const errorData = await response.json();
-            const error = new Error(`HTTP request error!: Status: ${response.status}, Message: ${errorData.error}`);
-            error.status = response.status;
+            const error = new Error('HTTP request error!: Status: 420, Message: Query returned no rows');
+            error.status = 420;
             throw error;
         }
 
-        const data = await response.json();
-        console.log(data);
-
         return data;
     }
     catch (error)
@@ -149,49 +243,169 @@ async function singleCountryQueries()
     }
 }
 
-async function multiCountryComparisonQueries()
+// Date (YYYY-MM-DD) of the day after a date
+function nextDay(value)
 {
-    try
-    {
-        const params = new URLSearchParams();
-        selectedCountries.forEach(country => {
-            params.append('countries', country);
-        });
-        params.append('start', startDate);
-        params.append('end', endDate);
+    return columnarDate(value, "day", 1);
+}
+
+// Add the rows of a newly fetched range to a cached series, merging touching or overlapping ranges
+function mergeCachedSeries(entry, range, rows)
+{
+    const rowsByDate = new Map(entry.rows.map(row => [row[0], row]));
+    rows.forEach(row => rowsByDate.set(row[0], row));
 
-        if (selectedCategory === "testing" || selectedCategory === "vaccinations")
+    const ranges = [];
+    [...entry.ranges, range].sort((a, b) => a[0].localeCompare(b[0])).forEach(next => {
+        const last = ranges[ranges.length - 1];
+        if (last !== undefined && next[0] <= nextDay(last[1]))
         {
-            params.append('metric', selectedMetric);
+            last[1] = next[1] > last[1] ? next[1] : last[1];
         }
-        else if (selectedCategory === "hospitalizations")
+        else
         {
-            params.append('indicator', selectedMetric);
-            params.append('per_million', selectedPerMillion);
+            ranges.push([next[0], next[1]]);
         }
-        
-        const url = `http://127.0.0.1:5000/api/compare-${selectedCategory}-by-country?${params.toString()}`;
+    });
 
-        const response = await fetch(url);
+    return {
+        version: datasetVersion,
+        ranges: ranges,
+        rows: [...rowsByDate.values()].sort((a, b) => a[0].localeCompare(b[0]))
+    };
+}
 
-        if (!response.ok)
-        {
-            const errorData = await response.json();
-            const error = new Error(`HTTP request error!: Status: ${response.status}, Message: ${errorData.error}`);
-            error.status = response.status;
-            throw error;
-        }
+// Open the IndexedDB database of the series cache, null when IndexedDB is not available
+function openSeriesCacheDb()
+{
+    if (seriesCacheDb === null)
+    {
+        seriesCacheDb = new Promise(resolve => {
+            if (!window.indexedDB)
+            {
+                resolve(null);
+                return;
+            }
 
-        const data = await response.json();
-        console.log(data);
+            const request = indexedDB.open(seriesCacheDbName, 1);
+            request.onupgradeneeded = () => request.result.createObjectStore(seriesCacheStore);
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null);
+        });
+    }
 
-        return data;
+    return seriesCacheDb;
+}
+
+// Run one request on the series store, resolving with its result (undefined on error)
+async function seriesStoreRequest(mode, operation)
+{
+    const db = await openSeriesCacheDb();
+    if (db === null)
+    {
+        return undefined;
     }
-    catch (error)
+
+    return new Promise(resolve => {
+        const request = operation(db.transaction(seriesCacheStore, mode).objectStore(seriesCacheStore));
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => resolve(undefined);
+    });
+}
+
+async function getCachedSeries(cacheKey)
+{
+    let entry = seriesCache.get(cacheKey);
+
+    if (entry === undefined)
     {
-        console.error(error);
-        return error.status;
+        entry = await seriesStoreRequest('readonly', store => store.get(cacheKey));
+    }
+
+    if (entry === undefined || datasetVersion === null || entry.version !== datasetVersion)
+    {
+        return { version: datasetVersion, ranges: [], rows: [] };
+    }
+
+    seriesCache.set(cacheKey, entry);
+    return entry;
+}
+
+async function putCachedSeries(cacheKey, entry)
+{
+    seriesCache.set(cacheKey, entry);
+    await seriesStoreRequest('readwrite', store => store.put(entry, cacheKey));
+}
+
+// Record the dataset version reported by the server. Returns true when it changed since the last
+// response, in which case every cached series is dropped
+async function setDatasetVersion(version)
+{
+    if (!version)
+    {
+        return false;
+    }
+
+    const changed = datasetVersion !== null && datasetVersion !== version;
+    datasetVersion = version;
+
+    if (changed)
+    {
+        seriesCache.clear();
+        await seriesStoreRequest('readwrite', store => store.clear());
     }
+
+    return changed;
+}
+
+// Date of the index-th point of a columnar series (step is day, week or month)
+function columnarDate(start, step, index)
+{
+    const date = new Date(`${start}T00:00:00Z`);
+
+    if (step === "month")
+    {
+        date.setUTCMonth(date.getUTCMonth() + index);
+    }
+    else
+    {
+        date.setUTCDate(date.getUTCDate() + index * (step === "week" ? 7 : 1));
+    }
+
+    return date.toISOString().slice(0, 10);
+}
+
+// Turn a columnar series ({start, step, values} or {dates, values}, plus label or labels) back into
+// the [date, value] / [date, label, value] rows the chart code reads
+function expandColumnarSeries(series)
+{
+    const rows = [];
+
+    series.values.forEach((value, index) => {
+        // The server only uses start and step when no row has a null value, a null there stands for a date
+        // without a row. Skipping it keeps the dates of the following values, they come from the index.
+        if (series.dates === undefined && value === null)
+        {
+            return;
+        }
+
+        const date = series.dates !== undefined ? series.dates[index] : columnarDate(series.start, series.step, index);
+
+        if (series.label !== undefined)
+        {
+            rows.push([date, series.label, value]);
+        }
+        else if (series.labels !== undefined)
+        {
+            rows.push([date, series.labels[index], value]);
+        }
+        else
+        {
+            rows.push([date, value]);
+        }
+    });
+
+    return rows;
 }
 
 // Extract date labels and data points